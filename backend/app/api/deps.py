@@ -1,16 +1,20 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core import security
+from app.core.cache import SearchCache
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import async_engine, async_replica_engine, engine, replica_engine
+from app.core.read_your_writes import wrote_recently
+from app.core.search_backend import SearchBackend
 from app.models import User
 from app.schemas.utils import TokenPayload
 
@@ -24,11 +28,58 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    # Not expired on commit, attributes loaded lazily would need an implicit await
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def get_es(request: Request) -> SearchBackend:
+    es: SearchBackend = request.app.state.es
+    return es
+
+
+def get_search_cache(request: Request) -> SearchCache:
+    cache: SearchCache = request.app.state.search_cache
+    return cache
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
+
+
+# For safe GET handlers only. The primary session is returned, without a second
+# connection, when there is no replica or the client wrote recently
+def get_read_db(
+    request: Request, session: SessionDep
+) -> Generator[Session, None, None]:
+    if replica_engine is None or wrote_recently(request.cookies):
+        yield session
+        return
+    with Session(replica_engine) as read_session:
+        yield read_session
+
+
+async def get_async_read_db(
+    request: Request, session: AsyncSessionDep
+) -> AsyncGenerator[AsyncSession, None]:
+    if async_replica_engine is None or wrote_recently(request.cookies):
+        yield session
+        return
+    async with AsyncSession(
+        async_replica_engine, expire_on_commit=False
+    ) as read_session:
+        yield read_session
+
+
+ReadSessionDep = Annotated[Session, Depends(get_read_db)]
+AsyncReadSessionDep = Annotated[AsyncSession, Depends(get_async_read_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
+ESDep = Annotated[SearchBackend, Depends(get_es)]
+SearchCacheDep = Annotated[SearchCache, Depends(get_search_cache)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def _token_subject(token: str) -> str | None:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
@@ -39,7 +90,10 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+    return token_data.sub
+
+
+def _check_active_user(user: User | None) -> User:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -47,7 +101,17 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
     return user
 
 
+def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    return _check_active_user(session.get(User, _token_subject(token)))
+
+
+async def get_current_user_async(session: AsyncSessionDep, token: TokenDep) -> User:
+    return _check_active_user(await session.get(User, _token_subject(token)))
+
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+# For async routes, looks the user up on their own AsyncSessionDep
+AsyncCurrentUser = Annotated[User, Depends(get_current_user_async)]
 
 
 def get_current_active_superuser(current_user: CurrentUser) -> User:
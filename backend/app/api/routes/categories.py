@@ -4,7 +4,8 @@ from typing import Any
 from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select
 
-from app.api.deps import CurrentUser, SessionDep
+from app import crud
+from app.api.deps import CurrentUser, ReadSessionDep, SessionDep
 from app.models import Category
 from app.schemas.categories import CategoryCreate, CategoryPublic, CategoriesPublic
 
@@ -15,7 +16,7 @@ router = APIRouter(prefix="/event_categories", tags=["events|categories"])
             summary="Lista todos las categorias de eventos",
             response_description="Lista de todas las categorias de eventos creados")
 def read_categories(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 10
+    session: ReadSessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 10
 ) -> Any:
     """
     Lista todos las categorias de eventos existentes.
@@ -45,7 +46,7 @@ def read_categories(
 @router.get("/{id}", response_model=CategoryPublic,
             summary="Lista una categoria de evento por id",
             response_description="Categoria de evento filtrado por id")
-def read_category(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+def read_category(session: ReadSessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
     """
     Devuelve la categoria de evento asociado al id.
     """
@@ -70,6 +71,7 @@ def create_category(
     if current_user.is_superuser:
         status = Category.model_validate(status_in)
         session.add(status)
+        crud.enqueue_search_change(session=session, entity="category", entity_id=status.id)
         session.commit()
         session.refresh(status)
     else:
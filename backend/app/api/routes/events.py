@@ -5,9 +5,21 @@ from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select
 
 from app import crud
-from app.api.deps import CurrentUser, SessionDep
+from app.api.deps import (
+    AsyncCurrentUser,
+    AsyncReadSessionDep,
+    AsyncSessionDep,
+    CurrentUser,
+    SessionDep,
+)
 from app.models import Event
-from app.schemas.events import EventCreate, EventPublic, EventsPublic, EventUpdate
+from app.schemas.events import (
+    EventAttendancePublic,
+    EventCreate,
+    EventPublic,
+    EventsPublic,
+    EventUpdate,
+)
 from app.schemas.utils import Message
 
 router = APIRouter(prefix="/events", tags=["events"])
@@ -16,8 +28,8 @@ router = APIRouter(prefix="/events", tags=["events"])
 @router.get("/", response_model=EventsPublic,
             summary="Lista todos los eventos",
             response_description="Lista de todo los eventos creados")
-def read_events(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_events(
+    session: AsyncReadSessionDep, current_user: AsyncCurrentUser, skip: int = 0, limit: int = 100
 ) -> Any:
     """
     Lista todos los eventos.
@@ -25,23 +37,23 @@ def read_events(
 
     if current_user.is_superuser:
         count_statement = select(func.count()).select_from(Event)
-        count = session.exec(count_statement).one()
+        count = (await session.exec(count_statement)).one()
         statement = select(Event).offset(skip).limit(limit)
-        events = session.exec(statement).all()
+        events = (await session.exec(statement)).all()
     else:
         count_statement = (
             select(func.count())
             .select_from(Event)
             .where(Event.organizer_id == current_user.id)
         )
-        count = session.exec(count_statement).one()
+        count = (await session.exec(count_statement)).one()
         statement = (
             select(Event)
             .where(Event.organizer_id == current_user.id)
             .offset(skip)
             .limit(limit)
         )
-        events = session.exec(statement).all()
+        events = (await session.exec(statement)).all()
 
     return EventsPublic(data=events, count=count)
 
@@ -49,11 +61,12 @@ def read_events(
 @router.get("/{event_id}", response_model=EventPublic,
     summary="Lista un evento por id",
     response_description="Evento filtrado por id")
-def read_event(session: SessionDep, current_user: CurrentUser, event_id: uuid.UUID) -> Any:
+async def read_event(session: AsyncReadSessionDep, current_user: AsyncCurrentUser,
+                     event_id: uuid.UUID) -> Any:
     """
     Devuelve el evento asociado al id.
     """
-    event = session.get(Event, event_id)
+    event = await session.get(Event, event_id)
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
     if not current_user.is_superuser and (event.organizer_id != current_user.id):
@@ -74,12 +87,15 @@ def create_event(
     - **start_datetime: requerido. Formato YYYY-MM-DD[T]HH:MM[:SS[.ffffff]][[±]HH[:]MM]
     - **end_datetime: requerido. Formato YYYY-MM-DD[T]HH:MM[:SS[.ffffff]][[±]HH[:]MM]
     - **location: requerido
+    - **latitude**, **longitude**: opcionales. Si no se envían se buscan por la ciudad de **location**
     - **capacity: requerido
     - **organizer_id**: requerido
     - **status_id**: requerido
     """
     event = Event.model_validate(event_in, update={"organizer_id": current_user.id})
+    crud.fill_coordinates(session=session, db_event=event)
     session.add(event)
+    crud.enqueue_search_change(session=session, entity="event", entity_id=event.id)
     session.commit()
     session.refresh(event)
     return event
@@ -118,18 +134,25 @@ def delete_event(
     if not current_user.is_superuser and (db_event.organizer_id != current_user.id):
         raise HTTPException(status_code=403, detail="The user doesn't have enough privileges")
     session.delete(db_event)
+    crud.enqueue_search_change(session=session, entity="event", entity_id=db_event.id)
     session.commit()
     return Message(message="Event deleted successfully")
 
 
-@router.post('/attend/{event_id}',
+@router.post('/attend/{event_id}', response_model=EventAttendancePublic,
     summary="Asigna un evento a un usuario o asistente")
-async def add_user_to_event(session: SessionDep, current_user: CurrentUser, event_id: uuid.UUID):
+async def add_user_to_event(session: AsyncSessionDep, current_user: AsyncCurrentUser,
+                            event_id: uuid.UUID) -> Any:
     """
-    Asigna al usuario actual al evento especificado a través del event_id.
+    Asigna al usuario actual al evento especificado a través del event_id, si quedan cupos.
+    Repetir la inscripción no la duplica. Devuelve los cupos que quedan en el evento.
     """
-    db_event = session.get(Event, event_id)
-    db_event.attendees.append(current_user)
-
-    db_event = crud.add_attendee_event(session=session, db_event=db_event)
-    return db_event
+    outcome, seats_left = await session.run_sync(
+        lambda sync_session: crud.register_attendee(session=sync_session, event_id=event_id,
+                                                    user_id=current_user.id))
+    if outcome == "not_found":
+        raise HTTPException(status_code=404, detail="Event not found")
+    if outcome == "full":
+        raise HTTPException(status_code=409, detail="The event is full")
+    return EventAttendancePublic(event_id=event_id, seats_left=seats_left,
+                                 already_registered=outcome == "already_registered")
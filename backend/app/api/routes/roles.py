@@ -4,7 +4,7 @@ from typing import Any
 from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select
 
-from app.api.deps import CurrentUser, SessionDep
+from app.api.deps import CurrentUser, ReadSessionDep, SessionDep
 from app.models import Role
 from app.schemas.roles import RoleCreate, RolePublic, RolesPublic
 
@@ -15,7 +15,7 @@ router = APIRouter(prefix="/roles", tags=["users|roles"])
     summary="Lista todos los roles",
     response_description="Lista de todo los roles creados")
 def read_roles(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 10
+    session: ReadSessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 10
 ) -> Any:
     """
     Lista todos los roles existentes.
@@ -45,7 +45,7 @@ def read_roles(
 @router.get("/{id}", response_model=RolePublic,
     summary="Lista un rol por id",
     response_description="Rol filtrado por id")
-def read_role(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+def read_role(session: ReadSessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
     """
     Devuelve el rol asociado al id.
     """
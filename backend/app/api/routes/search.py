@@ -1,118 +1,572 @@
+import asyncio
+import base64
+import binascii
+import json
 import uuid
-import re
-from typing import Optional, Any
+from typing import Any
 
-from fastapi import APIRouter, HTTPException
-from app.core.es import ES_connector
+from elasticsearch import BadRequestError, NotFoundError
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.api.deps import (
+    AsyncCurrentUser,
+    ESDep,
+    SearchCacheDep,
+    get_current_active_superuser,
+)
+from app.core.cache import SearchCache
 from app.core.config import settings
+from app.core.es import year_alias
+from app.core.pg_search import PostgresSearchBackend
+from app.core.search_backend import SearchBackend, distance_km
+from app.core.search_query import QuerySyntaxError, compile_query, query_years
+from app.schemas.search import (
+    SOURCE_FIELDS,
+    SearchBatch,
+    SearchBatchPublic,
+    SearchDocumentsPublic,
+    SearchFacetsPublic,
+    SearchHitsPublic,
+    SearchSimilarPublic,
+)
 
 router = APIRouter(prefix="/search", tags=["events|search"])
-es = ES_connector()
 
 index_name = settings.ES_INDEX
 total_result_per_page = 10
+cursor_sort: list[dict[str, Any]] = [{'start_datetime': 'asc'}, {'id': 'asc'}]
+# Values of the sort parameter; without one, results are sorted by relevance
+result_sorts: dict[str, list[dict[str, Any]]] = {
+    'start_datetime': [{'start_datetime': 'asc'}],
+    'seats_left': [{'seats_left': 'desc'}, {'start_datetime': 'asc'}],
+}
+facet_aggs: dict[str, Any] = {
+    'category-agg': {
+        'terms': {
+            'field': 'category',
+        }
+    },
+    'year-agg': {
+        'date_histogram': {
+            'field': 'start_datetime',
+            'calendar_interval': 'year',
+            'format': 'yyyy',
+        },
+    },
+}
 
 
-def extract_filters(query):
-    filters = []
+def encode_cursor(pit_id: str, search_after: list[Any]) -> str:
+    data = json.dumps({'pit': pit_id, 'after': search_after}).encode()
+    return base64.urlsafe_b64encode(data).decode()
 
-    filter_regex = r'category:([^\s]+)\s*'
-    m = re.search(filter_regex, query)
-    if m:
-        filters.append({
-            'term': {
-                'category.keyword': {
-                    'value': m.group(1)
-                }
-            }
-        })
-        query = re.sub(filter_regex, '', query).strip()
-
-    filter_regex = r'year:([^\s]+)\s*'
-    m = re.search(filter_regex, query)
-    if m:
-        filters.append({
-            'range': {
-                'start_datetime': {
-                    'gte': f'{m.group(1)}||/y',
-                    'lte': f'{m.group(1)}||/y',
-                }
-            },
-        })
-        query = re.sub(filter_regex, '', query).strip()
 
-    return {'filter': filters}, query
+def decode_cursor(
+    cursor: str, sort: list[dict[str, Any]] | None = cursor_sort
+) -> tuple[str, list[Any]]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        pit_id, search_after = data['pit'], data['after']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # One sort value per clause, as Elasticsearch returned them for the last hit
+    if (not isinstance(pit_id, str) or not isinstance(search_after, list)
+            or len(search_after) != len(sort or [])
+            or not all(isinstance(value, str | int | float) for value in search_after)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return pit_id, search_after
+
+
+def parse_near(near: str, radius: str | None) -> tuple[dict[str, float], float]:
+    try:
+        lat, lon = (float(part) for part in near.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="near must be latitude,longitude")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="near is out of range")
+    try:
+        km = distance_km(radius or settings.SEARCH_DEFAULT_RADIUS)
+    except BadRequestError:
+        raise HTTPException(status_code=400, detail="radius must be a distance such as 5km or 500m")
+    return {'lat': lat, 'lon': lon}, km
+
+
+def build_query(
+    query: str | None, near: str | None = None, radius: str | None = None
+) -> tuple[dict[str, Any], dict[str, float] | None]:
+    try:
+        es_query = compile_query(query)
+    except QuerySyntaxError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    origin = None
+    if near is not None:
+        origin, km = parse_near(near, radius)
+        # A filter, so the facets only count events within the radius too
+        es_query['bool']['filter'].append(
+            {'geo_distance': {'distance': f'{km}km', 'coordinates': origin}})
+    return es_query, origin
+
+
+def ranked(es_query: dict[str, Any], sort: list[dict[str, Any]] | None) -> dict[str, Any]:
+    # Sorted by relevance, popular events and those starting soon come first
+    if sort:
+        return es_query
+    return {'function_score': {
+        'query': es_query,
+        'functions': [
+            {'field_value_factor': {'field': 'popularity', 'modifier': 'ln2p', 'missing': 0}},
+            {'gauss': {'start_datetime': {'origin': 'now',
+                                          'scale': settings.SEARCH_DECAY_SCALE,
+                                          'offset': settings.SEARCH_DECAY_OFFSET,
+                                          'decay': settings.SEARCH_DECAY}}},
+        ],
+        'score_mode': 'multiply',
+        'boost_mode': 'multiply',
+    }}
+
+
+def search_index(es_query: dict[str, Any]) -> str:
+    # year: and from:/to: filters only read the indices of those years
+    years = query_years(es_query)
+    if not years:
+        return index_name
+    return ','.join(year_alias(index_name, year) for year in years)
+
+
+def distance_sort(origin: dict[str, float]) -> dict[str, Any]:
+    return {'_geo_distance': {'coordinates': origin, 'order': 'asc', 'unit': 'km'}}
+
+
+def build_sort(
+    sort: str | None, origin: dict[str, float] | None = None, cursor: bool = False
+) -> list[dict[str, Any]] | None:
+    if sort and sort not in result_sorts:
+        raise HTTPException(status_code=400,
+                            detail=f"sort must be one of: {', '.join(result_sorts)}")
+    clauses = list(result_sorts[sort] if sort else [])
+    if origin:
+        # Nearest first, or between events that tie on the requested sort
+        clauses.append(distance_sort(origin))
+    if cursor:
+        # Pages after a cursor need a total order, which the id completes
+        clauses = [*(clauses or cursor_sort[:1]), {'id': 'asc'}]
+    return clauses or None
+
+
+def parse_fields(fields: str | None) -> list[str] | bool:
+    # Only the requested fields are fetched from _source, the rest is left out of the hits
+    if not fields:
+        return True
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = sorted(set(names) - set(SOURCE_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def page_output(event: Any, sort: list[dict[str, Any]] | None = None) -> dict[str, Any]:
+    total = event['hits'].get('total')
+    distance_at = next((number for number, clause in enumerate(sort or [])
+                        if '_geo_distance' in clause), None)
+    data = []
+    for hit in event['hits']['hits']:
+        output = {**hit.get('_source', {}), 'id': hit['_id'], 'score': hit.get('_score')}
+        if distance_at is not None:
+            output['distance'] = hit['sort'][distance_at]
+        data.append(output)
+    return {
+        'data': data,
+        'total': total['value'] if total else None,
+        'total_relation': total['relation'] if total else None,
+        'next_cursor': None,
+    }
+
+
+async def get_facets(es: SearchBackend, cache: SearchCache, es_query: dict[str, Any]) -> Any:
+    # Counts only depend on the text and the filters, not on the page being read
+    async def run_aggregations() -> dict[str, list[dict[str, Any]]]:
+        event = await es.search(index_name=search_index(es_query), query=es_query,
+                                aggs=facet_aggs, size=0, track_total_hits=False,
+                                ignore_unavailable=True)
+        aggregations = event['aggregations']
+        return {
+            'category': [{'value': bucket['key'], 'count': bucket['doc_count']}
+                         for bucket in aggregations['category-agg']['buckets']],
+            'year': [{'value': bucket['key_as_string'], 'count': bucket['doc_count']}
+                     for bucket in aggregations['year-agg']['buckets']],
+        }
+
+    # Words are lowercased by the parser, so the compiled query is a normalized cache key
+    return await cache.get_or_compute('facets', {'query': es_query}, run_aggregations,
+                                      ttl=settings.SEARCH_CACHE_TTL)
 
 
 @router.get("/",
+            response_model=SearchHitsPublic,
+            response_model_exclude_unset=True,
             summary="Lista los eventos en Elasticsearch",
             response_description="Lista de todos los eventos de Elasticsearch")
-def handle_search(query: Optional[str] = "", start: Optional[int] = 0,
-                  page_size: Optional[int] = 5) -> Any:
+async def handle_search(es: ESDep, cache: SearchCacheDep, query: str | None = "",
+                        start: int = Query(0, ge=0),
+                        page_size: int = Query(5, ge=1, le=settings.SEARCH_PAGE_MAX_SIZE),
+                        cursor: str | None = None, near: str | None = None,
+                        radius: str | None = None, fields: str | None = None,
+                        sort: str | None = None) -> Any:
     """
     Busca los eventos en Elasticsearch de acuerdo al texto y filtros ingresados.
     Por defecto muestra los 5 primeros resultados.
     - **query**: opcional. Si no se envia nada en este campo, se muestran todos los eventos existentes 
-        Ej: vallenato; vallenato category:Conciertos, category:Teatro
-    - **start**: opcional
-    - **page_size**: requopcionalerido
+        Ej: vallenato; vallenato category:Conciertos category:Teatro;
+        "feria de las flores" -rock status:Activo location:Medellín from:2025-01 to:2025-06 capacity>=100
+        available:true
+    - **start**: opcional. Desde 0
+    - **page_size**: opcional. Entre 1 y `SEARCH_PAGE_MAX_SIZE`
+    - **cursor**: opcional. Pagina por fecha de inicio con un costo constante por página.
+        Envíe `cursor` vacío para la primera página y luego el `next_cursor` de cada respuesta.
+        En este modo se ignora **start**.
+        Los conteos por categoría y año (**facets**) se incluyen en la primera página.
+    - **near**: opcional. Latitud y longitud, Ej: `6.2442,-75.5812`. Solo muestra los eventos
+        dentro de **radius** y los ordena del más cercano al más lejano.
+    - **radius**: opcional. Distancia en `km` o `m` alrededor de **near**, Ej: `5km`; por defecto 25km
+    - **fields**: opcional. Campos de cada evento separados por comas, Ej: `title,start_datetime,category`.
+        Por defecto se devuelven todos.
+    - **sort**: opcional. `start_datetime` (los más próximos primero) o `seats_left` (los que tienen
+        más cupos primero). Por defecto se ordena por relevancia, o por distancia con **near**.
+        La relevancia sube con los asistentes y los clics de cada evento y baja a medida que
+        su fecha de inicio se aleja de hoy.
+        Para ver solo los eventos con cupos disponibles use `available:true` en **query**.
+
+    **total** cuenta los eventos encontrados hasta `SEARCH_TRACK_TOTAL_HITS`; por encima de ese
+    número **total_relation** es `gte`. Con **cursor** solo se cuenta en la primera página.
     """
-    filters, parsed_query = extract_filters(query)
+    es_query, origin = build_query(query, near, radius)
+    source = parse_fields(fields)
 
-    if parsed_query:
-        search_query = {
-            'must': {
-                'multi_match': {
-                    'query': parsed_query,
-                    'fields': ['title', 'description'],
-                }
-            }
-        }
+    if cursor is not None:
+        page_sort = build_sort(sort, origin, cursor=True)
+        if cursor:
+            return await search_with_cursor(es, es_query, cursor, page_size, page_sort, source)
+        page, facets = await asyncio.gather(
+            search_with_cursor(es, es_query, cursor, page_size, page_sort, source),
+            get_facets(es, cache, es_query),
+        )
+        return {**page, "facets": facets}
+
+    page_sort = build_sort(sort, origin)
+
+    async def run_search() -> dict[str, Any]:
+        event = await es.search(index_name=search_index(es_query),
+            query=ranked(es_query, page_sort),
+            sort=page_sort,
+            source=source,
+            size=page_size,
+            from_=start,
+            track_total_hits=settings.SEARCH_TRACK_TOTAL_HITS,
+            # Years without events have no index
+            ignore_unavailable=True,
+        )
+        return page_output(event, page_sort)
+
+    page, facets = await asyncio.gather(
+        cache.get_or_compute('results', {'query': es_query, 'sort': page_sort, 'source': source,
+                                        'start': start, 'page_size': page_size},
+                             run_search, ttl=settings.SEARCH_CACHE_TTL),
+        get_facets(es, cache, es_query),
+    )
+    return {**page, "facets": facets}
+
+
+@router.post("/batch",
+             response_model=SearchBatchPublic,
+             response_model_exclude_unset=True,
+             summary="Varias búsquedas en una sola petición",
+             response_description="Los resultados de cada búsqueda, en el mismo orden")
+async def search_batch(es: ESDep, cache: SearchCacheDep, batch: SearchBatch) -> Any:
+    """
+    Ejecuta hasta `SEARCH_BATCH_MAX_QUERIES` búsquedas con una sola llamada `_msearch`.
+    Cada elemento de **queries** acepta los mismos **query**, **start**, **page_size**,
+    **near**, **radius**, **fields** y **sort** que `/search/` y su respuesta es la misma, sin **facets**.
+    Si una búsqueda falla, su respuesta es `{"error": {"status", "detail"}}`
+    y las demás se devuelven igual.
+    """
+    responses: list[dict[str, Any] | None] = [None] * len(batch.queries)
+    positions: list[int] = []
+    params: list[dict[str, Any]] = []
+    for position, item in enumerate(batch.queries):
+        try:
+            es_query, origin = build_query(item.query, item.near, item.radius)
+            source = parse_fields(item.fields)
+            sort = build_sort(item.sort, origin)
+        except HTTPException as e:
+            responses[position] = {"error": {"status": e.status_code, "detail": e.detail}}
+            continue
+        positions.append(position)
+        # The same key as GET /search/, so both share cached pages
+        params.append({'query': es_query, 'sort': sort, 'source': source,
+                       'start': item.start, 'page_size': item.page_size})
+
+    async def run_searches(missing: list[int]) -> list[dict[str, Any] | HTTPException]:
+        searches = []
+        for number in missing:
+            body: dict[str, Any] = {'query': ranked(params[number]['query'], params[number]['sort']),
+                    '_source': params[number]['source'],
+                    'size': params[number]['page_size'], 'from': params[number]['start'],
+                    'track_total_hits': settings.SEARCH_TRACK_TOTAL_HITS}
+            if params[number]['sort']:
+                body['sort'] = params[number]['sort']
+            searches.append(body)
+        event = await es.msearch(index_name=index_name, searches=searches)
+        pages: list[dict[str, Any] | HTTPException] = []
+        for number, response in zip(missing, event["responses"], strict=True):
+            if "error" in response:
+                # Failed searches are returned as errors, and not cached
+                error = response["error"]
+                if isinstance(error, dict):
+                    error = error.get("reason") or error.get("type")
+                pages.append(HTTPException(status_code=response.get("status", 500), detail=error))
+            else:
+                pages.append(page_output(response, params[number]['sort']))
+        return pages
+
+    if params:
+        pages = await cache.get_or_compute_many('results', params, run_searches,
+                                                ttl=settings.SEARCH_CACHE_TTL)
+        for position, page in zip(positions, pages, strict=True):
+            if isinstance(page, HTTPException):
+                page = {"error": {"status": page.status_code, "detail": page.detail}}
+            responses[position] = page
+    return {"responses": responses}
+
+
+@router.get("/facets",
+            response_model=SearchFacetsPublic,
+            summary="Conteos de eventos por categoría y año",
+            response_description="Categorías y años con su número de eventos")
+async def read_facets(es: ESDep, cache: SearchCacheDep, query: str | None = "",
+                      near: str | None = None, radius: str | None = None) -> Any:
+    """
+    Devuelve cuántos eventos hay por categoría y por año para el texto y filtros ingresados,
+    sin los eventos. Acepta la misma **query**, **near** y **radius** que `/search/`.
+    """
+    es_query, _ = build_query(query, near, radius)
+    return await get_facets(es, cache, es_query)
+
+
+async def search_with_cursor(
+    es: SearchBackend,
+    query: dict[str, Any],
+    cursor: str,
+    page_size: int,
+    sort: list[dict[str, Any]] | None = cursor_sort,
+    source: list[str] | bool = True,
+) -> dict[str, Any]:
+    # search_after on a point in time: every page costs the same, whatever its depth
+    search_after: list[Any] | None = None
+    if cursor:
+        pit_id, search_after = decode_cursor(cursor, sort)
     else:
-        search_query = {
-            'must': {
-                'match_all': {}
-            }
-        }
+        pit_id = await es.open_point_in_time(search_index(query), settings.ES_PIT_KEEP_ALIVE)
+
+    try:
+        event = await es.search(
+            query=query,
+            pit={'id': pit_id, 'keep_alive': settings.ES_PIT_KEEP_ALIVE},
+            sort=sort,
+            search_after=search_after,
+            source=source,
+            size=page_size,
+            # Later pages do not count again
+            track_total_hits=False if cursor else settings.SEARCH_TRACK_TOTAL_HITS,
+        )
+    except NotFoundError:
+        raise HTTPException(status_code=410, detail="Cursor expired")
+    except BadRequestError:
+        if not cursor:
+            raise
+        # Values of another sort, or a point in time id that is not one
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    page = page_output(event, sort)
+    hits = event["hits"]["hits"]
+    if len(hits) == page_size:
+        page['next_cursor'] = encode_cursor(event["pit_id"], hits[-1]["sort"])
+    else:
+        await es.close_point_in_time(event["pit_id"])
+    return page
+
 
-    event = es.search(index_name=index_name,
-        query={
-            'bool': {
-                **search_query,
-                **filters
-            }
-        },        
-        aggs={
-            'category-agg': {
-                'terms': {
-                    'field': 'category.keyword',
+@router.get("/suggest",
+            summary="Sugerencias para autocompletar la búsqueda",
+            response_description="Eventos cuyo título o ubicación empiezan por el texto")
+async def suggest(es: ESDep, cache: SearchCacheDep, q: str,
+                  size: int = Query(5, ge=1, le=settings.SEARCH_SUGGEST_MAX_SIZE)) -> Any:
+    """
+    Sugiere eventos mientras se escribe, comparando cada palabra de **q** con el inicio
+    de las palabras del título y la ubicación.
+    - **q**: texto escrito hasta el momento. Ej: "fest med" sugiere "Festival de Jazz" en Medellín
+    - **size**: opcional. Número de sugerencias, hasta SEARCH_SUGGEST_MAX_SIZE
+    """
+    prefix = ' '.join(q.lower().split())
+    if not prefix:
+        return {"suggestions": []}
+
+    async def run_suggest() -> list[dict[str, Any]]:
+        # The prefix subfields are edge n-grams, so this is a plain term lookup.
+        # cross_fields lets each word match either the title or the location.
+        event = await es.search(index_name=index_name,
+            query={
+                'multi_match': {
+                    'query': prefix,
+                    'type': 'cross_fields',
+                    'fields': ['title.prefix', 'location.prefix'],
+                    'operator': 'and',
                 }
             },
-            'year-agg': {
-                'date_histogram': {
-                    'field': 'start_datetime',
-                    'calendar_interval': 'year',
-                    'format': 'yyyy',
-                },
-            },
-        },
-        size=page_size,
-        from_=start
-    )
+            source=['title', 'location'],
+            filter_path=['hits.hits._id', 'hits.hits._source'],
+            size=size,
+            track_total_hits=False,
+        )
+        hits = event.get('hits', {}).get('hits', [])
+        return [{'id': hit['_id'], **hit['_source']} for hit in hits]
+
+    suggestions = await cache.get_or_compute('suggest', {'prefix': prefix, 'size': size},
+                                             run_suggest, ttl=settings.SEARCH_SUGGEST_CACHE_TTL)
+    return {"suggestions": suggestions}
+
+
+@router.get("/cache-stats",
+            dependencies=[Depends(get_current_active_superuser)],
+            summary="Estadísticas de la caché de búsquedas",
+            response_description="Aciertos, fallos y generación actual del índice")
+async def read_cache_stats(cache: SearchCacheDep) -> Any:
+    """
+    Devuelve los aciertos y fallos acumulados de la caché de `/search/`
+    y la generación del índice con la que se guardan los resultados.
+    """
+    return await cache.stats()
+
+
+async def fetch_documents(
+    es: SearchBackend, ids: list[uuid.UUID], source: list[str] | bool = True
+) -> dict[str, dict[str, Any]]:
+    """Returns the indexed documents of ids by id, reading missing ones from Postgres."""
+    response = await es.mget(index_name=index_name, ids=ids, source=source)
+    documents = {doc['_id']: doc['_source'] for doc in response['docs'] if doc.get('found')}
+    # Events the indexer has not sent yet, or that a failed write left out of the index
+    missing = [id for id in ids if str(id) not in documents]
+    if missing:
+        response = await PostgresSearchBackend().mget(index_name, missing, source=source)
+        documents.update({doc['_id']: doc['_source']
+                          for doc in response['docs'] if doc['found']})
+    return documents
+
+
+@router.get("/by-ids",
+            response_model=SearchDocumentsPublic,
+            response_model_exclude_unset=True,
+            summary="Lista varios eventos por id",
+            response_description="Eventos en el orden de los ids recibidos")
+async def read_events_by_ids(es: ESDep, ids: str, fields: str | None = None) -> Any:
+    """
+    Devuelve hasta `SEARCH_BY_IDS_MAX_SIZE` eventos con una sola llamada `mget`.
+    Los que aún no están en Elasticsearch se leen de Postgres.
+    - **ids**: ids de los eventos separados por comas
+    - **fields**: opcional. Campos de cada evento separados por comas, como en `/search/`
+    **missing** lista los ids que no existen.
+    """
+    try:
+        event_ids = list(dict.fromkeys(uuid.UUID(id.strip())
+                                       for id in ids.split(',') if id.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be event ids separated by commas")
+    if len(event_ids) > settings.SEARCH_BY_IDS_MAX_SIZE:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {settings.SEARCH_BY_IDS_MAX_SIZE} ids are allowed")
+    if not event_ids:
+        return {"data": [], "missing": []}
+
+    documents = await fetch_documents(es, event_ids, parse_fields(fields))
+    return {
+        "data": [{**documents[str(id)], "id": str(id)}
+                 for id in event_ids if str(id) in documents],
+        "missing": [str(id) for id in event_ids if str(id) not in documents],
+    }
+
+
+@router.post("/{event_id}/click",
+             status_code=204,
+             summary="Registra un clic en un resultado de búsqueda")
+async def record_click(cache: SearchCacheDep, current_user: AsyncCurrentUser,
+                       event_id: uuid.UUID) -> None:
+    """
+    Cuenta un clic en el evento desde los resultados de búsqueda. Los clics se acumulan
+    en Redis y se suman al evento cada `SEARCH_CLICKS_FLUSH_INTERVAL` segundos. Cada
+    usuario cuenta una sola vez por evento en ese intervalo.
+    """
+    await cache.record_click(event_id, current_user.id)
+
+
+def similar_query(event_id: uuid.UUID, document: dict[str, Any]) -> dict[str, Any]:
+    # more_like_this on the text of the event; the alias spans several year
+    # indices, so the event is passed as text rather than by its id
+    return {'bool': {
+        'must': [{'more_like_this': {
+            'fields': ['title', 'description'],
+            'like': [document.get('title') or '', document.get('description') or ''],
+            # Titles and descriptions are short, so every word counts, but only
+            # words some other event shares
+            'min_term_freq': 1,
+            'min_doc_freq': 2,
+            'max_query_terms': 25,
+        }}],
+        'must_not': [{'ids': {'values': [str(event_id)]}}],
+    }}
+
+
+@router.get("/{event_id}/similar",
+            response_model=SearchSimilarPublic,
+            response_model_exclude_unset=True,
+            summary="Eventos parecidos a uno dado",
+            response_description="Eventos con título y descripción parecidos")
+async def read_similar_events(es: ESDep, cache: SearchCacheDep, event_id: uuid.UUID,
+                              size: int = Query(5, ge=1, le=settings.SEARCH_SIMILAR_MAX_SIZE),
+                              fields: str | None = None) -> Any:
+    """
+    Devuelve los eventos cuyo título y descripción más se parecen a los del evento,
+    sin incluirlo.
+    - **size**: opcional. Número de eventos, hasta `SEARCH_SIMILAR_MAX_SIZE`
+    - **fields**: opcional. Campos de cada evento separados por comas, como en `/search/`
+    """
+    source = parse_fields(fields)
+
+    async def run_similar() -> Any:
+        documents = await fetch_documents(es, [event_id], ['title', 'description'])
+        if str(event_id) not in documents:
+            return None
+        event = await es.search(index_name=index_name,
+                                query=similar_query(event_id, documents[str(event_id)]),
+                                source=source, size=size, track_total_hits=False)
+        return page_output(event)['data']
 
-    event_output = None
-    if event and event["hits"]["hits"]:
-        event_output = event["hits"]["hits"]
-    return {"event_ouput": event_output}
+    # The cache generation changes with every indexed write, the event's included
+    data = await cache.get_or_compute('similar', {'event_id': event_id, 'size': size,
+                                                  'source': source},
+                                      run_similar, ttl=settings.SEARCH_SIMILAR_CACHE_TTL)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return {"data": data}
 
 
 @router.get("/{event_id}",
             summary="Lista un evento por id",
             response_description="Evento filtrado por id")
-def read_event_id(event_id: uuid.UUID):
+async def read_event_id(es: ESDep, event_id: uuid.UUID) -> Any:
 
-    document = es.retrieve_document(id)
-    document = document['_source']
+    documents = await fetch_documents(es, [event_id])
+    if str(event_id) not in documents:
+        raise HTTPException(status_code=404, detail="Event not found")
+    document = documents[str(event_id)]
     event = {"id": event_id,
              "title": document["title"],
              "description": document["description"],
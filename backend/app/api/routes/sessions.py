@@ -5,10 +5,11 @@ from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select
 
 from app import crud
-from app.api.deps import CurrentUser, SessionDep
+from app.api.deps import (
+    AsyncCurrentUser, AsyncSessionDep, CurrentUser, ReadSessionDep, SessionDep)
 from app.models import Sessions, Event
 from app.schemas.sessions import (
-    SessionsCreate, SessionsPublic, SessionssPublic, SessionsUpdate)
+    SessionsAttendancePublic, SessionsCreate, SessionsPublic, SessionssPublic, SessionsUpdate)
 from app.schemas.utils import Message
 
 router = APIRouter(prefix="/sessions", tags=["events|sessions"])
@@ -18,7 +19,7 @@ router = APIRouter(prefix="/sessions", tags=["events|sessions"])
             summary="Lista todos las sesiones",
             response_description="Lista de todas las sesiones creadas")
 def read_sessionss(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+    session: ReadSessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
 ) -> Any:
     """
     Lista todas las sesiones
@@ -48,7 +49,7 @@ def read_sessionss(
 
 
 @router.get("/{sessions_id}", response_model=SessionsPublic)
-def read_sessions(session: SessionDep, current_user: CurrentUser, sessions_id: uuid.UUID) -> Any:
+def read_sessions(session: ReadSessionDep, current_user: CurrentUser, sessions_id: uuid.UUID) -> Any:
     """
     Get sessions by ID.
     """
@@ -83,6 +84,7 @@ def create_sessions(
 
     sessions = Sessions.model_validate(sessions_in)
     session.add(sessions)
+    crud.enqueue_search_change(session=session, entity="event", entity_id=sessions.event_id)
     session.commit()
     session.refresh(sessions)
     return sessions
@@ -105,7 +107,7 @@ def update_sessions(session: SessionDep, current_user: CurrentUser,
     if not current_user.is_superuser or (db_event.organizer_id != current_user.id):
         raise HTTPException(status_code=403, detail="The user doesn't have enough privileges")
 
-    db_sessions = crud.update_session(session=session, db_sessions=db_sessions, sessions_in=sessions_in)
+    db_sessions = crud.update_sessions(session=session, db_sessions=db_sessions, sessions_in=sessions_in)
     return db_event
 
 
@@ -126,17 +128,26 @@ def delete_sessions(
         raise HTTPException(status_code=400, detail="Not enough permissions")
 
     session.delete(db_sessions)
+    crud.enqueue_search_change(session=session, entity="event", entity_id=db_sessions.event_id)
     session.commit()
     return Message(message="Session deleted successfully")
 
 
-@router.post('/attend/{sessions_id}')
-async def add_user_to_event(session: SessionDep, current_user: CurrentUser, sessions_id: uuid.UUID):
+@router.post('/attend/{sessions_id}', response_model=SessionsAttendancePublic)
+async def add_user_to_event(session: AsyncSessionDep, current_user: AsyncCurrentUser,
+                            sessions_id: uuid.UUID) -> Any:
     """
-    Asigna al usuario actual a la sesión especificado a través del event_id.
+    Asigna al usuario actual a la sesión especificada, si quedan cupos y está inscrito
+    en el evento de la sesión. Devuelve los cupos que quedan en la sesión.
     """
-    db_sessions = session.get(Sessions, sessions_id)
-    db_sessions.attendees.append(current_user)
-
-    db_sessions = crud.add_attendee_sessions(session=session, db_sessions=db_sessions)
-    return db_sessions
+    outcome, seats_left = await session.run_sync(
+        lambda sync_session: crud.register_session_attendee(
+            session=sync_session, session_id=sessions_id, user_id=current_user.id))
+    if outcome == "not_found":
+        raise HTTPException(status_code=404, detail="Sessions not found")
+    if outcome == "not_allowed":
+        raise HTTPException(status_code=403, detail="Not registered for the event")
+    if outcome == "full":
+        raise HTTPException(status_code=409, detail="The session is full")
+    return SessionsAttendancePublic(session_id=sessions_id, seats_left=seats_left,
+                                    already_registered=outcome == "already_registered")
@@ -4,7 +4,8 @@ from typing import Any
 from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select
 
-from app.api.deps import CurrentUser, SessionDep
+from app import crud
+from app.api.deps import CurrentUser, ReadSessionDep, SessionDep
 from app.models import Status
 from app.schemas.status import StatusCreate, StatusPublic, StatusesPublic
 
@@ -15,7 +16,7 @@ router = APIRouter(prefix="/event_status", tags=["events|status"])
     summary="Lista todos los estados de eventos",
     response_description="Lista de todo los estados de eventos creados")
 def read_statuses(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 10
+    session: ReadSessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 10
 ) -> Any:
     """
     Lista todos los estados de eventos existentes.
@@ -45,7 +46,7 @@ def read_statuses(
 @router.get("/{id}", response_model=StatusPublic,
     summary="Lista un estado de evento por id",
     response_description="Estado de evento filtrado por id")
-def read_status(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+def read_status(session: ReadSessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
     """
     Devuelve el estado de evento asociado al id.
     """
@@ -70,6 +71,7 @@ def create_status(
     if current_user.is_superuser:
         status = Status.model_validate(status_in)
         session.add(status)
+        crud.enqueue_search_change(session=session, entity="status", entity_id=status.id)
         session.commit()
         session.refresh(status)
     else:
@@ -7,6 +7,7 @@ from sqlmodel import col, delete, func, select
 from app import crud
 from app.api.deps import (
     CurrentUser,
+    ReadSessionDep,
     SessionDep,
     get_current_active_superuser,
 )
@@ -33,7 +34,7 @@ router = APIRouter(prefix="/users", tags=["users"])
     response_model=UsersPublic,
     summary="Lista todos los usuarios",
     response_description="Lista de todo los usuarios creados")
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+def read_users(session: ReadSessionDep, skip: int = 0, limit: int = 100) -> Any:
     """
     Lista todos los usuarios.
     """
@@ -161,7 +162,7 @@ def register_user(session: SessionDep, user_in: UserRegister) -> Any:
 
 @router.get("/{user_id}", response_model=UserPublic)
 def read_user_by_id(
-    user_id: uuid.UUID, session: SessionDep, current_user: CurrentUser
+    user_id: uuid.UUID, session: ReadSessionDep, current_user: CurrentUser
 ) -> Any:
     """
     Listar a un usuario por id
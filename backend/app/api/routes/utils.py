@@ -1,8 +1,11 @@
+from typing import Any
+
 from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
-from app.schemas.utils import Message
+from app.core.db import pool_metrics
+from app.schemas.utils import Message, PoolMetricsPublic
 from app.utils import generate_test_email, send_email
 
 router = APIRouter(prefix="/utils", tags=["utils"])
@@ -29,3 +32,15 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get(
+    "/pool-metrics/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=dict[str, PoolMetricsPublic],
+)
+def read_pool_metrics() -> dict[str, dict[str, Any]]:
+    """
+    Database connection pool usage of this worker, per engine.
+    """
+    return {name: metrics.snapshot() for name, metrics in pool_metrics.items()}
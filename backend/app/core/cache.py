@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import redis
+import redis.asyncio
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Incremented every time the indexer writes, so cached results of older
+# generations are never read again and expire on their own
+GENERATION_KEY = "search:generation"
+STATS_KEY = "search:stats"
+# Clicks on search results by event id, until the search indexer adds them to Postgres
+CLICKS_KEY = "search:clicks"
+CLICKS_FLUSHING_KEY = "search:clicks:flushing"
+# Followed by :<user id>:<event id>, set while that user's click is being counted
+CLICKED_KEY = "search:clicked"
+
+
+def redis_connection_args() -> dict[str, Any]:
+    return {
+        "host": settings.RD_SERVER,
+        "port": settings.RD_PORT,
+        "password": settings.RD_PASSWORD or None,
+        "socket_timeout": settings.RD_SOCKET_TIMEOUT,
+    }
+
+
+def bump_search_generation(client: redis.Redis) -> None:
+    try:
+        client.incr(GENERATION_KEY)
+    except RedisError as e:
+        # Cached results will still expire after SEARCH_CACHE_TTL
+        logger.error(e)
+
+
+class SearchCache:
+    def __init__(self, client: redis.asyncio.Redis) -> None:
+        self.client = client
+        self._inflight: dict[str, asyncio.Future[Any]] = {}
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    @staticmethod
+    def digest(params: dict[str, Any]) -> str:
+        data = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        params: dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int,
+    ) -> Any:
+        try:
+            generation = await self.client.get(GENERATION_KEY) or b"0"
+            key = f"search:{namespace}:{generation.decode()}:{self.digest(params)}"
+            cached = await self.client.get(key)
+        except RedisError as e:
+            logger.error(e)
+            return await compute()
+
+        if cached is not None:
+            await self._count("hits")
+            return json.loads(cached)
+        await self._count("misses")
+
+        # Concurrent misses for the same key in this worker share one computation
+        if key in self._inflight:
+            leader = self._inflight[key]
+            try:
+                return await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+            # The request computing it went away, so this one computes it instead
+            return await self._compute_once(key, compute, ttl)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._compute_once(key, compute, ttl)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting for it
+            future.exception()
+            raise
+        finally:
+            # Cancelled, as when the client disconnects, followers must not wait forever
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
+
+    async def get_or_compute_many(
+        self,
+        namespace: str,
+        params: list[dict[str, Any]],
+        compute: Callable[[list[int]], Awaitable[list[Any]]],
+        ttl: int,
+    ) -> list[Any]:
+        """
+        Reads several values with one MGET. compute receives the positions of
+        the misses and returns their values in that order; values that are
+        exceptions are returned without being cached.
+        """
+        try:
+            generation = await self.client.get(GENERATION_KEY) or b"0"
+            keys = [
+                f"search:{namespace}:{generation.decode()}:{self.digest(value)}"
+                for value in params
+            ]
+            cached = await self.client.mget(keys) if keys else []
+        except RedisError as e:
+            logger.error(e)
+            return await compute(list(range(len(params))))
+
+        values = [None if value is None else json.loads(value) for value in cached]
+        missing = [position for position, value in enumerate(cached) if value is None]
+        await self._count("hits", len(params) - len(missing))
+        await self._count("misses", len(missing))
+        if not missing:
+            return values
+
+        computed = await compute(missing)
+        pipeline = self.client.pipeline(transaction=False)
+        for position, value in zip(missing, computed, strict=True):
+            values[position] = value
+            if not isinstance(value, Exception):
+                pipeline.set(keys[position], json.dumps(value, default=str), ex=ttl)
+        await self._quietly(pipeline.execute())
+        return values
+
+    async def _compute_once(
+        self, key: str, compute: Callable[[], Awaitable[Any]], ttl: int
+    ) -> Any:
+        # Across workers, only the one holding the lock queries Elasticsearch;
+        # the others wait for its result for up to SEARCH_CACHE_LOCK_TIMEOUT
+        lock_key = f"{key}:lock"
+        lock_ms = int(settings.SEARCH_CACHE_LOCK_TIMEOUT * 1000)
+        try:
+            locked = await self.client.set(lock_key, 1, nx=True, px=lock_ms)
+        except RedisError as e:
+            logger.error(e)
+            return await compute()
+
+        if not locked:
+            for _ in range(int(settings.SEARCH_CACHE_LOCK_TIMEOUT / 0.05)):
+                await asyncio.sleep(0.05)
+                try:
+                    cached = await self.client.get(key)
+                except RedisError:
+                    break
+                if cached is not None:
+                    return json.loads(cached)
+            return await compute()
+
+        try:
+            value = await compute()
+            await self._quietly(
+                self.client.set(key, json.dumps(value, default=str), ex=ttl)
+            )
+            return value
+        finally:
+            await self._quietly(self.client.delete(lock_key))
+
+    async def _count(self, field: str, amount: int = 1) -> None:
+        if amount:
+            # redis-py types the commands of its sync and asyncio clients alike
+            await self._quietly(self.client.hincrby(STATS_KEY, field, amount))  # type: ignore[arg-type]
+
+    @staticmethod
+    async def _quietly(command: Awaitable[Any]) -> Any:
+        # A failing cache must never fail the search itself
+        try:
+            return await command
+        except RedisError as e:
+            logger.error(e)
+
+    async def record_click(self, event_id: Any, user_id: Any) -> None:
+        # One increment in Redis; the search indexer writes them in batches. A user
+        # counts once per event and flush, so clicking again cannot inflate its ranking
+        first = await self._quietly(
+            self.client.set(
+                f"{CLICKED_KEY}:{user_id}:{event_id}",
+                1,
+                nx=True,
+                px=int(settings.SEARCH_CLICKS_FLUSH_INTERVAL * 1000),
+            )
+        )
+        if first:
+            await self._quietly(self.client.hincrby(CLICKS_KEY, str(event_id), 1))  # type: ignore[arg-type]
+
+    async def stats(self) -> dict[str, int]:
+        stats = await self.client.hgetall(STATS_KEY)  # type: ignore[misc]
+        generation = await self.client.get(GENERATION_KEY)
+        return {
+            "hits": int(stats.get(b"hits", 0)),
+            "misses": int(stats.get(b"misses", 0)),
+            "generation": int(generation or 0),
+        }
@@ -54,18 +54,68 @@ class Settings(BaseSettings):
     RD_SERVER: str
     RD_PORT: int = 6379
     RD_PASSWORD: str = ""
+    RD_SOCKET_TIMEOUT: float = 0.5
+
+    SEARCH_CACHE_TTL: int = 300
+    SEARCH_CACHE_LOCK_TIMEOUT: float = 2.0
+    SEARCH_SUGGEST_CACHE_TTL: int = 30
+    SEARCH_SUGGEST_MAX_SIZE: int = 10
+    SEARCH_PAGE_MAX_SIZE: int = 100
+    SEARCH_DEFAULT_RADIUS: str = "25km"
+    SEARCH_BATCH_MAX_QUERIES: int = 10
+    # Totals are exact up to this many hits, so large result sets stop counting early
+    SEARCH_TRACK_TOTAL_HITS: int = 1000
+    SEARCH_BY_IDS_MAX_SIZE: int = 100
+    SEARCH_SIMILAR_MAX_SIZE: int = 20
+    # Similar events are cached per generation, so any indexed change refreshes them
+    SEARCH_SIMILAR_CACHE_TTL: int = 3600
+    # Relevance is multiplied by ln(2 + popularity), popularity being the attendees
+    # plus SEARCH_CLICK_WEIGHT per click, and by a gauss decay around the start date
+    SEARCH_CLICK_WEIGHT: float = 0.1
+    SEARCH_DECAY_SCALE: str = "180d"
+    SEARCH_DECAY_OFFSET: str = "7d"
+    SEARCH_DECAY: float = 0.5
+    SEARCH_CLICKS_FLUSH_INTERVAL: float = 60.0
+    # "memory" searches an in-process copy of the events instead of Elasticsearch
+    SEARCH_BACKEND: Literal["elasticsearch", "memory"] = "elasticsearch"
+    SEARCH_MEMORY_REFRESH_INTERVAL: float = 5.0
+    # Postgres full-text search answers while Elasticsearch is down or slow
+    SEARCH_FALLBACK: bool = True
+    SEARCH_FALLBACK_TIMEOUT: float = 2.0
+    SEARCH_BREAKER_FAILURES: int = 5
+    SEARCH_BREAKER_RESET_TIMEOUT: float = 30.0
 
     ES_SERVER: str = "elasticsearch"
     ES_PORT: int = 9200
     ES_INDEX: str
     ES_USER: str
     ES_PASSWORD: str = ""
+    ES_REPLICAS: int = 1
+    ES_KEEP_GENERATIONS: int = 2
+    ES_CONNECTIONS_PER_NODE: int = 100
+    ES_REQUEST_TIMEOUT: float = 10.0
+    ES_PIT_KEEP_ALIVE: str = "1m"
+    ES_BULK_CHUNK_SIZE: int = 1000
+    ES_BULK_MAX_RETRIES: int = 5
+    ES_REINDEX_WORKERS: int = 4
+    ES_OUTBOX_BATCH_SIZE: int = 500
+    ES_OUTBOX_POLL_INTERVAL: float = 1.0
+    # Nodes that hold the read-only indices of past years
+    ES_FROZEN_TIER_PREFERENCE: str = "data_warm,data_hot"
 
     POSTGRES_SERVER: str
     POSTGRES_PORT: int = 5432
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
+    # Per engine and process: each worker has a sync and an async engine, so it may
+    # open up to 2 * (POSTGRES_POOL_SIZE + POSTGRES_MAX_OVERFLOW) connections
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_POOL_TIMEOUT: float = 30.0
+    # Seconds before a connection is replaced, -1 to keep them open indefinitely
+    POSTGRES_POOL_RECYCLE: int = 1800
+    POSTGRES_POOL_PRE_PING: bool = True
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -79,6 +129,30 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Optional read replica for safe GET handlers, the other POSTGRES_REPLICA_*
+    # settings default to the primary's. It gets its own pools, sized as above
+    POSTGRES_REPLICA_SERVER: str | None = None
+    POSTGRES_REPLICA_PORT: int | None = None
+    POSTGRES_REPLICA_USER: str | None = None
+    POSTGRES_REPLICA_PASSWORD: str | None = None
+    POSTGRES_REPLICA_DB: str | None = None
+    # Seconds a client's reads stay on the primary after it writes
+    POSTGRES_READ_YOUR_WRITES_SECONDS: int = 5
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def SQLALCHEMY_REPLICA_DATABASE_URI(self) -> MultiHostUrl | None:
+        if not self.POSTGRES_REPLICA_SERVER:
+            return None
+        return MultiHostUrl.build(
+            scheme="postgresql+psycopg",
+            username=self.POSTGRES_REPLICA_USER or self.POSTGRES_USER,
+            password=self.POSTGRES_REPLICA_PASSWORD or self.POSTGRES_PASSWORD,
+            host=self.POSTGRES_REPLICA_SERVER,
+            port=self.POSTGRES_REPLICA_PORT or self.POSTGRES_PORT,
+            path=self.POSTGRES_REPLICA_DB or self.POSTGRES_DB,
+        )
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -122,7 +196,7 @@ class Settings(BaseSettings):
     @model_validator(mode="after")
     def _enforce_non_default_secrets(self) -> Self:
         self._check_default_secret("SECRET_KEY", self.SECRET_KEY)
-        self._check_default_secret("POSTGRES_PASSWORD", self.POSTGRES_PASSWORD)        
+        self._check_default_secret("POSTGRES_PASSWORD", self.POSTGRES_PASSWORD)
         self._check_default_secret("RD_PASSWORD", self.POSTGRES_PASSWORD)
         self._check_default_secret(
             "FIRST_SUPERUSER_PASSWORD", self.FIRST_SUPERUSER_PASSWORD
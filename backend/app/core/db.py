@@ -1,14 +1,52 @@
+from typing import Any
+
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
-from app.models import User, Role, Status, Category
+from app.core.pool_metrics import (
+    InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool, PoolMetrics)
+from app.models import User, Role, Status, Category, City
 from app.schemas.users import UserCreate
 from app.schemas.roles import RoleCreate
 from app.schemas.status import StatusCreate
 from app.schemas.categories import CategoryCreate
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+
+def pool_options() -> dict[str, Any]:
+    return {
+        "pool_size": settings.POSTGRES_POOL_SIZE,
+        "max_overflow": settings.POSTGRES_MAX_OVERFLOW,
+        "pool_timeout": settings.POSTGRES_POOL_TIMEOUT,
+        "pool_recycle": settings.POSTGRES_POOL_RECYCLE,
+        "pool_pre_ping": settings.POSTGRES_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI),
+                       poolclass=InstrumentedQueuePool, **pool_options())
+# Same database through psycopg's async driver, for routes that must not block the event loop
+async_engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI),
+                                   poolclass=InstrumentedAsyncAdaptedQueuePool,
+                                   **pool_options())
+# Served by GET /utils/pool-metrics/
+pool_metrics = {
+    "primary": PoolMetrics(engine),
+    "primary_async": PoolMetrics(async_engine.sync_engine),
+}
+
+# Read replica, None when POSTGRES_REPLICA_SERVER is not set and reads stay on the primary
+replica_engine = None
+async_replica_engine = None
+if settings.SQLALCHEMY_REPLICA_DATABASE_URI:
+    replica_engine = create_engine(str(settings.SQLALCHEMY_REPLICA_DATABASE_URI),
+                                   poolclass=InstrumentedQueuePool, **pool_options())
+    async_replica_engine = create_async_engine(
+        str(settings.SQLALCHEMY_REPLICA_DATABASE_URI),
+        poolclass=InstrumentedAsyncAdaptedQueuePool, **pool_options())
+    pool_metrics["replica"] = PoolMetrics(replica_engine)
+    pool_metrics["replica_async"] = PoolMetrics(async_replica_engine.sync_engine)
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -29,6 +67,7 @@ def init_db(session: Session) -> None:
     role = session.exec(
         select(Role).where(Role.role == settings.ROLES[0])
     ).first()
+    role_admin = role
     if not role:
         print(settings.ROLES[0])
         for preset in settings.ROLES:
@@ -38,6 +77,8 @@ def init_db(session: Session) -> None:
             role = crud.create_role(session=session, role_create=role_in)
             if preset == settings.ROLES[0]:
                 role_admin = role
+    # The first role was either found or just created
+    assert role_admin is not None
 
     # Estados de evento iniciales
     status = session.exec(
@@ -61,6 +102,11 @@ def init_db(session: Session) -> None:
             )
             category = crud.create_category(session=session, category_create=category_in)
 
+    # Ciudades para la geocodificación de eventos
+    city = session.exec(select(City).limit(1)).first()
+    if not city:
+        crud.load_cities(session=session)
+
     # Crear primer super usuario
     user = session.exec(
         select(User).where(User.email == settings.FIRST_SUPERUSER)
@@ -1,50 +1,414 @@
-from elasticsearch import Elasticsearch
+import json
+import re
+from collections.abc import Collection, Iterable, Sequence
+from pathlib import Path
+from typing import Any, cast
+
+from elasticsearch import AsyncElasticsearch, BadRequestError, Elasticsearch, helpers
 
 from app.core.config import settings
 
+# Mappings for every <ES_INDEX>_v<N>-<year> index. Bump "version" when they change so
+# running deployments replace the installed template.
+EVENTS_TEMPLATE = json.loads(
+    (Path(__file__).parent / "events_template.json").read_text()
+)
+_PARTITION = re.compile(r"(?P<generation>.+_v\d+)(?:-(?P<year>\d{4}))?")
+
+
+def generation_of(index_name: str) -> str | None:
+    m = _PARTITION.fullmatch(index_name)
+    return m["generation"] if m else None
+
+
+def year_of(index_name: str) -> int | None:
+    m = _PARTITION.fullmatch(index_name)
+    return int(m["year"]) if m and m["year"] else None
+
+
+def year_alias(alias: str, year: int) -> str:
+    # Read alias of the events of one year in the live generation
+    return f"{alias}-{year}"
+
+
+def _ids_search(index_name: str, ids: Sequence[Any], source: Any) -> dict[str, Any]:
+    # A multi-get cannot address an alias over several year indices, so
+    # documents are looked up by id with a search instead
+    return {
+        "index": index_name,
+        "query": {"ids": {"values": [str(id) for id in ids]}},
+        "source": source,
+        "size": len(ids),
+        "track_total_hits": False,
+    }
+
+
+def _ids_as_mget(response: Any, ids: Sequence[Any]) -> dict[str, Any]:
+    # Same shape as a multi-get response: one entry per id, in order
+    hits = {hit["_id"]: hit for hit in response["hits"]["hits"]}
+    return {
+        "docs": [
+            {
+                "_index": hits[str(id)]["_index"],
+                "_id": str(id),
+                "found": True,
+                "_source": hits[str(id)].get("_source", {}),
+            }
+            if str(id) in hits
+            else {"_id": str(id), "found": False}
+            for id in ids
+        ]
+    }
+
 
 class ES_connector:
+    es_client: Elasticsearch
+
     def __init__(self) -> None:
-        self.es_client = None
         self.connect()
 
-    def connect(self):
+    def connect(self) -> None:
         es = Elasticsearch(
             hosts=[f"http://{settings.ES_SERVER}:{settings.ES_PORT}"],
             basic_auth=(settings.ES_USER, settings.ES_PASSWORD),
-            verify_certs=False)
+            verify_certs=False,
+        )
         self.es_client = es
 
-    def create_index(self, index_name):
-        self.es_client.indices.delete(index=index_name, ignore_unavailable=True)
-        self.es_client.indices.create(index=index_name)
+    def put_template(self) -> None:
+        name = f"{settings.ES_INDEX}-events"
+        installed = self.es_client.options(
+            ignore_status=404
+        ).indices.get_index_template(name=name)
+        versions = [
+            template["index_template"].get("version")
+            for template in installed.get("index_templates", [])
+        ]
+        if EVENTS_TEMPLATE["version"] in versions:
+            return
+        self.es_client.indices.put_index_template(
+            name=name,
+            index_patterns=[f"{settings.ES_INDEX}_v*"],
+            version=EVENTS_TEMPLATE["version"],
+            template=EVENTS_TEMPLATE["template"],
+        )
+
+    def create_index(self, index_name: str, **index_settings: Any) -> None:
+        # Mappings come from the index template
+        self.put_template()
+        self.es_client.indices.create(index=index_name, settings=index_settings or None)
+
+    def generations(self, alias: str) -> list[str]:
+        # Versioned indices behind an alias are named <alias>_v<N>, or
+        # <alias>_v<N>-<year> when the generation is split by year
+        indices = self.es_client.indices.get(
+            index=f"{alias}_v*", allow_no_indices=True, ignore_unavailable=True
+        )
+        names = {generation for generation in map(generation_of, indices) if generation}
+        return sorted(names, key=lambda name: int(name.rsplit("_v", 1)[1]))
 
-    def insert_documents(self, index_name, documents):
-        operations = []
-        for document in documents:
-            operations.append({'index': {'_index': index_name}})
-            operations.append(document)
-        return self.es_client.bulk(operations=operations)
+    def generation_indices(self, generation: str) -> dict[int | None, str]:
+        """Returns the indices of a generation by year, None for an unsplit one."""
+        indices = self.es_client.indices.get(
+            index=f"{generation},{generation}-*",
+            allow_no_indices=True,
+            ignore_unavailable=True,
+        )
+        return {
+            year_of(name): name
+            for name in indices
+            if name == generation or generation_of(name) == generation
+        }
 
-    def insert_document(self, index_name, document_type, document_id, document):
+    def create_generation(self, alias: str, years: Iterable[int] = ()) -> str:
+        generations = self.generations(alias)
+        number = int(generations[-1].rsplit("_v", 1)[1]) + 1 if generations else 1
+        generation = f"{alias}_v{number}"
+        for year in sorted(years):
+            self.create_year_index(generation, year, building=True)
+        return generation
+
+    def create_year_index(
+        self, generation: str, year: int, building: bool = False
+    ) -> str:
+        alias = generation.rsplit("_v", 1)[0]
+        index_name = f"{generation}-{year}"
+        aliases: dict[str, dict[str, Any]]
+        if building:
+            # Bulk loading is faster without replicas and periodic refreshes
+            index_settings = {"number_of_replicas": 0, "refresh_interval": "-1"}
+            aliases = {f"{alias}_building": {}}
+        else:
+            index_settings = {"number_of_replicas": settings.ES_REPLICAS}
+            aliases = {alias: {}, year_alias(alias, year): {}}
+        self.put_template()
         try:
-            return self.es_client.index(index=index_name, doc_type=document_type,
-                                        id=document_id, body=document,
-                                        refresh='wait_for', request_timeout=30)
+            self.es_client.indices.create(
+                index=index_name, settings=index_settings, aliases=aliases
+            )
+        except BadRequestError as e:
+            # Another process created it first
+            if not isinstance(e.body, dict) or (
+                e.body.get("error", {}).get("type")
+                != "resource_already_exists_exception"
+            ):
+                raise
+        return index_name
+
+    def finish_generation(self, generation: str, replicas: int) -> None:
+        indices = ",".join(self.generation_indices(generation).values())
+        self.es_client.indices.put_settings(
+            index=indices,
+            settings={"number_of_replicas": replicas, "refresh_interval": None},
+        )
+        self.es_client.indices.refresh(index=indices)
+
+    def alias_indices(self, alias: str) -> list[str]:
+        if not self.es_client.indices.exists_alias(name=alias):
+            return []
+        return list(self.es_client.indices.get_alias(name=alias))
+
+    def write_targets(self, alias: str) -> list[tuple[str, bool]]:
+        # Generations still being built receive live changes too, so they are
+        # up to date by the time the alias is swapped. Returns (generation, building) pairs.
+        live = [generation_of(name) or name for name in self.alias_indices(alias)]
+        building = [
+            generation_of(name) or name
+            for name in self.alias_indices(f"{alias}_building")
+        ]
+        return [
+            *((generation, False) for generation in dict.fromkeys(live)),
+            *((generation, True) for generation in dict.fromkeys(building)),
+        ]
+
+    def locate(
+        self, index_names: Sequence[str], ids: Collection[Any]
+    ) -> dict[str, str]:
+        """Returns the index holding each id among index_names, read in real time."""
+        if not index_names or not ids:
+            return {}
+        response = self.es_client.mget(
+            docs=[
+                {"_index": index_name, "_id": str(id)}
+                for index_name in index_names
+                for id in ids
+            ],
+            source=False,
+        )
+        return {
+            doc["_id"]: doc["_index"] for doc in response["docs"] if doc.get("found")
+        }
+
+    def swap_alias(self, alias: str, generation: str) -> None:
+        current = self.es_client.options(ignore_status=404).indices.get_alias(
+            name=f"{alias},{alias}-*"
+        )
+        # Without any such alias the body is the 404 error, {"error": {...}, "status": 404}
+        actions = [
+            {"remove": {"index": index_name, "alias": name}}
+            for index_name, value in current.items()
+            if isinstance(value, dict) and index_name != "error"
+            for name in value.get("aliases", {})
+        ]
+        if not actions and self.es_client.indices.exists(index=alias):
+            # Concrete index created before versioned indices were introduced
+            actions.append({"remove_index": {"index": alias}})
+        indices = self.generation_indices(generation)
+        for year, index_name in indices.items():
+            actions.append({"add": {"index": index_name, "alias": alias}})
+            if year is not None:
+                actions.append(
+                    {"add": {"index": index_name, "alias": year_alias(alias, year)}}
+                )
+        self.es_client.indices.update_aliases(actions=actions)
+        self.es_client.options(ignore_status=404).indices.delete_alias(
+            index=",".join(indices.values()), name=f"{alias}_building"
+        )
+
+    def rollback_alias(self, alias: str) -> str:
+        generations = self.generations(alias)
+        current = [generation_of(name) for name in self.alias_indices(alias)]
+        if (
+            not current
+            or current[0] not in generations
+            or generations.index(current[0]) == 0
+        ):
+            raise ValueError(f"No previous generation of {alias} to roll back to")
+        previous = generations[generations.index(current[0]) - 1]
+        self.swap_alias(alias, previous)
+        return previous
+
+    def prune_generations(self, alias: str, keep: int) -> None:
+        live = {generation_of(name) for name in self.alias_indices(alias)}
+        previous = [name for name in self.generations(alias) if name not in live]
+        for generation in previous[: max(len(previous) - keep, 0)]:
+            self.es_client.indices.delete(
+                index=",".join(self.generation_indices(generation).values())
+            )
+
+    def freeze_past_years(self, alias: str, before_year: int) -> list[str]:
+        """
+        Merges the indices of years before before_year into one segment, blocks
+        writes to them and moves them to warm nodes, away from the hot shards
+        that take new events.
+        """
+        frozen = []
+        for index_name in self.alias_indices(alias):
+            year = year_of(index_name)
+            if year is None or year >= before_year:
+                continue
+            self.es_client.indices.put_settings(
+                index=index_name,
+                settings={
+                    "index.blocks.write": True,
+                    "index.routing.allocation.include._tier_preference": settings.ES_FROZEN_TIER_PREFERENCE,
+                },
+            )
+            self.es_client.indices.forcemerge(index=index_name, max_num_segments=1)
+            frozen.append(index_name)
+        return frozen
+
+    def unfreeze(self, index_name: str) -> None:
+        # Until the next freeze, so late changes to past events can be written
+        self.es_client.indices.put_settings(
+            index=index_name, settings={"index.blocks.write": False}
+        )
+
+    def count(self, index_name: str) -> int:
+        count: int = self.es_client.count(index=index_name)["count"]
+        return count
+
+    def insert_documents(
+        self, index_name: str, documents: Iterable[dict[str, Any]]
+    ) -> tuple[int, list[dict[str, Any]]]:
+        actions = (
+            {"_index": index_name, "_source": document} for document in documents
+        )
+        return self.bulk(actions)
+
+    def bulk(
+        self, actions: Iterable[dict[str, Any]], **bulk_args: Any
+    ) -> tuple[int, list[dict[str, Any]]]:
+        # Per-item failures are returned instead of raised so the caller decides what to retry
+        success, errors = helpers.bulk(
+            self.es_client,
+            actions,
+            raise_on_error=False,
+            raise_on_exception=True,
+            **bulk_args,
+        )
+        # Only stats_only=True counts the errors instead of listing them
+        return success, cast(list[dict[str, Any]], errors)
+
+    def insert_document(
+        self,
+        index_name: str,
+        document_type: str | None,
+        document_id: Any,
+        document: dict[str, Any],
+    ) -> Any:
+        # Elasticsearch 8 has no mapping types, document_type is ignored
+        try:
+            return self.es_client.options(request_timeout=30).index(
+                index=index_name,
+                id=document_id,
+                document=document,
+                refresh="wait_for",
+            )
         except Exception as e:
             print(e)
 
-    def search(self, index_name, **query_args):
+    def search(self, index_name: str | None = None, **query_args: Any) -> Any:
+        # index_name is omitted when searching a point in time
         return self.es_client.search(index=index_name, **query_args)
 
-    def get_data(self, index_name, search_query, size=10):
+    def msearch(self, index_name: str, searches: Iterable[dict[str, Any]]) -> Any:
+        # Every search body goes after an empty header, so it runs on index_name
+        return self.es_client.msearch(
+            index=index_name,
+            searches=[line for body in searches for line in ({}, body)],
+        )
+
+    def open_point_in_time(self, index_name: str, keep_alive: str) -> str:
+        pit_id: str = self.es_client.open_point_in_time(
+            index=index_name, keep_alive=keep_alive
+        )["id"]
+        return pit_id
+
+    def close_point_in_time(self, pit_id: str) -> None:
+        self.es_client.options(ignore_status=404).close_point_in_time(id=pit_id)
+
+    def get_data(
+        self, index_name: str, search_query: dict[str, Any], size: int = 10
+    ) -> Any:
+        # search_query is a request body, such as {"query": {...}}
         try:
-            result = self.es_client.search(index=index_name, body=search_query,
-                                           allow_partial_search_results=True,
-                                           size=size, request_timeout=120)
+            result = self.es_client.options(request_timeout=120).search(
+                index=index_name,
+                allow_partial_search_results=True,
+                size=size,
+                **search_query,
+            )
             return result
         except Exception as e:
             print(e)
 
-    def retrieve_document(self, index_name, id):
-        return self.es.get(index=index_name, id=id)
+    def retrieve_document(self, index_name: str, id: Any) -> Any:
+        return self.es_client.get(index=index_name, id=id)
+
+    def mget(
+        self, index_name: str, ids: Sequence[Any], source: Any = True
+    ) -> dict[str, Any]:
+        return _ids_as_mget(
+            self.es_client.search(**_ids_search(index_name, ids, source)), ids
+        )
+
+
+class AsyncES_connector:
+    """
+    Elasticsearch client for the API. A single instance is created in the
+    application lifespan so every request reuses its connection pool.
+    """
+
+    def __init__(self) -> None:
+        self.es_client = AsyncElasticsearch(
+            hosts=[f"http://{settings.ES_SERVER}:{settings.ES_PORT}"],
+            basic_auth=(settings.ES_USER, settings.ES_PASSWORD),
+            verify_certs=False,
+            connections_per_node=settings.ES_CONNECTIONS_PER_NODE,
+            request_timeout=settings.ES_REQUEST_TIMEOUT,
+        )
+
+    async def close(self) -> None:
+        await self.es_client.close()
+
+    async def search(self, index_name: str | None = None, **query_args: Any) -> Any:
+        # index_name is omitted when searching a point in time
+        return await self.es_client.search(index=index_name, **query_args)
+
+    async def msearch(self, index_name: str, searches: Iterable[dict[str, Any]]) -> Any:
+        # One round trip for every search; each response carries its own status
+        return await self.es_client.msearch(
+            index=index_name,
+            searches=[line for body in searches for line in ({}, body)],
+        )
+
+    async def open_point_in_time(self, index_name: str, keep_alive: str) -> str:
+        # index_name may list year aliases, some of them without an index yet
+        response = await self.es_client.open_point_in_time(
+            index=index_name, keep_alive=keep_alive, ignore_unavailable=True
+        )
+        pit_id: str = response["id"]
+        return pit_id
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        await self.es_client.options(ignore_status=404).close_point_in_time(id=pit_id)
+
+    async def retrieve_document(self, index_name: str, id: Any) -> Any:
+        return await self.es_client.get(index=index_name, id=id)
+
+    async def mget(
+        self, index_name: str, ids: Sequence[Any], source: Any = True
+    ) -> dict[str, Any]:
+        response = await self.es_client.search(**_ids_search(index_name, ids, source))
+        return _ids_as_mget(response, ids)
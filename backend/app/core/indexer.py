@@ -0,0 +1,542 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Any
+
+import redis
+import sqlalchemy
+from redis.exceptions import ResponseError
+from sqlalchemy import Integer, Row, Select, column, delete, or_, update, values
+from sqlmodel import Session, col, func, select
+
+from app.core.cache import (
+    CLICKS_FLUSHING_KEY,
+    CLICKS_KEY,
+    bump_search_generation,
+    redis_connection_args,
+)
+from app.core.config import settings
+from app.core.db import engine
+from app.core.es import ES_connector
+from app.core.search_backend import InMemorySearchBackend, parse_date
+from app.models import Category, Event, SearchOutbox, Sessions, Status
+
+logger = logging.getLogger(__name__)
+
+# Outbox entities that only change the counters of an event
+COUNTER_ENTITIES = {"attendance", "clicks"}
+# Fields of the search document they change, as written by counters_document
+COUNTER_FIELDS = {"attendee_count", "seats_left", "click_count", "popularity"}
+
+
+def event_documents_statement() -> Select[Any]:
+    # One flat row per event, with everything the search document needs
+    session_titles = (
+        select(func.array_agg(Sessions.title))
+        .where(Sessions.event_id == Event.id)
+        .correlate(Event)
+        .scalar_subquery()
+    )
+    # More columns than the overloads of sqlmodel's select() take
+    return (
+        sqlalchemy.select(
+            col(Event.id),
+            col(Event.title),
+            col(Event.description),
+            col(Event.start_datetime),
+            col(Event.end_datetime),
+            col(Event.location),
+            col(Event.latitude),
+            col(Event.longitude),
+            col(Event.capacity),
+            col(Event.attendee_count),
+            col(Event.click_count),
+            col(Event.organizer_id),
+            col(Category.category),
+            col(Status.status),
+            session_titles.label("sessions"),
+        )
+        .join(Category, col(Category.id) == Event.category_id)
+        .join(Status, col(Status.id) == Event.status_id)
+    )
+
+
+def build_event_document(row: Row[Any]) -> dict[str, Any]:
+    return {
+        "id": str(row.id),
+        "title": row.title,
+        "description": row.description,
+        "start_datetime": row.start_datetime.isoformat(),
+        "end_datetime": row.end_datetime.isoformat(),
+        "location": row.location,
+        "coordinates": (
+            {"lat": row.latitude, "lon": row.longitude}
+            if row.latitude is not None and row.longitude is not None
+            else None
+        ),
+        "capacity": row.capacity,
+        "attendee_count": row.attendee_count,
+        "seats_left": seats_left(row.capacity, row.attendee_count),
+        "click_count": row.click_count,
+        "popularity": popularity(row.attendee_count, row.click_count),
+        "organizer_id": str(row.organizer_id),
+        "category": row.category,
+        "status": row.status,
+        "sessions": row.sessions or [],
+    }
+
+
+def seats_left(capacity: int, attendee_count: int) -> int:
+    return max(capacity - attendee_count, 0)
+
+
+def popularity(attendee_count: Any, click_count: Any) -> Any:
+    # Works on values and on columns alike, so Postgres searches rank the same way
+    return attendee_count + settings.SEARCH_CLICK_WEIGHT * click_count
+
+
+def counters_document(row: Row[Any]) -> dict[str, Any]:
+    # The part of the search document that changes with registrations and clicks
+    return {
+        "attendee_count": row.attendee_count,
+        "seats_left": seats_left(row.capacity, row.attendee_count),
+        "click_count": row.click_count,
+        "popularity": popularity(row.attendee_count, row.click_count),
+    }
+
+
+def event_year(start_datetime: Any) -> int:
+    # Year indices split events by their UTC start, like year: filters in Elasticsearch
+    return parse_date(start_datetime).year
+
+
+class YearIndices:
+    """The indices of one generation by year, created when a year first appears."""
+
+    def __init__(self, es: ES_connector, generation: str, building: bool) -> None:
+        self.es = es
+        self.generation = generation
+        self.building = building
+        self.indices = es.generation_indices(generation)
+
+    def index_for(self, start_datetime: Any) -> str:
+        if None in self.indices:
+            # Generations from before the split by year are a single index
+            return self.indices[None]
+        year = event_year(start_datetime)
+        if year not in self.indices:
+            self.indices[year] = self.es.create_year_index(
+                self.generation, year, building=self.building
+            )
+        return self.indices[year]
+
+
+def _index_actions(
+    indices: YearIndices, rows: Iterable[Row[Any]]
+) -> Iterator[dict[str, Any]]:
+    for row in rows:
+        yield {
+            "_op_type": "index",
+            "_index": indices.index_for(row.start_datetime),
+            "_id": str(row.id),
+            "_source": build_event_document(row),
+        }
+
+
+def load_event_documents() -> list[dict[str, Any]]:
+    with Session(engine) as session:
+        return [
+            build_event_document(row)
+            for row in session.execute(
+                event_documents_statement().order_by(col(Event.id))
+            )
+        ]
+
+
+def _without_counters(documents: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    return [
+        {
+            field: value
+            for field, value in document.items()
+            if field not in COUNTER_FIELDS
+        }
+        for document in documents
+    ]
+
+
+async def refresh_memory_backend(backend: InMemorySearchBackend) -> None:
+    # Without Elasticsearch there is no search indexer, so the in-memory copy
+    # is compared with Postgres periodically and rebuilt when it changed
+    cache = redis.Redis(**redis_connection_args())
+    flushed_at = time.monotonic()
+    while True:
+        await asyncio.sleep(settings.SEARCH_MEMORY_REFRESH_INTERVAL)
+        if time.monotonic() - flushed_at >= settings.SEARCH_CLICKS_FLUSH_INTERVAL:
+            # There is no search indexer either, so clicks are flushed from here
+            flushed_at = time.monotonic()
+            await asyncio.to_thread(flush_clicks_quietly, cache)
+        try:
+            documents = await asyncio.to_thread(load_event_documents)
+        except Exception as e:
+            logger.error(e)
+            continue
+        if documents != list(backend.documents.values()):
+            # Like the search indexer, counters alone leave the cache to expire
+            searchable = _without_counters(documents) != _without_counters(
+                backend.documents.values()
+            )
+            backend.load(documents)
+            if searchable:
+                await asyncio.to_thread(bump_search_generation, cache)
+
+
+def _changed_event_ids(session: Session, entries: list[SearchOutbox]) -> set[uuid.UUID]:
+    event_ids = {entry.entity_id for entry in entries if entry.entity == "event"}
+    category_ids = {entry.entity_id for entry in entries if entry.entity == "category"}
+    status_ids = {entry.entity_id for entry in entries if entry.entity == "status"}
+    if category_ids or status_ids:
+        # Category and status names are denormalized into every event document
+        statement = select(Event.id).where(
+            or_(
+                col(Event.category_id).in_(category_ids),
+                col(Event.status_id).in_(status_ids),
+            )
+        )
+        event_ids.update(session.exec(statement).all())
+    return event_ids
+
+
+def drain_outbox(
+    *,
+    session: Session,
+    es: ES_connector,
+    batch_size: int,
+    cache: redis.Redis | None = None,
+) -> int:
+    """
+    Sends one batch of pending outbox rows to Elasticsearch and deletes them,
+    then invalidates the cached searches when a searchable field changed.
+    Returns the number of outbox rows processed.
+    """
+    statement = (
+        select(SearchOutbox)
+        .order_by(col(SearchOutbox.id))
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    entries = list(session.exec(statement).all())
+    if not entries:
+        return 0
+
+    event_ids = _changed_event_ids(session, entries)
+    rows = session.execute(
+        event_documents_statement().where(col(Event.id).in_(event_ids))
+    ).all()
+    # Registrations and clicks only change a few counters, so those events get
+    # a partial update instead of rebuilding the whole document
+    counter_ids = {
+        entry.entity_id for entry in entries if entry.entity in COUNTER_ENTITIES
+    } - event_ids
+    counter_rows = (
+        session.execute(
+            select(
+                Event.id, Event.capacity, Event.attendee_count, Event.click_count
+            ).where(col(Event.id).in_(counter_ids))
+        ).all()
+        if counter_ids
+        else []
+    )
+    actions: list[dict[str, Any]] = []
+    for generation, building in es.write_targets(settings.ES_INDEX):
+        indices = YearIndices(es, generation, building)
+        # Where each event is now, read in real time, to move it when its year changed
+        located = es.locate(list(indices.indices.values()), event_ids | counter_ids)
+        for action in _index_actions(indices, rows):
+            previous = located.get(action["_id"])
+            if previous is not None and previous != action["_index"]:
+                actions.append(
+                    {"_op_type": "delete", "_index": previous, "_id": action["_id"]}
+                )
+            actions.append(action)
+        # Events that no longer exist in Postgres were deleted
+        for event_id in event_ids - {row.id for row in rows}:
+            if str(event_id) in located:
+                actions.append(
+                    {
+                        "_op_type": "delete",
+                        "_index": located[str(event_id)],
+                        "_id": str(event_id),
+                    }
+                )
+        for row in counter_rows:
+            # Events not indexed yet get their whole document from their own outbox row
+            if str(row.id) in located:
+                actions.append(
+                    {
+                        "_op_type": "update",
+                        "_index": located[str(row.id)],
+                        "_id": str(row.id),
+                        "doc": counters_document(row),
+                    }
+                )
+
+    if actions:
+        _, errors = es.bulk(actions, max_retries=settings.ES_BULK_MAX_RETRIES)
+        # Past years are read-only once frozen; a change to one of their events
+        # opens its index for writes again
+        blocked = {
+            item["_index"]
+            for error in errors
+            for item in error.values()
+            if item.get("status") == 403
+        }
+        if blocked:
+            for index_name in blocked:
+                es.unfreeze(index_name)
+            errors = [
+                error
+                for error in errors
+                if next(iter(error.values()))["_index"] not in blocked
+            ]
+            _, retried = es.bulk(
+                [action for action in actions if action["_index"] in blocked],
+                max_retries=settings.ES_BULK_MAX_RETRIES,
+            )
+            errors.extend(retried)
+        for error in errors:
+            operation, item = next(iter(error.items()))
+            if operation in ("delete", "update") and item.get("status") == 404:
+                continue
+            logger.error(
+                "Search indexer failed to %s event %s: %s",
+                operation,
+                item.get("_id"),
+                item.get("error"),
+            )
+
+    session.execute(
+        delete(SearchOutbox).where(
+            col(SearchOutbox.id).in_([entry.id for entry in entries])
+        )
+    )
+    session.commit()
+    # Counters only move rankings and seats a little, cached pages with the old
+    # ones expire after SEARCH_CACHE_TTL instead of emptying the whole cache
+    if cache is not None and any(
+        entry.entity not in COUNTER_ENTITIES for entry in entries
+    ):
+        bump_search_generation(cache)
+    return len(entries)
+
+
+def flush_clicks(*, session: Session, client: redis.Redis) -> int:
+    """
+    Adds the clicks counted in Redis since the last flush to their events and
+    queues the partial updates of their search documents.
+    Returns the number of events updated.
+    """
+    # Clicks recorded from now on go to a new hash. A hash left by a flush
+    # that failed is sent first.
+    if not client.exists(CLICKS_FLUSHING_KEY):
+        try:
+            client.rename(CLICKS_KEY, CLICKS_FLUSHING_KEY)
+        except ResponseError:
+            # No clicks since the last flush
+            return 0
+    clicks: dict[uuid.UUID, int] = {}
+    counts: dict[bytes, bytes] = client.hgetall(CLICKS_FLUSHING_KEY)  # type: ignore[assignment]
+    for event_id, count in counts.items():
+        try:
+            clicks[uuid.UUID(event_id.decode())] = int(count)
+        except ValueError:
+            logger.error("Ignoring clicks of invalid event id %r", event_id)
+
+    updated: Sequence[uuid.UUID] = []
+    if clicks:
+        # SQLModel does not declare the __table__ SQLAlchemy gives every model
+        table = Event.__table__  # type: ignore[attr-defined]
+        added = values(
+            column("id", table.c.id.type), column("clicks", Integer), name="counts"
+        ).data(list(clicks.items()))
+        # Ids of events that do not exist are dropped here, and never reach the outbox
+        updated = (
+            session.execute(
+                update(table)
+                .where(table.c.id == added.c.id)
+                .values(click_count=table.c.click_count + added.c.clicks)
+                .returning(table.c.id)
+            )
+            .scalars()
+            .all()
+        )
+        session.add_all(
+            SearchOutbox(entity="clicks", entity_id=event_id) for event_id in updated
+        )
+        session.commit()
+    # Clicks are counted twice if this fails after the commit, and never lost
+    client.delete(CLICKS_FLUSHING_KEY)
+    return len(updated)
+
+
+def flush_clicks_quietly(client: redis.Redis) -> None:
+    try:
+        with Session(engine) as session:
+            flush_clicks(session=session, client=client)
+    except Exception as e:
+        # Counters stay in Redis until the next flush
+        logger.error(e)
+
+
+def run_outbox_worker() -> None:
+    es = ES_connector()
+    cache = redis.Redis(**redis_connection_args())
+    flushed_at = time.monotonic()
+    while True:
+        if time.monotonic() - flushed_at >= settings.SEARCH_CLICKS_FLUSH_INTERVAL:
+            flushed_at = time.monotonic()
+            flush_clicks_quietly(cache)
+        try:
+            with Session(engine) as session:
+                processed = drain_outbox(
+                    session=session,
+                    es=es,
+                    batch_size=settings.ES_OUTBOX_BATCH_SIZE,
+                    cache=cache,
+                )
+        except Exception as e:
+            # The batch is rolled back and stays in the outbox for the next attempt
+            logger.error(e)
+            processed = 0
+        if processed < settings.ES_OUTBOX_BATCH_SIZE:
+            time.sleep(settings.ES_OUTBOX_POLL_INTERVAL)
+
+
+def uuid_ranges(partitions: int) -> list[tuple[uuid.UUID | None, uuid.UUID | None]]:
+    # Postgres orders uuids bytewise, which matches their integer value
+    step = 2**128 // partitions
+    bounds = [uuid.UUID(int=step * number) for number in range(1, partitions)]
+    return list(zip([None, *bounds], [*bounds, None], strict=True))
+
+
+_partition_es: ES_connector | None = None
+
+
+def _init_partition_worker() -> None:
+    global _partition_es
+    # Connections inherited from the parent process must not be shared
+    engine.dispose(close=False)
+    _partition_es = ES_connector()
+
+
+def index_partition(
+    generation: str, lower: uuid.UUID | None, upper: uuid.UUID | None, chunk_size: int
+) -> tuple[int, int]:
+    """
+    Streams the events with lower <= id < upper into the year indices of generation.
+    Returns the number of indexed and failed documents.
+    """
+    es = _partition_es or ES_connector()
+    indices = YearIndices(es, generation, building=True)
+    statement = event_documents_statement().order_by(col(Event.id))
+    if lower is not None:
+        statement = statement.where(col(Event.id) >= lower)
+    if upper is not None:
+        statement = statement.where(col(Event.id) < upper)
+
+    indexed = failed = 0
+    with Session(engine) as session:
+        # yield_per fetches through a server-side cursor, one chunk at a time. The next
+        # chunk is only read once Elasticsearch has accepted the previous one.
+        result = session.execute(statement.execution_options(yield_per=chunk_size))
+        for number, rows in enumerate(result.partitions()):
+            success, errors = es.bulk(
+                _index_actions(indices, rows),
+                chunk_size=chunk_size,
+                max_retries=settings.ES_BULK_MAX_RETRIES,
+            )
+            indexed += success
+            failed += len(errors)
+            if errors:
+                operation, item = next(iter(errors[0].items()))
+                logger.error(
+                    "Chunk %s of range [%s, %s): %s documents failed, first error: %s",
+                    number,
+                    lower,
+                    upper,
+                    len(errors),
+                    item.get("error"),
+                )
+    return indexed, failed
+
+
+def _event_counts(session: Session) -> tuple[int, int]:
+    """Events in Postgres, and events with changes the outbox has not sent yet."""
+    events = session.exec(select(func.count()).select_from(Event)).one()
+    pending = session.exec(
+        select(func.count(col(SearchOutbox.entity_id).distinct())).where(
+            SearchOutbox.entity == "event"
+        )
+    ).one()
+    return events, pending
+
+
+def reindex_events(*, es: ES_connector, workers: int, chunk_size: int) -> str:
+    """
+    Builds a new generation of the events index from Postgres, one index per
+    year of start_datetime, and points the ES_INDEX alias to it once it holds
+    every event. Searches keep using the previous generation until the swap.
+    """
+    alias = settings.ES_INDEX
+    # The current year always has an index, so the alias is never left empty
+    generation = es.create_generation(alias, years=[datetime.now(timezone.utc).year])
+    logger.info("Building %s with %s workers", generation, workers)
+
+    started = time.perf_counter()
+    indexed = failed = 0
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_partition_worker
+    ) as pool:
+        futures = [
+            pool.submit(index_partition, generation, lower, upper, chunk_size)
+            for lower, upper in uuid_ranges(workers)
+        ]
+        for future in as_completed(futures):
+            partition_indexed, partition_failed = future.result()
+            indexed += partition_indexed
+            failed += partition_failed
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Indexed %s documents in %.1fs (%.0f docs/s), %s failed",
+        indexed,
+        elapsed,
+        indexed / elapsed if elapsed else 0,
+        failed,
+    )
+
+    es.finish_generation(generation, replicas=settings.ES_REPLICAS)
+    # Counted around the documents, as the outbox keeps writing to the generation;
+    # only changes still waiting in it may be missing from it
+    with Session(engine) as session:
+        before, pending_before = _event_counts(session)
+    total = es.count(f"{generation}-*")
+    with Session(engine) as session:
+        after, pending_after = _event_counts(session)
+    pending = max(pending_before, pending_after)
+    if (
+        failed
+        or not min(before, after) - pending <= total <= max(before, after) + pending
+    ):
+        raise RuntimeError(
+            f"{generation} has {total} documents but Postgres has {after} events "
+            f"and {pending} pending changes, the alias {alias} was not changed"
+        )
+
+    es.swap_alias(alias, generation)
+    bump_search_generation(redis.Redis(**redis_connection_args()))
+    es.prune_generations(alias, keep=settings.ES_KEEP_GENERATIONS)
+    logger.info("%s now points to %s", alias, generation)
+    return generation
@@ -0,0 +1,521 @@
+"""
+Search backend over Postgres full-text search, used while Elasticsearch is
+unavailable. It translates the same subset of the query DSL as
+InMemorySearchBackend to SQL on the event.search_vector GIN index.
+"""
+import asyncio
+import math
+import re
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import (
+    ColumnElement,
+    and_,
+    false,
+    func,
+    literal,
+    not_,
+    or_,
+    select,
+    true,
+    tuple_,
+)
+from sqlmodel import Session, col
+
+from app.core.db import engine
+from app.core.indexer import build_event_document, event_documents_statement, popularity
+from app.core.search_backend import (
+    DATE_FIELDS,
+    DEFAULT_TRACK_TOTAL_HITS,
+    EARTH_RADIUS_KM,
+    bad_request_error,
+    calendar_unit,
+    check_function_score,
+    date_decay,
+    date_histogram_buckets,
+    distance_km,
+    epoch_millis,
+    filter_source,
+    gauss_sigma2,
+    geo_distance_field,
+    hits_total,
+    not_found_error,
+    round_date_math,
+    search_each,
+    total_limit,
+)
+from app.models import Category, Event, Status
+
+# Keyset pagination needs no server-side state, so every point in time is the same
+POINT_IN_TIME_ID = "postgres"
+FIELD_COLUMNS = {
+    "id": Event.id,
+    "location": Event.location,
+    "capacity": Event.capacity,
+    "attendee_count": Event.attendee_count,
+    "seats_left": func.greatest(Event.capacity - Event.attendee_count, 0),
+    "click_count": Event.click_count,
+    "popularity": popularity(Event.attendee_count, Event.click_count),
+    "start_datetime": Event.start_datetime,
+    "end_datetime": Event.end_datetime,
+    "organizer_id": Event.organizer_id,
+    "category": Category.category,
+    "status": Status.status,
+}
+UUID_FIELDS = {"id", "organizer_id"}
+# Kilometres per degree of latitude
+KM_PER_DEGREE = 111.195
+_WORD = re.compile(r"\w+")
+
+
+def _column(field: str) -> Any:
+    if field not in FIELD_COLUMNS:
+        raise bad_request_error(f"unsupported field [{field}]")
+    return FIELD_COLUMNS[field]
+
+
+def _value(field: str, value: Any) -> Any:
+    if field in UUID_FIELDS:
+        return uuid.UUID(str(value))
+    if field in DATE_FIELDS and isinstance(value, int):
+        # Sort values of dates are epoch milliseconds, as in Elasticsearch
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    return value
+
+
+def _distance(body: dict[str, Any]) -> Any:
+    """Haversine distance in kilometres from the origin of body to each event."""
+    field, origin = geo_distance_field(body)
+    if field != "coordinates":
+        raise bad_request_error(f"field [{field}] is not a geo_point field")
+    lat, lon = math.radians(origin["lat"]), math.radians(origin["lon"])
+    event_lat, event_lon = func.radians(Event.latitude), func.radians(Event.longitude)
+    a = func.power(func.sin((event_lat - lat) / 2), 2) + math.cos(lat) * func.cos(
+        event_lat
+    ) * func.power(func.sin((event_lon - lon) / 2), 2)
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(literal(1.0), func.sqrt(a)))
+
+
+def _geo_condition(body: dict[str, Any]) -> ColumnElement[Any]:
+    _, origin = geo_distance_field(body)
+    radius = distance_km(body["distance"])
+    # A bounding box on the ix_event_coordinates GiST index narrows the candidates
+    # before the exact distance is computed
+    dlat = radius / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(origin["lat"]))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, dlat / cos_lat)
+    box = func.box(
+        func.point(origin["lon"] - dlon, origin["lat"] - dlat),
+        func.point(origin["lon"] + dlon, origin["lat"] + dlat),
+    )
+    in_box = func.point(Event.longitude, Event.latitude).op("<@")(box)
+    return and_(in_box, _distance(body) <= radius)
+
+
+def _function_factor(function: dict[str, Any]) -> Any:
+    """SQL expression of one function_score function, as in function_factor."""
+    if "field_value_factor" in function:
+        body = function["field_value_factor"]
+        value = func.coalesce(
+            _column(body["field"]), body.get("missing", 0)
+        ) * body.get("factor", 1)
+        modifier = body.get("modifier", "none")
+        if modifier == "ln2p":
+            return func.ln(2 + value)
+        if modifier == "log1p":
+            return func.log(1 + value)
+        if modifier == "none":
+            return value
+        raise bad_request_error(f"unsupported modifier [{modifier}]")
+    if "gauss" in function:
+        field, origin_ms, scale, offset, decay = date_decay(function["gauss"])
+        distance = func.abs(func.extract("epoch", _column(field)) * 1000.0 - origin_ms)
+        exponent = -func.power(func.greatest(distance - offset, 0.0), 2.0) / (
+            2 * gauss_sigma2(scale, decay)
+        )
+        # exp() underflows to an error in Postgres, not to 0
+        return func.coalesce(func.exp(func.greatest(exponent, -700.0)), 1.0)
+    raise bad_request_error(f"unsupported function {sorted(function)}")
+
+
+def _text_condition(body: dict[str, Any]) -> tuple[ColumnElement[Any], Any]:
+    words = _WORD.findall(body["query"].lower())
+    if not words:
+        return false(), None
+    and_operator = body.get("operator", "or").lower() == "and"
+
+    vector: Any
+    if all(field.endswith(".prefix") for field in body["fields"]):
+        # Prefix matching on title and location, without an index: suggestions only
+        vector = func.to_tsvector(
+            "simple", func.concat_ws(" ", Event.title, Event.location)
+        )
+        query = func.to_tsquery(
+            "simple",
+            (" & " if and_operator else " | ").join(f"{word}:*" for word in words),
+        )
+    else:
+        # search_vector covers title and description
+        vector = col(Event.search_vector)
+        if body.get("type") == "phrase":
+            query = func.phraseto_tsquery("spanish", body["query"])
+        elif and_operator:
+            query = func.plainto_tsquery("spanish", body["query"])
+        else:
+            query = func.to_tsquery("spanish", " | ".join(words))
+    return vector.op("@@")(query), func.ts_rank_cd(vector, query)
+
+
+def _more_like_this_condition(body: dict[str, Any]) -> tuple[ColumnElement[Any], Any]:
+    if set(body.get("fields", ["title", "description"])) - {"title", "description"}:
+        raise bad_request_error("more_like_this only supports title and description")
+    like = body["like"] if isinstance(body["like"], list) else [body["like"]]
+    if not all(isinstance(text, str) for text in like):
+        raise bad_request_error("more_like_this only supports like texts")
+    # Without term statistics, the first distinct words are ORed and ts_rank_cd
+    # rewards the events sharing more of them
+    words = list(dict.fromkeys(_WORD.findall(" ".join(like).lower())))
+    words = words[: body.get("max_query_terms", 25)]
+    if not words:
+        return false(), None
+    query = func.to_tsquery("spanish", " | ".join(words))
+    return (
+        col(Event.search_vector).op("@@")(query),
+        func.ts_rank_cd(Event.search_vector, query),
+    )
+
+
+def _condition(query: dict[str, Any]) -> tuple[ColumnElement[Any], Any]:
+    """Returns the SQL condition of a query and its rank expression, if it scores."""
+    kind, body = next(iter(query.items()))
+    if kind == "match_all":
+        return true(), None
+    if kind == "multi_match":
+        return _text_condition(body)
+    if kind == "more_like_this":
+        return _more_like_this_condition(body)
+    if kind == "ids":
+        ids = []
+        for id in body["values"]:
+            try:
+                ids.append(uuid.UUID(str(id)))
+            except ValueError:
+                # Not an event id, so nothing matches it
+                pass
+        return col(Event.id).in_(ids), None
+    if kind == "function_score":
+        check_function_score(body)
+        condition, rank = _condition(body.get("query", {"match_all": {}}))
+        # Without a text match every event scores 1, as with match_all in Elasticsearch
+        rank = literal(1.0) if rank is None else rank
+        for function in body.get("functions", []):
+            rank = rank * _function_factor(function)
+        return condition, rank
+    if kind in ("term", "terms"):
+        field, condition = next(iter(body.items()))
+        if kind == "terms":
+            return _column(field).in_(
+                [_value(field, value) for value in condition]
+            ), None
+        value = condition["value"] if isinstance(condition, dict) else condition
+        return _column(field) == _value(field, value), None
+    if kind == "range":
+        field, condition = next(iter(body.items()))
+        column = _column(field)
+        bounds = []
+        for op, limit in condition.items():
+            if op not in ("gte", "gt", "lte", "lt"):
+                continue
+            if field in DATE_FIELDS:
+                limit = round_date_math(str(limit), up=op in ("gt", "lte"))
+            bounds.append(
+                {
+                    "gte": column >= limit,
+                    "gt": column > limit,
+                    "lte": column <= limit,
+                    "lt": column < limit,
+                }[op]
+            )
+        return and_(true(), *bounds), None
+    if kind == "geo_distance":
+        return _geo_condition(body), None
+    if kind == "bool":
+        return _bool_condition(body)
+    raise bad_request_error(f"unsupported query [{kind}]")
+
+
+def _bool_condition(body: dict[str, Any]) -> tuple[ColumnElement[Any], Any]:
+    def clauses(occur: str) -> list[dict[str, Any]]:
+        value = body.get(occur, [])
+        return value if isinstance(value, list) else [value]
+
+    conditions, ranks = [], []
+    for clause in clauses("must"):
+        condition, rank = _condition(clause)
+        conditions.append(condition)
+        ranks.append(rank)
+    conditions.extend(_condition(clause)[0] for clause in clauses("filter"))
+
+    should = [_condition(clause) for clause in clauses("should")]
+    if should:
+        required = body.get("minimum_should_match", 0 if conditions else 1)
+        if int(required) > 1:
+            raise bad_request_error("minimum_should_match above 1 is not supported")
+        if int(required):
+            conditions.append(or_(*(condition for condition, _ in should)))
+        ranks.extend(rank for _, rank in should)
+
+    for clause in clauses("must_not"):
+        # Rows where the condition is NULL do not match it, so they are kept
+        conditions.append(not_(func.coalesce(_condition(clause)[0], false())))
+
+    ranks = [rank for rank in ranks if rank is not None]
+    return and_(true(), *conditions), sum(ranks[1:], ranks[0]) if ranks else None
+
+
+class PostgresSearchBackend:
+    """
+    Answers searches from Postgres. Text matches use the spanish full-text
+    configuration and are ranked with ts_rank_cd, pages after a cursor use keyset
+    pagination and aggregations are computed with GROUP BY.
+    """
+
+    async def close(self) -> None:
+        pass
+
+    async def open_point_in_time(self, index_name: str, keep_alive: str) -> str:
+        return POINT_IN_TIME_ID
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        pass
+
+    async def retrieve_document(self, index_name: str, id: Any) -> dict[str, Any]:
+        return await asyncio.to_thread(self._retrieve_document, index_name, id)
+
+    async def mget(
+        self, index_name: str, ids: list[Any], source: Any = True
+    ) -> dict[str, Any]:
+        return await asyncio.to_thread(self._mget, index_name, ids, source)
+
+    async def search(
+        self, index_name: str | None = None, **query_args: Any
+    ) -> dict[str, Any]:
+        return await asyncio.to_thread(self._search, index_name, **query_args)
+
+    async def msearch(
+        self, index_name: str, searches: list[dict[str, Any]]
+    ) -> dict[str, Any]:
+        return await search_each(self, index_name, searches)
+
+    @staticmethod
+    def _retrieve_document(index_name: str, id: Any) -> dict[str, Any]:
+        with Session(engine) as session:
+            row = session.execute(
+                event_documents_statement().where(col(Event.id) == uuid.UUID(str(id)))
+            ).first()
+        if row is None:
+            raise not_found_error(f"document {id} not found")
+        return {
+            "_index": index_name,
+            "_id": str(row.id),
+            "found": True,
+            "_source": build_event_document(row),
+        }
+
+    @staticmethod
+    def _mget(index_name: str, ids: list[Any], source: Any) -> dict[str, Any]:
+        uuids = []
+        for id in ids:
+            try:
+                uuids.append(uuid.UUID(str(id)))
+            except ValueError:
+                # Not an event id, so it is reported as not found
+                pass
+        with Session(engine) as session:
+            rows = session.execute(
+                event_documents_statement().where(col(Event.id).in_(uuids))
+            ).all()
+        documents = {str(row.id): build_event_document(row) for row in rows}
+        return {
+            "docs": [
+                {
+                    "_index": index_name,
+                    "_id": str(id),
+                    "found": True,
+                    "_source": filter_source(documents[str(id)], source),
+                }
+                if str(id) in documents
+                else {"_index": index_name, "_id": str(id), "found": False}
+                for id in ids
+            ]
+        }
+
+    def _search(
+        self,
+        index_name: str | None,
+        *,
+        query: dict[str, Any] | None = None,
+        aggs: dict[str, Any] | None = None,
+        size: int = 10,
+        from_: int = 0,
+        sort: list[Any] | None = None,
+        search_after: list[Any] | None = None,
+        pit: dict[str, Any] | None = None,
+        source: Any = True,
+        track_total_hits: Any = DEFAULT_TRACK_TOTAL_HITS,
+        **ignored: Any,
+    ) -> dict[str, Any]:
+        condition, rank = _condition(query or {"match_all": {}})
+        statement = event_documents_statement().where(condition)
+
+        order_by, columns = [], []
+        for clause in sort or []:
+            field, order = next(iter(clause.items()))
+            if field == "_geo_distance":
+                column = _distance(order)
+                if order.get("unit", "m") == "m":
+                    column = column * 1000
+                order = order.get("order", "asc")
+            else:
+                column = _column(field)
+            columns.append((field, column, order))
+            order_by.append(column.desc() if order == "desc" else column)
+        if not sort:
+            order_by = [rank.desc(), Event.id] if rank is not None else [Event.id]
+
+        page = statement.order_by(*order_by).offset(from_).limit(size)
+        if search_after is not None and columns:
+            page = page.where(self._after(columns, search_after))
+        if rank is not None:
+            page = page.add_columns(rank.label("rank"))
+        # Sort values are read back from the row, computed ones included
+        page = page.add_columns(
+            *(
+                column.label(f"sort_{number}")
+                for number, (_, column, _) in enumerate(columns)
+            )
+        )
+
+        with Session(engine) as session:
+            rows = session.execute(page).all() if size else []
+            response: dict[str, Any] = {
+                "hits": {
+                    "hits": [
+                        self._hit(index_name, row, columns, source) for row in rows
+                    ]
+                }
+            }
+            limit = total_limit(track_total_hits)
+            if limit != 0:
+                # Counting stops one row past the limit, like track_total_hits in Elasticsearch
+                counted = statement if limit is None else statement.limit(limit + 1)
+                total = session.execute(
+                    select(func.count()).select_from(counted.subquery())
+                ).scalar_one()
+                response["hits"]["total"] = hits_total(total, limit)
+            if aggs:
+                filtered = statement.subquery()
+                response["aggregations"] = {
+                    name: self._aggregate(session, filtered, aggregation)
+                    for name, aggregation in aggs.items()
+                }
+        if pit is not None:
+            response["pit_id"] = POINT_IN_TIME_ID
+        return response
+
+    @staticmethod
+    def _after(
+        columns: list[tuple[str, Any, str]], search_after: list[Any]
+    ) -> ColumnElement[Any]:
+        values = [
+            _value(field, value)
+            for (field, _, _), value in zip(columns, search_after, strict=True)
+        ]
+        if all(order != "desc" for _, _, order in columns):
+            return tuple_(*(column for _, column, _ in columns)) > tuple_(*values)
+        # Mixed directions: rows equal on the first sort keys and after on the next one
+        alternatives = []
+        for number, (_, column, order) in enumerate(columns):
+            equal = [
+                previous == value
+                for (_, previous, _), value in zip(
+                    columns[:number], values[:number], strict=True
+                )
+            ]
+            after = (
+                column < values[number] if order == "desc" else column > values[number]
+            )
+            alternatives.append(and_(*equal, after))
+        return or_(*alternatives)
+
+    @staticmethod
+    def _hit(
+        index_name: str | None,
+        row: Any,
+        columns: list[tuple[str, Any, str]],
+        source: Any,
+    ) -> dict[str, Any]:
+        document = filter_source(build_event_document(row), source)
+        hit = {
+            "_index": index_name or "postgres",
+            "_id": str(row.id),
+            "_score": getattr(row, "rank", None),
+            "_source": document,
+        }
+        if columns:
+            values = []
+            for number, (field, _, _) in enumerate(columns):
+                value = row._mapping[f"sort_{number}"]
+                values.append(
+                    epoch_millis(value)
+                    if field in DATE_FIELDS
+                    else str(value)
+                    if field in UUID_FIELDS
+                    else math.inf
+                    if value is None and field == "_geo_distance"
+                    else value
+                )
+            hit["sort"] = values
+        return hit
+
+    @staticmethod
+    def _aggregate(
+        session: Session, filtered: Any, aggregation: dict[str, Any]
+    ) -> dict[str, Any]:
+        kind, body = next(iter(aggregation.items()))
+        field = body["field"]
+        if field not in filtered.c:
+            raise bad_request_error(f"unsupported field [{field}]")
+        if kind == "terms":
+            count = func.count().label("doc_count")
+            statement = (
+                select(filtered.c[field], count)
+                .where(filtered.c[field].is_not(None))
+                .group_by(filtered.c[field])
+                .order_by(count.desc(), filtered.c[field])
+                .limit(body.get("size", 10))
+            )
+            return {
+                "buckets": [
+                    {"key": key, "doc_count": doc_count}
+                    for key, doc_count in session.execute(statement)
+                ]
+            }
+        if kind == "date_histogram":
+            unit = calendar_unit(body)
+            period = func.date_trunc(
+                "year" if unit == "y" else "month",
+                func.timezone("UTC", filtered.c[field]),
+            )
+            statement = select(period, func.count()).group_by(period)
+            counts = Counter(
+                {
+                    start.replace(tzinfo=timezone.utc): doc_count
+                    for start, doc_count in session.execute(statement)
+                }
+            )
+            return {"buckets": date_histogram_buckets(counts, unit)}
+        raise bad_request_error(f"unsupported aggregation [{kind}]")
@@ -0,0 +1,128 @@
+import bisect
+import threading
+import time
+from typing import Any, cast
+
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection, QueuePool
+
+# Upper bounds, in seconds, of the checkout wait histogram
+WAIT_BUCKETS = (0.001, 0.005, 0.025, 0.1, 0.5, 2.5, 10.0)
+
+
+class PoolMetrics:
+    """
+    Usage of one engine's connection pool. Checkouts, overflow connections and
+    invalidations come from SQLAlchemy pool events; the time each checkout waited
+    for a connection is reported by the instrumented pool classes below.
+    """
+
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checked_out_max = 0
+        self.overflow_connections = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        # One count per WAIT_BUCKETS bound, and a last one for longer waits
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+        # Listeners on the engine follow its pool when dispose() replaces it
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        self.pool.metrics = self
+
+    @property
+    def pool(self) -> "_TimedCheckout":
+        # One of the instrumented pools below, so it reports its checkout waits here
+        return cast(_TimedCheckout, self.engine.pool)
+
+    def _on_connect(self, dbapi_connection: Any, connection_record: Any) -> None:
+        if self.pool.overflow() > 0:
+            with self._lock:
+                self.overflow_connections += 1
+
+    def _on_checkout(
+        self, dbapi_connection: Any, connection_record: Any, connection_proxy: Any
+    ) -> None:
+        checked_out = self.pool.checkedout()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out_max = max(self.checked_out_max, checked_out)
+
+    def _on_invalidate(
+        self,
+        dbapi_connection: Any,
+        connection_record: Any,
+        exception: BaseException | None,
+    ) -> None:
+        with self._lock:
+            self.invalidations += 1
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        pool = self.pool
+        with self._lock:
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "checked_out_max": self.checked_out_max,
+                "checkouts": self.checkouts,
+                "overflow_connections": self.overflow_connections,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "wait_buckets": dict(
+                    zip(
+                        [*map(str, WAIT_BUCKETS), "inf"], self.wait_buckets, strict=True
+                    )
+                ),
+            }
+
+
+class _TimedCheckout(QueuePool):
+    """
+    Times Pool.connect, which has no event before it starts waiting for a free
+    connection. Includes opening overflow connections and the pre-ping.
+    """
+
+    metrics: PoolMetrics | None = None
+
+    def connect(self) -> PoolProxiedConnection:
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - started, timed_out)
+
+    def recreate(self) -> "_TimedCheckout":
+        pool = cast(_TimedCheckout, super().recreate())
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
@@ -0,0 +1,47 @@
+import time
+from collections.abc import Mapping
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+# Unix time of the client's last successful write, reads stay on the primary while recent
+LAST_WRITE_COOKIE = "last_write"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def wrote_recently(cookies: Mapping[str, str]) -> bool:
+    try:
+        written_at = int(cookies.get(LAST_WRITE_COOKIE, ""))
+    except ValueError:
+        return False
+    # The cookie's Max-Age already expires it, clients that ignore it are checked here
+    return time.time() - written_at < settings.POSTGRES_READ_YOUR_WRITES_SECONDS
+
+
+class ReadYourWritesMiddleware:
+    """
+    Sets LAST_WRITE_COOKIE on every successful response to an unsafe method, so
+    the replica is skipped while it may still lag behind what the client wrote.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{LAST_WRITE_COOKIE}={int(time.time())}; "
+                    f"Max-Age={settings.POSTGRES_READ_YOUR_WRITES_SECONDS}; "
+                    "Path=/; HttpOnly; SameSite=lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
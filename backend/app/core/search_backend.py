@@ -0,0 +1,1013 @@
+"""
+Search backends the API can query. AsyncES_connector talks to Elasticsearch;
+InMemorySearchBackend answers the same subset of the query DSL from an
+in-process index, for tests and single-node deployments without Elasticsearch.
+"""
+import asyncio
+import itertools
+import logging
+import math
+import re
+import time
+import unicodedata
+import uuid
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from datetime import datetime, timezone
+from typing import Any, Protocol
+
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import ApiError, BadRequestError, NotFoundError, TransportError
+
+logger = logging.getLogger(__name__)
+
+
+class SearchBackend(Protocol):
+    async def search(self, index_name: str | None = None, **query_args: Any) -> Any:
+        ...
+
+    async def msearch(self, index_name: str, searches: list[dict[str, Any]]) -> Any:
+        ...
+
+    async def open_point_in_time(self, index_name: str, keep_alive: str) -> str:
+        ...
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        ...
+
+    async def retrieve_document(self, index_name: str, id: Any) -> Any:
+        ...
+
+    async def mget(self, index_name: str, ids: list[Any], source: Any = True) -> Any:
+        ...
+
+    async def close(self) -> None:
+        ...
+
+
+# Close to Elasticsearch's spanish analyzer, without stemming
+SPANISH_STOPWORDS = frozenset(
+    "a al algo como con de del desde donde e el ella ellos en entre era es esta este esto "
+    "fue ha hay la las le les lo los mas me mi muy no nos o para pero por que se si sin "
+    "sobre su sus tambien te tu un una uno unos y ya".split()
+)
+PREFIX_MAX_GRAM = 20
+BM25_K1 = 1.2
+BM25_B = 0.75
+DATE_FIELDS = {"start_datetime", "end_datetime"}
+# Hits counted when a search does not set track_total_hits, as in Elasticsearch
+DEFAULT_TRACK_TOTAL_HITS = 10_000
+# Analyzed fields and the source field they are built from
+TEXT_FIELDS = {
+    "title": "title",
+    "description": "description",
+    "sessions": "sessions",
+    "title.prefix": "title",
+    "location.prefix": "location",
+}
+# Mean earth radius, as used by Elasticsearch's arc distance
+EARTH_RADIUS_KM = 6371.0088
+_WORD = re.compile(r"\w+")
+_DISTANCE = re.compile(r"(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>km|m)?")
+_DATE_MATH = re.compile(r"(?P<date>[^|]+)(?:\|\|/(?P<unit>[yMd]))?")
+_DURATION = re.compile(r"(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>ms|s|m|h|d)")
+DURATION_MS = {"ms": 1, "s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000}
+# field_value_factor modifiers, as defined by Elasticsearch
+MODIFIERS: dict[str, Callable[[float], float]] = {
+    "none": lambda value: value,
+    "log1p": lambda value: math.log10(1 + value),
+    "ln2p": lambda value: math.log(2 + value),
+}
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def positions(text: str) -> list[str | None]:
+    # Stopwords leave a gap, so "feria de flores" is not the phrase "feria flores"
+    return [
+        None if token in SPANISH_STOPWORDS else token
+        for token in _WORD.findall(_fold(text))
+    ]
+
+
+def analyze(field: str, text: str, searching: bool = False) -> list[str]:
+    tokens = _WORD.findall(_fold(text))
+    if not field.endswith(".prefix"):
+        return [token for token in tokens if token not in SPANISH_STOPWORDS]
+    if searching:
+        return tokens
+    # Edge n-grams, like the prefix_index analyzer of the events template
+    return [
+        token[:size]
+        for token in tokens
+        for size in range(1, min(len(token), PREFIX_MAX_GRAM) + 1)
+    ]
+
+
+def not_found_error(message: str) -> NotFoundError:
+    meta = ApiResponseMeta(
+        status=404,
+        http_version="1.1",
+        headers=HttpHeaders(),
+        duration=0.0,
+        node=NodeConfig("http", "localhost", 0),
+    )
+    return NotFoundError(message=message, meta=meta, body={"error": message})
+
+
+def bad_request_error(message: str) -> BadRequestError:
+    meta = ApiResponseMeta(
+        status=400,
+        http_version="1.1",
+        headers=HttpHeaders(),
+        duration=0.0,
+        node=NodeConfig("http", "localhost", 0),
+    )
+    return BadRequestError(message=message, meta=meta, body={"error": message})
+
+
+def parse_date(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        date = value
+    else:
+        text = str(value)
+        # Partial dates such as "2025" or "2025-06" are the start of that period
+        text += {4: "-01-01", 7: "-01"}.get(len(text), "")
+        date = datetime.fromisoformat(text)
+    # Like Elasticsearch, dates are compared and rounded in UTC
+    return (
+        date.astimezone(timezone.utc)
+        if date.tzinfo
+        else date.replace(tzinfo=timezone.utc)
+    )
+
+
+def round_date_math(value: str, up: bool) -> datetime:
+    m = _DATE_MATH.fullmatch(value)
+    if not m:
+        raise bad_request_error(f"failed to parse date [{value}]")
+    date = parse_date(m.group("date"))
+    unit = m.group("unit")
+    if unit is None:
+        return date
+    start = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit in "yM":
+        start = start.replace(day=1)
+    if unit == "y":
+        start = start.replace(month=1)
+    if not up:
+        return start
+    # Rounding up ends at the last millisecond of the period, as in Elasticsearch
+    if unit == "y":
+        following = start.replace(year=start.year + 1)
+    elif unit == "M":
+        following = (
+            start.replace(year=start.year + 1, month=1)
+            if start.month == 12
+            else start.replace(month=start.month + 1)
+        )
+    else:
+        following = datetime.fromordinal(start.toordinal() + 1).replace(
+            tzinfo=start.tzinfo
+        )
+    return following.fromtimestamp(following.timestamp() - 0.001, tz=start.tzinfo)
+
+
+def epoch_millis(date: datetime) -> int:
+    return int(date.timestamp() * 1000)
+
+
+def distance_km(value: Any) -> float:
+    """Parses a distance such as "25km" or "500m"; bare numbers are kilometres."""
+    m = _DISTANCE.fullmatch(str(value).strip())
+    if not m:
+        raise bad_request_error(f"failed to parse distance [{value}]")
+    amount = float(m.group("amount"))
+    return amount / 1000 if m.group("unit") == "m" else amount
+
+
+def duration_ms(value: Any) -> float:
+    """Parses a time value such as "30d" or "12h" into milliseconds."""
+    m = _DURATION.fullmatch(str(value).strip())
+    if not m:
+        raise bad_request_error(f"failed to parse time value [{value}]")
+    return float(m.group("amount")) * DURATION_MS[m.group("unit")]
+
+
+def date_decay(body: dict[str, Any]) -> tuple[str, float, float, float, float]:
+    """
+    Returns the field, origin in epoch milliseconds, scale, offset and decay
+    of a gauss decay function on a date field.
+    """
+    field, options = next(iter(body.items()))
+    if field not in DATE_FIELDS:
+        raise bad_request_error(f"field [{field}] is not a date field")
+    origin = options.get("origin", "now")
+    origin_ms = (
+        time.time() * 1000
+        if origin == "now"
+        else float(epoch_millis(parse_date(origin)))
+    )
+    decay = float(options.get("decay", 0.5))
+    if not 0 < decay < 1:
+        raise bad_request_error("decay must be between 0 and 1")
+    return (
+        field,
+        origin_ms,
+        duration_ms(options["scale"]),
+        duration_ms(options.get("offset", "0ms")),
+        decay,
+    )
+
+
+def gauss_sigma2(scale: float, decay: float) -> float:
+    # The curve is worth decay at offset + scale from the origin
+    return -(scale**2) / (2 * math.log(decay))
+
+
+def function_factor(function: dict[str, Any], document: dict[str, Any]) -> float:
+    """Value of one function_score function for a document."""
+    if "field_value_factor" in function:
+        body = function["field_value_factor"]
+        value = document.get(body["field"])
+        if value is None:
+            value = body.get("missing", 0)
+        modifier = body.get("modifier", "none")
+        if modifier not in MODIFIERS:
+            raise bad_request_error(f"unsupported modifier [{modifier}]")
+        return MODIFIERS[modifier](body.get("factor", 1) * value)
+    if "gauss" in function:
+        field, origin_ms, scale, offset, decay = date_decay(function["gauss"])
+        if document.get(field) is None:
+            # Documents without the field are not decayed, as in Elasticsearch
+            return 1.0
+        distance = abs(epoch_millis(parse_date(document[field])) - origin_ms)
+        return math.exp(
+            -(max(0.0, distance - offset) ** 2) / (2 * gauss_sigma2(scale, decay))
+        )
+    raise bad_request_error(f"unsupported function {sorted(function)}")
+
+
+def check_function_score(body: dict[str, Any]) -> None:
+    # Only products of the functions and the query score are supported
+    if body.get("score_mode", "multiply") != "multiply" or (
+        body.get("boost_mode", "multiply") != "multiply"
+    ):
+        raise bad_request_error("only score_mode and boost_mode multiply are supported")
+
+
+def haversine_km(origin: dict[str, float], point: dict[str, float]) -> float:
+    lat1, lon1 = math.radians(origin["lat"]), math.radians(origin["lon"])
+    lat2, lon2 = math.radians(point["lat"]), math.radians(point["lon"])
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def geo_distance_field(body: dict[str, Any]) -> tuple[str, dict[str, float]]:
+    """Returns the field and origin of a geo_distance query or _geo_distance sort."""
+    options = {
+        "distance",
+        "distance_type",
+        "order",
+        "unit",
+        "mode",
+        "validation_method",
+        "ignore_unmapped",
+    }
+    field, origin = next(
+        (field, value) for field, value in body.items() if field not in options
+    )
+    return field, {"lat": float(origin["lat"]), "lon": float(origin["lon"])}
+
+
+async def search_each(
+    backend: SearchBackend, index_name: str, searches: list[dict[str, Any]]
+) -> dict[str, Any]:
+    """_msearch for backends without one: the searches run concurrently and fail alone."""
+
+    async def run(body: dict[str, Any]) -> dict[str, Any]:
+        renamed = {"from": "from_", "_source": "source"}
+        query_args = {renamed.get(key, key): value for key, value in body.items()}
+        try:
+            response = await backend.search(index_name, **query_args)
+        except ApiError as e:
+            return {
+                "error": {"type": type(e).__name__, "reason": e.message},
+                "status": e.meta.status,
+            }
+        return {**response, "status": 200}
+
+    return {"responses": list(await asyncio.gather(*(run(body) for body in searches)))}
+
+
+def filter_source(document: dict[str, Any], source: Any) -> dict[str, Any]:
+    if source is False:
+        return {}
+    if isinstance(source, list):
+        return {field: document[field] for field in source if field in document}
+    return document
+
+
+def total_limit(track_total_hits: Any) -> int | None:
+    """Returns how many hits to count, None for all of them and 0 for none."""
+    if track_total_hits is True:
+        return None
+    if track_total_hits is False:
+        return 0
+    return int(track_total_hits)
+
+
+def hits_total(count: int, limit: int | None) -> dict[str, Any]:
+    if limit is not None and count > limit:
+        return {"value": limit, "relation": "gte"}
+    return {"value": count, "relation": "eq"}
+
+
+def calendar_unit(date_histogram: dict[str, Any]) -> str:
+    interval = date_histogram.get("calendar_interval")
+    if interval not in ("year", "month"):
+        raise bad_request_error(f"unsupported calendar_interval [{interval}]")
+    return "y" if interval == "year" else "M"
+
+
+def date_histogram_buckets(
+    counts: Counter[datetime], unit: str
+) -> list[dict[str, Any]]:
+    # Empty periods between the first and the last one are included, as in Elasticsearch
+    buckets: list[dict[str, Any]] = []
+    if not counts:
+        return buckets
+    current, last = min(counts), max(counts)
+    while current <= last:
+        buckets.append(
+            {
+                "key_as_string": (
+                    f"{current.year}"
+                    if unit == "y"
+                    else f"{current.year}-{current.month:02d}"
+                ),
+                "key": epoch_millis(current),
+                "doc_count": counts.get(current, 0),
+            }
+        )
+        end = round_date_math(current.isoformat() + f"||/{unit}", up=True)
+        current = datetime.fromtimestamp(end.timestamp() + 0.001, tz=timezone.utc)
+    return buckets
+
+
+class _Snapshot:
+    """Immutable inverted index over one set of documents."""
+
+    def __init__(self, documents: dict[str, dict[str, Any]]) -> None:
+        self.documents = documents
+        self.tokens: dict[str, dict[str, list[str]]] = defaultdict(dict)
+        self.positions: dict[str, dict[str, list[str | None]]] = defaultdict(dict)
+        self.postings: dict[str, dict[str, dict[str, int]]] = defaultdict(
+            lambda: defaultdict(dict)
+        )
+        self.average_length: dict[str, float] = {}
+        for field, source_field in TEXT_FIELDS.items():
+            for doc_id, source in documents.items():
+                value = source.get(source_field)
+                text = " ".join(value) if isinstance(value, list) else str(value or "")
+                tokens = analyze(field, text)
+                self.tokens[field][doc_id] = tokens
+                if not field.endswith(".prefix"):
+                    self.positions[field][doc_id] = positions(text)
+                for term, frequency in Counter(tokens).items():
+                    self.postings[field][term][doc_id] = frequency
+            lengths = [len(tokens) for tokens in self.tokens[field].values()]
+            self.average_length[field] = sum(lengths) / len(lengths) if lengths else 0.0
+
+    def bm25(self, field: str, term: str) -> dict[str, float]:
+        postings = self.postings[field].get(term, {})
+        if not postings:
+            return {}
+        total = len(self.documents)
+        idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+        average = self.average_length[field] or 1.0
+        scores = {}
+        for doc_id, frequency in postings.items():
+            norm = 1 - BM25_B + BM25_B * len(self.tokens[field][doc_id]) / average
+            scores[doc_id] = (
+                idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * norm)
+            )
+        return scores
+
+    def has_phrase(self, field: str, doc_id: str, phrase: list[str | None]) -> bool:
+        tokens = self.positions[field].get(doc_id, [])
+        # Gaps left by stopwords in the phrase match any token
+        offsets = [
+            (offset, term) for offset, term in enumerate(phrase) if term is not None
+        ]
+        if not offsets:
+            return False
+        first = offsets[0][0]
+        return any(
+            all(
+                0 <= start + offset - first < len(tokens)
+                and tokens[start + offset - first] == term
+                for offset, term in offsets
+            )
+            for start in range(len(tokens))
+        )
+
+
+class InMemorySearchBackend:
+    """
+    Pure Python stand-in for Elasticsearch with BM25 scoring. Supports the
+    queries built by the search routes: bool, match_all, multi_match
+    (best_fields, phrase and cross_fields), more_like_this on texts, ids, term,
+    terms and range, function_score with field_value_factor and gauss on dates,
+    terms and date_histogram aggregations, sort, search_after and points in time.
+    """
+
+    def __init__(self, documents: list[dict[str, Any]] | None = None) -> None:
+        self._snapshot = _Snapshot({})
+        self._points_in_time: dict[str, _Snapshot] = {}
+        if documents:
+            self.load(documents)
+
+    def load(self, documents: list[dict[str, Any]]) -> None:
+        # Searches already running, and points in time, keep the previous snapshot
+        self._snapshot = _Snapshot(
+            {str(document["id"]): document for document in documents}
+        )
+
+    def index_documents(self, documents: list[dict[str, Any]]) -> None:
+        merged = dict(self._snapshot.documents)
+        merged.update((str(document["id"]), document) for document in documents)
+        self._snapshot = _Snapshot(merged)
+
+    def delete_documents(self, ids: list[Any]) -> None:
+        removed = {str(doc_id) for doc_id in ids}
+        self._snapshot = _Snapshot(
+            {
+                doc_id: document
+                for doc_id, document in self._snapshot.documents.items()
+                if doc_id not in removed
+            }
+        )
+
+    @property
+    def documents(self) -> dict[str, dict[str, Any]]:
+        return self._snapshot.documents
+
+    async def close(self) -> None:
+        self._points_in_time.clear()
+
+    async def open_point_in_time(self, index_name: str, keep_alive: str) -> str:
+        pit_id = uuid.uuid4().hex
+        self._points_in_time[pit_id] = self._snapshot
+        return pit_id
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        self._points_in_time.pop(pit_id, None)
+
+    async def msearch(
+        self, index_name: str, searches: list[dict[str, Any]]
+    ) -> dict[str, Any]:
+        return await search_each(self, index_name, searches)
+
+    async def retrieve_document(self, index_name: str, id: Any) -> dict[str, Any]:
+        source = self._snapshot.documents.get(str(id))
+        if source is None:
+            raise not_found_error(f"document {id} not found")
+        return {"_index": index_name, "_id": str(id), "found": True, "_source": source}
+
+    async def mget(
+        self, index_name: str, ids: list[Any], source: Any = True
+    ) -> dict[str, Any]:
+        docs = []
+        for id in ids:
+            document = self._snapshot.documents.get(str(id))
+            docs.append(
+                {"_index": index_name, "_id": str(id), "found": False}
+                if document is None
+                else {
+                    "_index": index_name,
+                    "_id": str(id),
+                    "found": True,
+                    "_source": filter_source(document, source),
+                }
+            )
+        return {"docs": docs}
+
+    async def search(
+        self,
+        index_name: str | None = None,
+        *,
+        query: dict[str, Any] | None = None,
+        aggs: dict[str, Any] | None = None,
+        size: int = 10,
+        from_: int = 0,
+        sort: list[Any] | None = None,
+        search_after: list[Any] | None = None,
+        pit: dict[str, Any] | None = None,
+        source: Any = True,
+        track_total_hits: Any = DEFAULT_TRACK_TOTAL_HITS,
+        **ignored: Any,
+    ) -> dict[str, Any]:
+        if pit is not None:
+            if pit["id"] not in self._points_in_time:
+                raise not_found_error(f"point in time {pit['id']} not found")
+            snapshot = self._points_in_time[pit["id"]]
+        else:
+            snapshot = self._snapshot
+
+        scores = self._evaluate(snapshot, query or {"match_all": {}})
+        hits = [
+            (self._sort_values(snapshot, doc_id, score, sort), doc_id, score)
+            for doc_id, score in scores.items()
+        ]
+        hits.sort(key=lambda hit: hit[0])
+        if search_after is not None and sort:
+            after = [
+                _Descending(value) if _sort_order(clause) == "desc" else value
+                for value, clause in zip(search_after, sort, strict=True)
+            ]
+            hits = [hit for hit in hits if hit[0] > after]
+
+        response: dict[str, Any] = {
+            "hits": {
+                "max_score": max(scores.values(), default=None),
+                "hits": [
+                    self._hit(snapshot, index_name, doc_id, score, values, sort, source)
+                    for values, doc_id, score in hits[from_ : from_ + size]
+                ],
+            }
+        }
+        limit = total_limit(track_total_hits)
+        if limit != 0:
+            response["hits"]["total"] = hits_total(len(scores), limit)
+        if aggs:
+            matched = [snapshot.documents[doc_id] for doc_id in scores]
+            response["aggregations"] = {
+                name: self._aggregate(matched, aggregation)
+                for name, aggregation in aggs.items()
+            }
+        if pit is not None:
+            response["pit_id"] = pit["id"]
+        return response
+
+    @staticmethod
+    def _sort_values(
+        snapshot: _Snapshot, doc_id: str, score: float, sort: list[Any] | None
+    ) -> list[Any]:
+        if not sort:
+            # By descending score, then in index order like a single shard
+            return [-score]
+        values = []
+        for clause in sort:
+            field, order = next(iter(clause.items()))
+            value: Any
+            if field == "_geo_distance":
+                # Documents without coordinates sort last, at an infinite distance
+                geo_field, origin = geo_distance_field(order)
+                point = snapshot.documents[doc_id].get(geo_field)
+                value = haversine_km(origin, point) if point else math.inf
+                if order.get("unit", "m") == "m":
+                    value *= 1000
+                order = order.get("order", "asc")
+            else:
+                value = (
+                    doc_id if field == "id" else snapshot.documents[doc_id].get(field)
+                )
+            if field in DATE_FIELDS:
+                value = epoch_millis(parse_date(value))
+            values.append(_Descending(value) if order == "desc" else value)
+        return values
+
+    @staticmethod
+    def _hit(
+        snapshot: _Snapshot,
+        index_name: str | None,
+        doc_id: str,
+        score: float,
+        values: list[Any],
+        sort: list[Any] | None,
+        source: Any,
+    ) -> dict[str, Any]:
+        document = filter_source(snapshot.documents[doc_id], source)
+        hit: dict[str, Any] = {
+            "_index": index_name or "memory",
+            "_id": doc_id,
+            "_score": None if sort else score,
+            "_source": document,
+        }
+        if sort:
+            hit["sort"] = [
+                value.value if isinstance(value, _Descending) else value
+                for value in values
+            ]
+        return hit
+
+    def _evaluate(self, snapshot: _Snapshot, query: dict[str, Any]) -> dict[str, float]:
+        kind, body = next(iter(query.items()))
+        if kind == "match_all":
+            return dict.fromkeys(snapshot.documents, 1.0)
+        if kind == "bool":
+            return self._bool(snapshot, body)
+        if kind == "multi_match":
+            return self._multi_match(snapshot, body)
+        if kind == "more_like_this":
+            return self._more_like_this(snapshot, body)
+        if kind == "ids":
+            return dict.fromkeys(
+                (str(id) for id in body["values"] if str(id) in snapshot.documents), 0.0
+            )
+        if kind == "function_score":
+            check_function_score(body)
+            scores = self._evaluate(snapshot, body.get("query", {"match_all": {}}))
+            return {
+                doc_id: math.prod(
+                    [
+                        score,
+                        *(
+                            function_factor(function, snapshot.documents[doc_id])
+                            for function in body.get("functions", [])
+                        ),
+                    ]
+                )
+                for doc_id, score in scores.items()
+            }
+        if kind in ("term", "terms", "range", "geo_distance"):
+            return dict.fromkeys(
+                (
+                    doc_id
+                    for doc_id, document in snapshot.documents.items()
+                    if self._filter_matches(kind, body, doc_id, document)
+                ),
+                0.0,
+            )
+        raise bad_request_error(f"unsupported query [{kind}]")
+
+    def _bool(self, snapshot: _Snapshot, body: dict[str, Any]) -> dict[str, float]:
+        def clauses(occur: str) -> list[dict[str, Any]]:
+            value = body.get(occur, [])
+            return value if isinstance(value, list) else [value]
+
+        scores: dict[str, float] | None = None
+        for clause in clauses("must"):
+            matched = self._evaluate(snapshot, clause)
+            scores = (
+                matched
+                if scores is None
+                else {
+                    doc_id: score + matched[doc_id]
+                    for doc_id, score in scores.items()
+                    if doc_id in matched
+                }
+            )
+        for clause in clauses("filter"):
+            matched = self._evaluate(snapshot, clause)
+            scores = (
+                dict.fromkeys(matched, 0.0)
+                if scores is None
+                else {
+                    doc_id: score
+                    for doc_id, score in scores.items()
+                    if doc_id in matched
+                }
+            )
+
+        should = [self._evaluate(snapshot, clause) for clause in clauses("should")]
+        required = body.get("minimum_should_match", 0 if scores is not None else 1)
+        if scores is None:
+            scores = dict.fromkeys(snapshot.documents, 0.0)
+        if should:
+            counts = Counter(itertools.chain.from_iterable(should))
+            scores = {
+                doc_id: score + sum(matched.get(doc_id, 0.0) for matched in should)
+                for doc_id, score in scores.items()
+                if counts[doc_id] >= int(required)
+            }
+
+        for clause in clauses("must_not"):
+            excluded = self._evaluate(snapshot, clause)
+            scores = {
+                doc_id: score
+                for doc_id, score in scores.items()
+                if doc_id not in excluded
+            }
+        return scores
+
+    def _multi_match(
+        self, snapshot: _Snapshot, body: dict[str, Any]
+    ) -> dict[str, float]:
+        for field in body["fields"]:
+            if field not in TEXT_FIELDS:
+                raise bad_request_error(f"field [{field}] is not a text field")
+        if body.get("type") == "cross_fields":
+            return self._cross_fields(snapshot, body)
+
+        # best_fields: a document scores as its best matching field
+        phrase = body.get("type") == "phrase"
+        operator = body.get("operator", "or").lower()
+        best: dict[str, float] = {}
+        for field in body["fields"]:
+            terms = analyze(field, body["query"], searching=True)
+            if not terms:
+                continue
+            per_term = [snapshot.bm25(field, term) for term in terms]
+            if phrase or operator == "and":
+                candidates = set.intersection(*(set(scores) for scores in per_term))
+                if phrase:
+                    candidates = {
+                        doc_id
+                        for doc_id in candidates
+                        if snapshot.has_phrase(field, doc_id, positions(body["query"]))
+                    }
+            else:
+                candidates = set().union(*per_term)
+            for doc_id in candidates:
+                score = sum(scores.get(doc_id, 0.0) for scores in per_term)
+                best[doc_id] = max(best.get(doc_id, 0.0), score)
+        return best
+
+    @staticmethod
+    def _more_like_this(snapshot: _Snapshot, body: dict[str, Any]) -> dict[str, float]:
+        fields = body.get("fields", ["title", "description"])
+        for field in fields:
+            if field not in TEXT_FIELDS:
+                raise bad_request_error(f"field [{field}] is not a text field")
+        like = body["like"] if isinstance(body["like"], list) else [body["like"]]
+        if not all(isinstance(text, str) for text in like):
+            raise bad_request_error("more_like_this only supports like texts")
+
+        # The liked text is reduced to its most distinctive terms, by tf-idf
+        frequencies = Counter(
+            term for field in fields for text in like for term in analyze(field, text)
+        )
+        total = len(snapshot.documents)
+        weighted = []
+        for term, frequency in frequencies.items():
+            doc_frequency = max(
+                len(snapshot.postings[field].get(term, {})) for field in fields
+            )
+            if frequency >= body.get("min_term_freq", 2) and doc_frequency >= body.get(
+                "min_doc_freq", 5
+            ):
+                weighted.append(
+                    (-frequency * math.log(total / doc_frequency + 1), term)
+                )
+        terms = [
+            term for _, term in sorted(weighted)[: body.get("max_query_terms", 25)]
+        ]
+        if not terms:
+            return {}
+
+        # Then it is a should clause per term, a term scoring as its best field
+        per_term = []
+        for term in terms:
+            scores: dict[str, float] = {}
+            for field in fields:
+                for doc_id, score in snapshot.bm25(field, term).items():
+                    scores[doc_id] = max(scores.get(doc_id, 0.0), score)
+            per_term.append(scores)
+        percent = int(str(body.get("minimum_should_match", "30%")).rstrip("%"))
+        required = max(1, len(terms) * percent // 100)
+        counts = Counter(itertools.chain.from_iterable(per_term))
+        return {
+            doc_id: sum(scores.get(doc_id, 0.0) for scores in per_term)
+            for doc_id, count in counts.items()
+            if count >= required
+        }
+
+    @staticmethod
+    def _cross_fields(snapshot: _Snapshot, body: dict[str, Any]) -> dict[str, float]:
+        # Every word may match a different field, as if the fields were one
+        terms = analyze(body["fields"][0], body["query"], searching=True)
+        per_term = []
+        for term in terms:
+            scores: dict[str, float] = {}
+            for field in body["fields"]:
+                for doc_id, score in snapshot.bm25(field, term).items():
+                    scores[doc_id] = max(scores.get(doc_id, 0.0), score)
+            per_term.append(scores)
+        if not per_term:
+            return {}
+        if body.get("operator", "or").lower() == "and":
+            candidates = set.intersection(*(set(scores) for scores in per_term))
+        else:
+            candidates = set().union(*per_term)
+        return {
+            doc_id: sum(scores.get(doc_id, 0.0) for scores in per_term)
+            for doc_id in candidates
+        }
+
+    @staticmethod
+    def _filter_matches(
+        kind: str, body: dict[str, Any], doc_id: str, document: dict[str, Any]
+    ) -> bool:
+        if kind == "geo_distance":
+            field, origin = geo_distance_field(body)
+            point = document.get(field)
+            if not point:
+                return False
+            return haversine_km(origin, point) <= distance_km(body["distance"])
+        field, condition = next(iter(body.items()))
+        value: Any = doc_id if field == "id" else document.get(field)
+        if kind == "term":
+            expected = condition["value"] if isinstance(condition, dict) else condition
+            return bool(value == expected)
+        if kind == "terms":
+            return value in condition
+        if value is None:
+            return False
+        if field in DATE_FIELDS:
+            value = parse_date(value)
+            bounds = {
+                op: round_date_math(str(limit), up=op in ("gt", "lte"))
+                for op, limit in condition.items()
+                if op in ("gte", "gt", "lte", "lt")
+            }
+        else:
+            bounds = {
+                op: limit
+                for op, limit in condition.items()
+                if op in ("gte", "gt", "lte", "lt")
+            }
+        return all(
+            {
+                "gte": value >= limit,
+                "gt": value > limit,
+                "lte": value <= limit,
+                "lt": value < limit,
+            }[op]
+            for op, limit in bounds.items()
+        )
+
+    @staticmethod
+    def _aggregate(
+        documents: list[dict[str, Any]], aggregation: dict[str, Any]
+    ) -> dict[str, Any]:
+        kind, body = next(iter(aggregation.items()))
+        field = body["field"]
+        if kind == "terms":
+            counts = Counter(
+                document.get(field)
+                for document in documents
+                if document.get(field) is not None
+            )
+            buckets = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+            return {
+                "buckets": [
+                    {"key": key, "doc_count": count}
+                    for key, count in buckets[: body.get("size", 10)]
+                ]
+            }
+        if kind == "date_histogram":
+            unit = calendar_unit(body)
+            periods = Counter(
+                round_date_math(str(document[field]) + f"||/{unit}", up=False)
+                for document in documents
+                if document.get(field)
+            )
+            return {"buckets": date_histogram_buckets(periods, unit)}
+        raise bad_request_error(f"unsupported aggregation [{kind}]")
+
+
+def _sort_order(clause: dict[str, Any]) -> str:
+    order = next(iter(clause.values()))
+    return str(order.get("order", "asc") if isinstance(order, dict) else order)
+
+
+class _Descending:
+    """Sort key wrapper that inverts the order of its value."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return bool(self.value > other.value)
+
+    def __gt__(self, other: "_Descending") -> bool:
+        return bool(self.value < other.value)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and self.value == other.value
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive failures and lets a single trial call
+    through once `reset_timeout` seconds have passed; it closes again when
+    that call succeeds.
+    """
+
+    def __init__(self, failures: int, reset_timeout: float) -> None:
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # Half open: the next failure reopens it for another reset_timeout
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failures:
+            self.opened_at = time.monotonic()
+
+
+class FallbackSearchBackend:
+    """
+    Sends every call to the primary backend and, when it is unreachable, times
+    out or fails on the server side, to the fallback one. While the circuit
+    breaker is open the primary backend is not tried at all.
+    """
+
+    def __init__(
+        self,
+        primary: SearchBackend,
+        fallback: SearchBackend,
+        breaker: CircuitBreaker,
+        timeout: float,
+        fallback_pit_id: str,
+    ) -> None:
+        self.primary = primary
+        self.fallback = fallback
+        self.breaker = breaker
+        self.timeout = timeout
+        self.fallback_pit_id = fallback_pit_id
+
+    async def close(self) -> None:
+        await self.primary.close()
+        await self.fallback.close()
+
+    async def search(self, index_name: str | None = None, **query_args: Any) -> Any:
+        pit = query_args.get("pit")
+        if pit is not None and pit["id"] == self.fallback_pit_id:
+            # Cursors opened by the fallback keep paging there
+            return await self.fallback.search(index_name, **query_args)
+        return await self._call("search", index_name, **query_args)
+
+    async def msearch(self, index_name: str, searches: list[dict[str, Any]]) -> Any:
+        return await self._call("msearch", index_name, searches)
+
+    async def open_point_in_time(self, index_name: str, keep_alive: str) -> str:
+        pit_id: str = await self._call("open_point_in_time", index_name, keep_alive)
+        return pit_id
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        if pit_id == self.fallback_pit_id:
+            await self.fallback.close_point_in_time(pit_id)
+        else:
+            await self._call("close_point_in_time", pit_id)
+
+    async def retrieve_document(self, index_name: str, id: Any) -> Any:
+        return await self._call("retrieve_document", index_name, id)
+
+    async def mget(self, index_name: str, ids: list[Any], source: Any = True) -> Any:
+        return await self._call("mget", index_name, ids, source)
+
+    async def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        if self.breaker.allow():
+            try:
+                result = await asyncio.wait_for(
+                    getattr(self.primary, method)(*args, **kwargs), self.timeout
+                )
+            except (TransportError, asyncio.TimeoutError) as e:
+                self._failed(method, e)
+            except ApiError as e:
+                if e.meta.status < 500:
+                    # The request itself was wrong, the fallback would not do better
+                    self.breaker.record_success()
+                    raise
+                self._failed(method, e)
+            else:
+                self.breaker.record_success()
+                return result
+        return await getattr(self.fallback, method)(*args, **kwargs)
+
+    def _failed(self, method: str, error: Exception) -> None:
+        self.breaker.record_failure()
+        logger.warning(
+            "Search %s failed, using the fallback backend%s: %r",
+            method,
+            " (circuit open)" if self.breaker.is_open else "",
+            error,
+        )
@@ -0,0 +1,225 @@
+"""
+Query language of /search/, compiled to an Elasticsearch bool query.
+
+    vallenato "feria de las flores" -rock category:Teatro category:Conciertos
+    status:Activo location:"Bogotá" from:2025-01 to:2025-06-30 capacity>=100 available:true
+
+Free words and "quoted phrases" are searched in the title and description.
+Repeating a filter ORs its values (also written as category:Teatro,Conciertos),
+different filters are ANDed and a leading "-" excludes a word, phrase or filter.
+"""
+import re
+from datetime import datetime
+from typing import Any
+
+TEXT_FIELDS = ["title", "description"]
+KEYWORD_FILTERS = {"category": "category", "status": "status", "location": "location"}
+DATE_FIELD = "start_datetime"
+FILTER_FIELDS = {*KEYWORD_FILTERS, "year", "from", "to", "capacity", "available"}
+RANGE_OPERATORS = {">=": "gte", ">": "gt", "<=": "lte", "<": "lt"}
+
+# Every token is read in a single scan of the string
+_TOKEN = re.compile(
+    r"""
+    (?P<neg>-)?
+    (?:
+        (?P<field>[A-Za-z_]+)(?P<op>>=|<=|:|>|<)(?:"(?P<quoted>[^"]*)"?|(?P<value>[^\s"]+))
+      | "(?P<phrase>[^"]*)"?
+      | (?P<word>[^\s"]+)
+    )
+    """,
+    re.VERBOSE,
+)
+_DATE = re.compile(r"\d{4}(?:-(\d{2})(?:-(\d{2}))?)?")
+_DATE_FORMATS = {"y": "%Y", "M": "%Y-%m", "d": "%Y-%m-%d"}
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+def _date_bound(field: str, value: str) -> str:
+    # Rounding to the given precision makes from:/to: include the whole year, month or day
+    m = _DATE.fullmatch(value)
+    if not m:
+        raise QuerySyntaxError(
+            f"{field}: expects a date as YYYY, YYYY-MM or YYYY-MM-DD"
+        )
+    unit = "d" if m.group(2) else "M" if m.group(1) else "y"
+    try:
+        datetime.strptime(value, _DATE_FORMATS[unit])
+    except ValueError:
+        raise QuerySyntaxError(f"{field}: {value} is not a valid date")
+    return f"{value}||/{unit}"
+
+
+def _filter_clause(field: str, op: str, values: list[str]) -> dict[str, Any]:
+    if op != ":" and field != "capacity":
+        raise QuerySyntaxError(f"{field} only supports {field}:value")
+
+    if field in KEYWORD_FILTERS:
+        if len(values) == 1:
+            return {"term": {KEYWORD_FILTERS[field]: {"value": values[0]}}}
+        return {"terms": {KEYWORD_FILTERS[field]: values}}
+
+    if field == "year":
+        ranges = [
+            {
+                "range": {
+                    DATE_FIELD: {
+                        "gte": _date_bound(field, value),
+                        "lte": _date_bound(field, value),
+                    }
+                }
+            }
+            for value in values
+        ]
+        return (
+            ranges[0]
+            if len(ranges) == 1
+            else {"bool": {"should": ranges, "minimum_should_match": 1}}
+        )
+
+    if field in ("from", "to"):
+        bound = "gte" if field == "from" else "lte"
+        return {"range": {DATE_FIELD: {bound: _date_bound(field, values[-1])}}}
+
+    if field == "available":
+        # Events with seats left, or full ones with available:false
+        value = values[-1].lower()
+        if value not in ("true", "false"):
+            raise QuerySyntaxError("available expects true or false")
+        if value == "true":
+            return {"range": {"seats_left": {"gt": 0}}}
+        return {"term": {"seats_left": {"value": 0}}}
+
+    # capacity
+    try:
+        number = int(values[-1])
+    except ValueError:
+        raise QuerySyntaxError(f"capacity expects a whole number, got {values[-1]!r}")
+    if op == ":":
+        return {"term": {"capacity": {"value": number}}}
+    return {"range": {"capacity": {RANGE_OPERATORS[op]: number}}}
+
+
+def _text_clause(text: str, phrase: bool) -> dict[str, Any]:
+    clause: dict[str, Any] = {"query": text, "fields": TEXT_FIELDS}
+    if phrase:
+        clause["type"] = "phrase"
+    return {"multi_match": clause}
+
+
+def compile_query(text: str | None) -> dict[str, Any]:
+    """
+    Compiles a /search/ query string to an Elasticsearch bool query.
+    Raises QuerySyntaxError when a filter value is not valid.
+    """
+    words: list[str] = []
+    excluded_words: list[str] = []
+    must: list[dict[str, Any]] = []
+    must_not: list[dict[str, Any]] = []
+    # (negated, field, operator) -> values, so repeated filters are ORed together
+    filters: dict[tuple[bool, str, str], list[str]] = {}
+
+    for m in _TOKEN.finditer(text or ""):
+        neg, field, op, quoted, value, phrase, word = m.groups()
+        if op and field.lower() in FILTER_FIELDS:
+            value = quoted if quoted is not None else value
+            values = [v.strip() for v in value.split(",") if v.strip()]
+            if values:
+                filters.setdefault((neg is not None, field.lower(), op), []).extend(
+                    values
+                )
+        elif phrase is not None:
+            phrase = " ".join(phrase.lower().split())
+            if phrase:
+                (must_not if neg else must).append(_text_clause(phrase, phrase=True))
+        else:
+            # Unknown fields such as "10:30" are plain words
+            word = m.group(0)[1:] if neg else m.group(0)
+            if word != "OR":
+                (excluded_words if neg else words).append(word.lower())
+
+    if words:
+        must.insert(0, _text_clause(" ".join(words), phrase=False))
+    if excluded_words:
+        must_not.append(_text_clause(" ".join(excluded_words), phrase=False))
+
+    filter_clauses: list[dict[str, Any]] = []
+    for (negated, field, op), values in filters.items():
+        clause = _filter_clause(field, op, values)
+        (must_not if negated else filter_clauses).append(clause)
+
+    query: dict[str, Any] = {
+        "must": must or [{"match_all": {}}],
+        "filter": filter_clauses,
+    }
+    if must_not:
+        query["must_not"] = must_not
+    return {"bool": query}
+
+
+# Above this many years a search reads the whole alias instead of one index per year
+MAX_ROUTED_YEARS = 20
+# Interval of years, None when unbounded on that side
+_Years = tuple[int | None, int | None]
+
+
+def _bound_year(value: Any) -> int | None:
+    text = str(value)
+    return int(text[:4]) if text[:4].isdigit() else None
+
+
+def _clause_years(clause: dict[str, Any]) -> list[_Years]:
+    # Years a clause can match, as a union of intervals
+    kind, body = next(iter(clause.items()))
+    if kind == "range" and DATE_FIELD in body:
+        bounds = body[DATE_FIELD]
+        low = next(
+            (_bound_year(bounds[op]) for op in ("gte", "gt") if op in bounds), None
+        )
+        high = next(
+            (_bound_year(bounds[op]) for op in ("lte", "lt") if op in bounds), None
+        )
+        return [(low, high)]
+    if kind == "bool":
+        years: list[_Years] = [(None, None)]
+        for clause in [*body.get("must", []), *body.get("filter", [])]:
+            years = _intersect(years, _clause_years(clause))
+        should = body.get("should", [])
+        required = body.get(
+            "minimum_should_match", 0 if body.get("must") or body.get("filter") else 1
+        )
+        if should and int(required):
+            union = [
+                interval for clause in should for interval in _clause_years(clause)
+            ]
+            years = _intersect(years, union)
+        return years
+    return [(None, None)]
+
+
+def _intersect(left: list[_Years], right: list[_Years]) -> list[_Years]:
+    intervals = []
+    for left_low, left_high in left:
+        for right_low, right_high in right:
+            lows = [year for year in (left_low, right_low) if year is not None]
+            highs = [year for year in (left_high, right_high) if year is not None]
+            low, high = max(lows, default=None), min(highs, default=None)
+            if low is None or high is None or low <= high:
+                intervals.append((low, high))
+    return intervals
+
+
+def query_years(query: dict[str, Any]) -> list[int] | None:
+    """
+    Returns the years of start_datetime a compiled query can match, so a search
+    only reads the indices of those years, or None when they are not bounded.
+    """
+    years: set[int] = set()
+    for low, high in _clause_years(query):
+        if low is None or high is None:
+            return None
+        years.update(range(low, high + 1))
+    return sorted(years) if len(years) <= MAX_ROUTED_YEARS else None
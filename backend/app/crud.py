@@ -1,10 +1,17 @@
+import csv
 import uuid
+from pathlib import Path
 from typing import Any
 
-from sqlmodel import Session, select
+from sqlalchemy import Exists, Select, Table, bindparam, exists, insert, literal, orm, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel, col, delete, func, select
 
 from app.core.security import get_password_hash, verify_password
-from app.models import User, Event, Role, Status, Category, Sessions
+from app.models import (
+    User, Event, EventAttendeeLink, Role, Status, Category, Sessions, SessionAttendeeLink,
+    SearchOutbox, City
+)
 from app.schemas.users import UserCreate, UserUpdate
 from app.schemas.roles import RoleCreate
 from app.schemas.events import EventCreate, EventUpdate
@@ -13,6 +20,49 @@ from app.schemas.status import StatusCreate
 from app.schemas.categories import CategoryCreate
 
 
+# Search outbox
+def enqueue_search_change(*, session: Session, entity: str, entity_id: uuid.UUID) -> None:
+    # Added to the caller's transaction, so the change and its outbox row commit together
+    session.add(SearchOutbox(entity=entity, entity_id=entity_id))
+
+
+# Cities
+CITIES_CSV = Path(__file__).parent / "data" / "cities.csv"
+
+
+def load_cities(*, session: Session, path: Path = CITIES_CSV) -> int:
+    # The CSV is the source of truth, so the table is replaced as a whole
+    with open(path, newline="", encoding="utf-8") as f:
+        cities = [City(name=row["name"], region=row["region"], country_code=row["country_code"],
+                       latitude=float(row["latitude"]), longitude=float(row["longitude"]))
+                  for row in csv.DictReader(f)]
+    session.execute(delete(City))
+    session.add_all(cities)
+    session.commit()
+    return len(cities)
+
+
+def geocode_location(*, session: Session, location: str) -> tuple[float, float] | None:
+    # "Teatro Colón, Bogotá" is tried as a whole and then by its parts, last first
+    for candidate in [location, *reversed(location.split(","))]:
+        name = candidate.strip().lower()
+        if not name:
+            continue
+        statement = select(City).where(func.lower(City.name) == name).limit(1)
+        city = session.exec(statement).first()
+        if city:
+            return city.latitude, city.longitude
+    return None
+
+
+def fill_coordinates(*, session: Session, db_event: Event) -> None:
+    if db_event.latitude is not None and db_event.longitude is not None:
+        return
+    coordinates = geocode_location(session=session, location=db_event.location)
+    if coordinates:
+        db_event.latitude, db_event.longitude = coordinates
+
+
 # C roles
 def create_role(*, session: Session, role_create: RoleCreate) -> Role:
     db_obj = Role(role=role_create.role)
@@ -26,6 +76,7 @@ def create_role(*, session: Session, role_create: RoleCreate) -> Role:
 def create_status(*, session: Session, status_create: StatusCreate) -> Status:
     db_obj = Status(status=status_create.status)
     session.add(db_obj)
+    enqueue_search_change(session=session, entity="status", entity_id=db_obj.id)
     session.commit()
     session.refresh(db_obj)
     return db_obj
@@ -35,6 +86,7 @@ def create_status(*, session: Session, status_create: StatusCreate) -> Status:
 def create_category(*, session: Session, category_create: CategoryCreate) -> Category:
     db_obj = Category(category=category_create.category)
     session.add(db_obj)
+    enqueue_search_change(session=session, entity="category", entity_id=db_obj.id)
     session.commit()
     session.refresh(db_obj)
     return db_obj
@@ -88,7 +140,9 @@ def create_event(*, session: Session, event_in: EventCreate,
     db_event = Event.model_validate(event_in, update={"organizer_id": organizer_id,
                                                       "status_id": status_id,
                                                       "category_id": category_id})
+    fill_coordinates(session=session, db_event=db_event)
     session.add(db_event)
+    enqueue_search_change(session=session, entity="event", entity_id=db_event.id)
     session.commit()
     session.refresh(db_event)
     return db_event
@@ -96,40 +150,165 @@ def create_event(*, session: Session, event_in: EventCreate,
 
 def update_event(*, session: Session, db_event: Event, event_in: EventUpdate) -> Any:
     event_data = event_in.model_dump(exclude_unset=True)
+    if "location" in event_data and not {"latitude", "longitude"} & event_data.keys():
+        # The coordinates of the previous location no longer apply
+        event_data.update(latitude=None, longitude=None)
     db_event.sqlmodel_update(event_data)
+    fill_coordinates(session=session, db_event=db_event)
     session.add(db_event)
+    enqueue_search_change(session=session, entity="event", entity_id=db_event.id)
     session.commit()
     session.refresh(db_event)
     return db_event
 
 
-def add_attendee_event(*, session: Session, db_event: Event) -> Event:
-    session.add(db_event)
-    session.commit()
-    session.refresh(db_event)
-    return db_event
+def _table(model: type[SQLModel]) -> Table:
+    # SQLModel does not declare the __table__ SQLAlchemy gives every model
+    table: Table = model.__table__  # type: ignore[attr-defined]
+    return table
+
+
+def _registration_statement(parent: Table, link: Table, key: str, *,
+                            allowed: Exists | None = None,
+                            entity: str | None = None) -> tuple[Select[Any], Exists]:
+    """
+    One statement registering :user_id for the :<key> row of parent: the link is
+    inserted unless it exists (or allowed is false), the seat is taken only while
+    attendee_count < capacity (rechecked on the locked row by concurrent
+    registrations) and, given an entity, the search document update is queued
+    with it. Built once with bound parameters, so every call reuses the compiled
+    SQL; a plain INSERT, as ON CONFLICT statements are never cached.
+
+    The parent row is only locked by the final UPDATE, once the link is in, and
+    until the caller commits right after; registrations that see it full or find
+    the user registered already are turned away without waiting on that lock.
+    """
+    parent_id = bindparam(key, type_=link.c[key].type)
+    user_id = bindparam("user_id", type_=link.c.user_id.type)
+    registered = exists().where(link.c[key] == parent_id, link.c.user_id == user_id)
+    conditions = [parent.c.id == parent_id, parent.c.attendee_count < parent.c.capacity,
+                  ~registered]
+    if allowed is not None:
+        conditions.append(allowed)
+    linked = (
+        insert(link)
+        .from_select([key, "user_id"], select(parent.c.id, user_id).where(*conditions))
+        .returning(link.c[key])
+        .cte("linked")
+    )
+    seated = (
+        update(parent)
+        .where(parent.c.id.in_(select(linked.c[key])),
+               parent.c.attendee_count < parent.c.capacity)
+        .values(attendee_count=parent.c.attendee_count + 1)
+        .returning(parent.c.id,
+                   (parent.c.capacity - parent.c.attendee_count).label("seats_left"))
+        .cte("seated")
+    )
+    columns = [
+        select(func.count()).select_from(linked).scalar_subquery().label("linked"),
+        select(seated.c.seats_left).scalar_subquery().label("seats_left"),
+    ]
+    if entity is not None:
+        outbox = _table(SearchOutbox)
+        queued = (
+            insert(outbox)
+            .from_select(["entity", "entity_id"], select(literal(entity), seated.c.id))
+            .returning(outbox.c.id)
+            .cte("queued")
+        )
+        columns.append(select(func.count()).select_from(queued).scalar_subquery()
+                       .label("queued"))
+    return select(*columns), registered
+
+
+# A SQLAlchemy session, which is what AsyncSession.run_sync passes to the routes
+def _register(session: orm.Session, statement: Select[Any], registered: Exists,
+              model: type[Event] | type[Sessions],
+              parent_id: uuid.UUID, params: dict[str, Any],
+              allowed: Exists | None = None) -> tuple[str, int | None]:
+    try:
+        row = session.execute(statement, params).one()
+    except IntegrityError:
+        # The same user registered concurrently, so the link already exists
+        row = None
+    if row is not None and row.seats_left is not None:
+        session.commit()
+        return "registered", row.seats_left
+
+    # A link inserted while a concurrent registration took the last seat is undone
+    session.rollback()
+    seats_left = session.execute(
+        select(func.greatest(col(model.capacity) - col(model.attendee_count), 0))
+        .where(col(model.id) == parent_id)
+    ).scalar()
+    if seats_left is None:
+        return "not_found", None
+    if session.execute(select(registered), params).scalar_one():
+        return "already_registered", seats_left
+    if allowed is not None and not session.execute(select(allowed), params).scalar_one():
+        return "not_allowed", seats_left
+    return "full", 0
+
+
+_REGISTER_ATTENDEE, _IS_ATTENDEE = _registration_statement(
+    _table(Event), _table(EventAttendeeLink), "event_id", entity="attendance")
+
+
+def register_attendee(*, session: orm.Session, event_id: uuid.UUID,
+                      user_id: uuid.UUID) -> tuple[str, int | None]:
+    """
+    Registers the user for the event while seats are left, without loading its attendees.
+    Returns the outcome, "registered", "already_registered", "full" or "not_found",
+    and the seats left.
+    """
+    return _register(session, _REGISTER_ATTENDEE, _IS_ATTENDEE, Event, event_id,
+                     {"event_id": event_id, "user_id": user_id})
 
 
 # CRUD sessions
 def create_sessions(*, session: Session, sessions_in: SessionsCreate, event_id: uuid.UUID) -> Sessions:
-    db_sessions = Event.model_validate(sessions_in, update={"event_id": event_id})
+    db_sessions = Sessions.model_validate(sessions_in, update={"event_id": event_id})
     session.add(db_sessions)
+    enqueue_search_change(session=session, entity="event", entity_id=db_sessions.event_id)
     session.commit()
     session.refresh(db_sessions)
     return db_sessions
 
 
 def update_sessions(*, session: Session, db_sessions: Sessions, sessions_in: SessionsUpdate) -> Any:
+    previous_event_id = db_sessions.event_id
     event_data = sessions_in.model_dump(exclude_unset=True)
     db_sessions.sqlmodel_update(event_data)
     session.add(db_sessions)
+    enqueue_search_change(session=session, entity="event", entity_id=previous_event_id)
+    if db_sessions.event_id != previous_event_id:
+        enqueue_search_change(session=session, entity="event", entity_id=db_sessions.event_id)
     session.commit()
     session.refresh(db_sessions)
     return db_sessions
 
 
-def add_attendee_sessions(*, session: Session, db_sessions: Sessions) -> Sessions:
-    session.add(db_sessions)
-    session.commit()
-    session.refresh(db_sessions)
-    return db_sessions
+# Correlated to sessions inside the registration, on its own it looks the session up
+_IS_EVENT_ATTENDEE = exists().where(
+    _table(EventAttendeeLink).c.event_id == _table(Sessions).c.event_id,
+    _table(EventAttendeeLink).c.user_id == bindparam(
+        "user_id", type_=_table(EventAttendeeLink).c.user_id.type),
+    _table(Sessions).c.id == bindparam(
+        "session_id", type_=_table(SessionAttendeeLink).c.session_id.type),
+)
+_REGISTER_SESSION_ATTENDEE, _IS_SESSION_ATTENDEE = _registration_statement(
+    _table(Sessions), _table(SessionAttendeeLink), "session_id",
+    allowed=_IS_EVENT_ATTENDEE)
+
+
+def register_session_attendee(*, session: orm.Session, session_id: uuid.UUID,
+                              user_id: uuid.UUID) -> tuple[str, int | None]:
+    """
+    Registers an attendee of the parent event for the session while seats are left.
+    Returns the outcome, "registered", "already_registered", "full", "not_found" or
+    "not_allowed" when the user is not registered for the event, and the seats left.
+    """
+    return _register(session, _REGISTER_SESSION_ATTENDEE, _IS_SESSION_ATTENDEE, Sessions,
+                     session_id, {"session_id": session_id, "user_id": user_id},
+                     allowed=_IS_EVENT_ATTENDEE)
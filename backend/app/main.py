@@ -1,10 +1,26 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+import redis.asyncio
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.core.cache import SearchCache, redis_connection_args
 from app.core.config import settings
+from app.core.db import async_engine, async_replica_engine
+from app.core.es import AsyncES_connector
+from app.core.indexer import load_event_documents, refresh_memory_backend
+from app.core.pg_search import POINT_IN_TIME_ID, PostgresSearchBackend
+from app.core.read_your_writes import ReadYourWritesMiddleware
+from app.core.search_backend import (
+    CircuitBreaker,
+    FallbackSearchBackend,
+    InMemorySearchBackend,
+)
 
 
 description = """
@@ -42,6 +58,37 @@ def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    refresher = None
+    if settings.SEARCH_BACKEND == "memory":
+        app.state.es = InMemorySearchBackend(
+            await asyncio.to_thread(load_event_documents)
+        )
+        refresher = asyncio.create_task(refresh_memory_backend(app.state.es))
+    elif settings.SEARCH_FALLBACK:
+        app.state.es = FallbackSearchBackend(
+            AsyncES_connector(),
+            PostgresSearchBackend(),
+            CircuitBreaker(
+                settings.SEARCH_BREAKER_FAILURES, settings.SEARCH_BREAKER_RESET_TIMEOUT
+            ),
+            timeout=settings.SEARCH_FALLBACK_TIMEOUT,
+            fallback_pit_id=POINT_IN_TIME_ID,
+        )
+    else:
+        app.state.es = AsyncES_connector()
+    app.state.search_cache = SearchCache(redis.asyncio.Redis(**redis_connection_args()))
+    yield
+    if refresher:
+        refresher.cancel()
+    await app.state.es.close()
+    await app.state.search_cache.close()
+    await async_engine.dispose()
+    if async_replica_engine is not None:
+        await async_replica_engine.dispose()
+
+
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
@@ -51,6 +98,7 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     openapi_tags=tags_metadata,
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -63,4 +111,7 @@ if settings.all_cors_origins:
         allow_headers=["*"],
     )
 
+if settings.SQLALCHEMY_REPLICA_DATABASE_URI:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
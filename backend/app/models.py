@@ -1,7 +1,9 @@
 import uuid
 
 from datetime import datetime
-from sqlmodel import Field, Relationship, SQLModel, Column, DateTime
+from sqlalchemy import Computed, Index, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlmodel import Field, Relationship, SQLModel, Column, DateTime, func
 from app.schemas.users import UserBase
 from app.schemas.events import EventBase
 from app.schemas.roles import RoleBase
@@ -72,17 +74,35 @@ class Category(CategoryBase, table=True):
 
 # Database model, database table inferred from class name
 class Event(EventBase, table=True):
+    __table_args__ = (
+        Index("ix_event_search_vector", "search_vector", postgresql_using="gin"),
+        # Bounding box lookups for the distance search, no extension needed
+        Index("ix_event_coordinates", text("point(longitude, latitude)"),
+              postgresql_using="gist"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     title: str = Field(max_length=255)
     description: str = Field(max_length=255)
     start_datetime: datetime = Column(DateTime(timezone=True), nullable=False)
     end_datetime: datetime = Column(DateTime(timezone=True), nullable=False)
     location: str = Field(max_length=255)
+    latitude: float | None = Field(default=None)
+    longitude: float | None = Field(default=None)
     capacity: int = Field(nullable=False)
     attendee_count: int = Field(nullable=False)
+    # Clicks from search results, added in batches by the search indexer
+    click_count: int = Field(default=0, nullable=False, sa_column_kwargs={"server_default": "0"})
     organizer_id: uuid.UUID = Field(foreign_key="user.id", nullable=False)
     category_id: uuid.UUID = Field(foreign_key="category.id", nullable=False)
     status_id: uuid.UUID = Field(foreign_key="status.id", nullable=False)
+    # Kept up to date by Postgres, used by the full-text search fallback
+    search_vector: str | None = Field(default=None, sa_column=Column(
+        TSVECTOR,
+        Computed("setweight(to_tsvector('spanish', coalesce(title, '')), 'A') || "
+                 "setweight(to_tsvector('spanish', coalesce(description, '')), 'B')",
+                 persisted=True),
+    ))
 
     # Establish the back references
     organizer: User = Relationship(back_populates="organizer_of")
@@ -113,3 +133,26 @@ class Sessions(SessionsBase, table=True):
 
     # Establish a many-to-many relationship
     attendees: list["User"] = Relationship(back_populates="sessions", link_model=SessionAttendeeLink)
+
+
+# Offline geocoding table, loaded from app/data/cities.csv
+class City(SQLModel, table=True):
+    __table_args__ = (Index("ix_city_name", text("lower(name)")),)
+
+    id: int | None = Field(default=None, primary_key=True)
+    name: str = Field(max_length=100)
+    region: str = Field(max_length=100)
+    country_code: str = Field(max_length=2)
+    latitude: float = Field(nullable=False)
+    longitude: float = Field(nullable=False)
+
+
+# Pending changes to propagate to the Elasticsearch index. Rows are written in the
+# same transaction as the change and drained by the search indexer worker.
+class SearchOutbox(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    entity: str = Field(max_length=25, nullable=False)
+    entity_id: uuid.UUID = Field(nullable=False)
+    created_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    )
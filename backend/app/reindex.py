@@ -0,0 +1,60 @@
+import argparse
+import logging
+from datetime import datetime, timezone
+
+import redis
+
+from app.core.cache import bump_search_generation, redis_connection_args
+from app.core.config import settings
+from app.core.es import ES_connector
+from app.core.indexer import reindex_events
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuild the events search index without downtime"
+    )
+    parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="point the alias back to the previous generation",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.ES_REINDEX_WORKERS,
+        help="number of processes, each one indexes a range of event ids",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=settings.ES_BULK_CHUNK_SIZE,
+        help="events read from Postgres and sent per bulk request",
+    )
+    parser.add_argument(
+        "--freeze-past-years",
+        action="store_true",
+        help="force-merge the indices of past years, make them read-only "
+        "and move them off the hot nodes",
+    )
+    args = parser.parse_args()
+
+    es = ES_connector()
+    if args.freeze_past_years:
+        frozen = es.freeze_past_years(
+            settings.ES_INDEX, before_year=datetime.now(timezone.utc).year
+        )
+        logger.info("Froze %s", ", ".join(frozen) or "no indices")
+    elif args.rollback:
+        index_name = es.rollback_alias(settings.ES_INDEX)
+        bump_search_generation(redis.Redis(**redis_connection_args()))
+        logger.info("%s rolled back to %s", settings.ES_INDEX, index_name)
+    else:
+        reindex_events(es=es, workers=args.workers, chunk_size=args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,10 +15,13 @@ class EventCreate(EventBase):
     start_datetime: FutureDatetime
     end_datetime: FutureDatetime
     location: str = Field(max_length=255)
+    # Geocoded from location when omitted
+    latitude: float | None = Field(default=None, ge=-90, le=90)
+    longitude: float | None = Field(default=None, ge=-180, le=180)
     capacity: int = Field(gt=5)
     attendee_count: int = Field(default=0, ge=0)
     organizer_id: uuid.UUID
-    status_id: uuid.UUID    
+    status_id: uuid.UUID
     category_id: uuid.UUID
 
     @field_validator("end_datetime")
@@ -41,6 +44,8 @@ class EventUpdate(EventBase):
     start_datetime: datetime | None
     end_datetime: datetime | None
     location: str | None = Field(max_length=255)
+    latitude: float | None = Field(default=None, ge=-90, le=90)
+    longitude: float | None = Field(default=None, ge=-180, le=180)
     capacity: int | None = Field(gt=5)
     attendee_count: int | None = Field(ge=0)
     organizer_id: uuid.UUID | None
@@ -52,8 +57,17 @@ class EventUpdate(EventBase):
 class EventPublic(EventBase):
     id: uuid.UUID
     organizer_id: uuid.UUID
+    latitude: float | None = None
+    longitude: float | None = None
 
 
 class EventsPublic(SQLModel):
     data: list[EventPublic]
     count: int
+
+
+class EventAttendancePublic(SQLModel):
+    event_id: uuid.UUID
+    seats_left: int
+    # True when the user was already registered, so nothing changed
+    already_registered: bool
@@ -0,0 +1,102 @@
+import uuid
+from datetime import datetime
+from typing import Any, Literal
+
+from sqlmodel import Field, SQLModel
+
+from app.core.config import settings
+
+
+class Coordinates(SQLModel):
+    lat: float
+    lon: float
+
+
+# An event as indexed for search; only the requested fields are returned
+class SearchHitPublic(SQLModel):
+    # The _id of the search document, the event id
+    id: str
+    score: float | None = None
+    # Kilometres from the near point, when searching by distance
+    distance: float | None = None
+    title: str | None = None
+    description: str | None = None
+    start_datetime: datetime | None = None
+    end_datetime: datetime | None = None
+    location: str | None = None
+    coordinates: Coordinates | None = None
+    capacity: int | None = None
+    attendee_count: int | None = None
+    seats_left: int | None = None
+    click_count: int | None = None
+    popularity: float | None = None
+    organizer_id: uuid.UUID | None = None
+    category: str | None = None
+    status: str | None = None
+    sessions: list[str] | None = None
+
+
+# Fields of the indexed document that can be requested with fields=
+SOURCE_FIELDS = [
+    name
+    for name in SearchHitPublic.model_fields
+    if name not in ("id", "score", "distance")
+]
+
+
+class SearchFacetPublic(SQLModel):
+    value: str
+    count: int
+
+
+class SearchFacetsPublic(SQLModel):
+    category: list[SearchFacetPublic]
+    year: list[SearchFacetPublic]
+
+
+class SearchHitsPublic(SQLModel):
+    data: list[SearchHitPublic]
+    # None when the page did not count, "gte" when there were more than counted
+    total: int | None
+    total_relation: Literal["eq", "gte"] | None
+    next_cursor: str | None
+    facets: SearchFacetsPublic | None = None
+
+
+class SearchDocumentsPublic(SQLModel):
+    data: list[SearchHitPublic]
+    missing: list[str]
+
+
+class SearchSimilarPublic(SQLModel):
+    data: list[SearchHitPublic]
+
+
+# One query of a batch, with the same parameters as GET /search/
+class SearchQuery(SQLModel):
+    query: str = ""
+    start: int = Field(default=0, ge=0)
+    page_size: int = Field(default=5, ge=1, le=settings.SEARCH_PAGE_MAX_SIZE)
+    near: str | None = None
+    radius: str | None = None
+    fields: str | None = None
+    sort: str | None = None
+
+
+class SearchBatch(SQLModel):
+    queries: list[SearchQuery] = Field(
+        min_length=1, max_length=settings.SEARCH_BATCH_MAX_QUERIES
+    )
+
+
+class SearchErrorPublic(SQLModel):
+    status: int
+    detail: Any
+
+
+class SearchBatchErrorPublic(SQLModel):
+    error: SearchErrorPublic
+
+
+class SearchBatchPublic(SQLModel):
+    responses: list[SearchHitsPublic | SearchBatchErrorPublic]
@@ -61,3 +61,10 @@ class SessionsAttendeePublic(SessionsBase):
     id: uuid.UUID
     event_id: uuid.UUID
     speaker_id: uuid.UUID
+
+
+class SessionsAttendancePublic(SQLModel):
+    session_id: uuid.UUID
+    seats_left: int
+    # True when the user was already registered, so nothing changed
+    already_registered: bool
@@ -25,3 +25,20 @@ class NewPassword(SQLModel):
 class UpdatePassword(SQLModel):
     current_password: str = Field(min_length=8, max_length=40)
     new_password: str = Field(min_length=8, max_length=40)
+
+
+# Connection pool usage of one engine since the process started
+class PoolMetricsPublic(SQLModel):
+    pool_size: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    checked_out_max: int
+    checkouts: int
+    overflow_connections: int
+    invalidations: int
+    timeouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+    # Checkouts that waited up to each bound, in seconds
+    wait_buckets: dict[str, int]
@@ -0,0 +1,15 @@
+import logging
+
+from app.core.indexer import run_outbox_worker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    logger.info("Starting search indexer")
+    run_outbox_worker()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+import statistics
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import httpx
+from sqlmodel import Session, select
+
+from app.core import security
+from app.core.config import settings
+from app.core.db import async_engine, engine
+from app.main import app
+from app.models import Event
+from app.tests.utils.event import create_random_event
+from app.tests.utils.user import create_random_user_ids
+
+REGISTRATIONS = 300
+# How long the event row stays locked, as a hot event's row would be during a flash sale
+LOCK_SECONDS = 2.0
+
+
+def _hold_event_lock(event_id: uuid.UUID, locked: threading.Event) -> None:
+    with Session(engine) as session:
+        session.exec(select(Event).where(Event.id == event_id).with_for_update()).one()
+        locked.set()
+        time.sleep(LOCK_SECONDS)
+        session.commit()
+
+
+async def _storm(
+    event_id: uuid.UUID, tokens: list[str]
+) -> tuple[list[int], list[float]]:
+    """
+    Registers every token while the health check is polled on the same event loop.
+    Returns the registration status codes and the health check latencies.
+    """
+    locked = threading.Event()
+    holder = threading.Thread(target=_hold_event_lock, args=(event_id, locked))
+    holder.start()
+    locked.wait()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+        async def register(arrival: float, token: str) -> int:
+            await asyncio.sleep(arrival)
+            response = await client.post(
+                f"{settings.API_V1_STR}/events/attend/{event_id}",
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            return response.status_code
+
+        # Arrivals spread over half a second, as clients hammering the button would
+        storm = asyncio.gather(
+            *(
+                register(number / len(tokens) / 2, token)
+                for number, token in enumerate(tokens)
+            )
+        )
+        latencies = []
+        while not storm.done():
+            # Measured from when the request is due, so time the loop was blocked counts
+            due = time.perf_counter() + 0.005
+            await asyncio.sleep(0.005)
+            response = await client.get(f"{settings.API_V1_STR}/utils/health-check/")
+            assert response.status_code == 200
+            latencies.append(time.perf_counter() - due)
+        statuses = await storm
+    holder.join()
+    # Its connections belong to this event loop
+    await async_engine.dispose()
+    return statuses, latencies
+
+
+def test_registration_storm_keeps_other_requests_fast(db: Session) -> None:
+    event = create_random_event(db)
+    event.capacity = REGISTRATIONS
+    db.add(event)
+    db.commit()
+    tokens = [
+        security.create_access_token(user_id, timedelta(minutes=5))
+        for user_id in create_random_user_ids(db, REGISTRATIONS)
+    ]
+
+    statuses, latencies = asyncio.run(_storm(event.id, tokens))
+
+    assert statuses == [200] * REGISTRATIONS
+    db.refresh(event)
+    assert event.attendee_count == REGISTRATIONS
+    # Registrations waiting on the locked row never hold up the event loop
+    assert statistics.median(latencies) < 0.05
+    assert max(latencies) < LOCK_SECONDS / 2
@@ -178,3 +178,38 @@ def test_delete_event_not_enough_permissions(
     assert response.status_code == 400
     content = response.json()
     assert content["detail"] == "Not enough permissions"
+
+
+def test_attend_event(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    event = create_random_event(db)
+    for already_registered in (False, True):
+        response = client.post(
+            f"{settings.API_V1_STR}/events/attend/{event.id}",
+            headers=normal_user_token_headers,
+        )
+        assert response.status_code == 200
+        assert response.json() == {"event_id": str(event.id), "seats_left": 99,
+                                   "already_registered": already_registered}
+
+    response = client.post(
+        f"{settings.API_V1_STR}/events/attend/{uuid.uuid4()}",
+        headers=normal_user_token_headers,
+    )
+    assert response.status_code == 404
+
+
+def test_attend_full_event(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    event = create_random_event(db)
+    event.attendee_count = event.capacity
+    db.add(event)
+    db.commit()
+    response = client.post(
+        f"{settings.API_V1_STR}/events/attend/{event.id}",
+        headers=normal_user_token_headers,
+    )
+    assert response.status_code == 409
+    assert response.json()["detail"] == "The event is full"
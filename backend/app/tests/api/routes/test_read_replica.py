@@ -0,0 +1,95 @@
+import asyncio
+import time
+from collections.abc import Generator
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.api import deps
+from app.core.config import settings
+from app.core.pool_metrics import (
+    InstrumentedAsyncAdaptedQueuePool,
+    InstrumentedQueuePool,
+    PoolMetrics,
+)
+from app.core.read_your_writes import (
+    LAST_WRITE_COOKIE,
+    ReadYourWritesMiddleware,
+    wrote_recently,
+)
+
+
+@pytest.fixture
+def replica(
+    monkeypatch: pytest.MonkeyPatch,
+) -> Generator[dict[str, PoolMetrics], None, None]:
+    # A second engine on the local Postgres stands in for the replica, its pool
+    # metrics tell which engine served each read
+    replica_engine = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI), poolclass=InstrumentedQueuePool
+    )
+    async_replica_engine = create_async_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+    )
+    monkeypatch.setattr(deps, "replica_engine", replica_engine)
+    monkeypatch.setattr(deps, "async_replica_engine", async_replica_engine)
+    yield {
+        "sync": PoolMetrics(replica_engine),
+        "async": PoolMetrics(async_replica_engine.sync_engine),
+    }
+    replica_engine.dispose()
+    asyncio.run(async_replica_engine.dispose())
+
+
+def test_reads_go_to_the_replica_unless_the_client_wrote(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    replica: dict[str, PoolMetrics],
+) -> None:
+    def read(cookies: dict[str, str]) -> tuple[int, int]:
+        client.cookies.clear()
+        client.cookies.update(cookies)
+        for path in ("/event_categories/", "/events/"):
+            response = client.get(
+                f"{settings.API_V1_STR}{path}", headers=normal_user_token_headers
+            )
+            assert response.status_code == 200
+        client.cookies.clear()
+        return replica["sync"].checkouts, replica["async"].checkouts
+
+    assert read({}) == (1, 1)
+    assert read({LAST_WRITE_COOKIE: str(int(time.time()))}) == (1, 1)
+    assert read({LAST_WRITE_COOKIE: str(int(time.time()) - 60)}) == (2, 2)
+    assert read({LAST_WRITE_COOKIE: "garbage"}) == (3, 3)
+
+
+def test_successful_writes_set_the_cookie() -> None:
+    app = FastAPI()
+
+    @app.post("/written")
+    def written() -> None:
+        return None
+
+    @app.post("/rejected")
+    def rejected() -> None:
+        raise HTTPException(status_code=400)
+
+    @app.get("/read")
+    def read() -> None:
+        return None
+
+    app.add_middleware(ReadYourWritesMiddleware)
+    client = TestClient(app)
+
+    response = client.post("/written")
+    assert wrote_recently(response.cookies)
+    assert (
+        f"Max-Age={settings.POSTGRES_READ_YOUR_WRITES_SECONDS}"
+        in (response.headers["set-cookie"])
+    )
+    assert LAST_WRITE_COOKIE not in client.post("/rejected").cookies
+    assert LAST_WRITE_COOKIE not in client.get("/read").cookies
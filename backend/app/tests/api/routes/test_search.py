@@ -0,0 +1,547 @@
+import asyncio
+import uuid
+from collections.abc import Generator
+from typing import Any
+from unittest.mock import AsyncMock
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.api.deps import get_es, get_search_cache
+from app.api.routes import search
+from app.core.cache import CLICKS_KEY, SearchCache
+from app.core.config import settings
+from app.core.search_backend import InMemorySearchBackend, bad_request_error
+from app.main import app
+from app.tests.core.test_search_backend import DOCUMENTS
+from app.tests.utils.event import create_random_event
+
+
+@pytest.fixture
+def es() -> Generator[AsyncMock, None, None]:
+    es = AsyncMock()
+    app.dependency_overrides[get_es] = lambda: es
+    yield es
+    app.dependency_overrides.pop(get_es)
+
+
+@pytest.fixture
+def memory_es(
+    monkeypatch: pytest.MonkeyPatch,
+) -> Generator[InMemorySearchBackend, None, None]:
+    # The dates of DOCUMENTS are fixed, so their ranking must not depend on today
+    monkeypatch.setattr(settings, "SEARCH_DECAY_SCALE", "36500d")
+    es = InMemorySearchBackend(DOCUMENTS)
+    app.dependency_overrides[get_es] = lambda: es
+    yield es
+    app.dependency_overrides.pop(get_es)
+
+
+@pytest.fixture(autouse=True)
+def cache() -> Generator[SearchCache, None, None]:
+    # Every search of this module caches in a fake Redis
+    cache = SearchCache(fakeredis.FakeAsyncRedis())
+    app.dependency_overrides[get_search_cache] = lambda: cache
+    yield cache
+    app.dependency_overrides.pop(get_search_cache)
+
+
+def _hits(count: int) -> list[dict[str, Any]]:
+    return [
+        {"_id": str(i), "_source": {"title": f"Evento {i}"}, "sort": [i, str(i)]}
+        for i in range(count)
+    ]
+
+
+def _aggregations() -> dict[str, Any]:
+    return {
+        "category-agg": {"buckets": [{"key": "Teatro", "doc_count": 2}]},
+        "year-agg": {"buckets": [{"key_as_string": "2025", "key": 0, "doc_count": 2}]},
+    }
+
+
+def _search_side_effect(hits_response: dict[str, Any]) -> Any:
+    # Facet queries ask for aggregations only, page queries for hits only
+    async def search(**kwargs: Any) -> dict[str, Any]:
+        if "aggs" in kwargs:
+            return {"hits": {"hits": []}, "aggregations": _aggregations()}
+        return hits_response
+
+    return search
+
+
+def _page_calls(es: AsyncMock) -> list[Any]:
+    return [c for c in es.search.call_args_list if "aggs" not in c.kwargs]
+
+
+def test_search_cursor_first_page(client: TestClient, es: AsyncMock) -> None:
+    es.open_point_in_time.return_value = "pit-1"
+    es.search.side_effect = _search_side_effect(
+        {"pit_id": "pit-2", "hits": {"hits": _hits(2)}}
+    )
+
+    response = client.get(
+        f"{settings.API_V1_STR}/search/?query=teatro&page_size=2&cursor"
+    )
+
+    assert response.status_code == 200
+    content = response.json()
+    assert len(content["data"]) == 2
+    assert search.decode_cursor(content["next_cursor"]) == ("pit-2", [1, "1"])
+    assert content["facets"]["category"] == [{"value": "Teatro", "count": 2}]
+    (page_call,) = _page_calls(es)
+    kwargs = page_call.kwargs
+    assert kwargs["pit"]["id"] == "pit-1"
+    assert kwargs["search_after"] is None
+    assert "from_" not in kwargs
+
+
+def test_search_cursor_next_page(client: TestClient, es: AsyncMock) -> None:
+    es.search.return_value = {"pit_id": "pit-1", "hits": {"hits": _hits(1)}}
+    cursor = search.encode_cursor("pit-1", [5, "5"])
+
+    response = client.get(
+        f"{settings.API_V1_STR}/search/", params={"page_size": 2, "cursor": cursor}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["next_cursor"] is None
+    assert "facets" not in response.json()
+    assert es.search.call_args.kwargs["search_after"] == [5, "5"]
+    es.open_point_in_time.assert_not_called()
+    es.close_point_in_time.assert_called_once_with("pit-1")
+
+
+def test_search_invalid_cursor(client: TestClient, es: AsyncMock) -> None:
+    response = client.get(f"{settings.API_V1_STR}/search/", params={"cursor": "nope"})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+    es.search.assert_not_called()
+
+
+def test_search_forged_cursor(client: TestClient, es: AsyncMock) -> None:
+    forged: list[Any] = [[5], [5, "5", 6], [{"script": "x"}, "5"], "5"]
+    for after in forged:
+        response = client.get(
+            f"{settings.API_V1_STR}/search/",
+            params={"cursor": search.encode_cursor("pit-1", after)},
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+    es.search.assert_not_called()
+
+
+def test_search_cursor_rejected_by_elasticsearch(
+    client: TestClient, es: AsyncMock
+) -> None:
+    es.search.side_effect = bad_request_error("failed to parse search_after value")
+
+    response = client.get(
+        f"{settings.API_V1_STR}/search/",
+        params={"cursor": search.encode_cursor("pit-1", ["x", "5"])},
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_search_results_are_cached(client: TestClient, es: AsyncMock) -> None:
+    es.search.side_effect = _search_side_effect({"hits": {"hits": _hits(1)}})
+
+    for query in ("Teatro", " teatro "):
+        response = client.get(f"{settings.API_V1_STR}/search/", params={"query": query})
+        assert response.status_code == 200
+        assert len(response.json()["data"]) == 1
+
+    assert es.search.call_count == 2
+    assert "aggs" not in _page_calls(es)[0].kwargs
+
+
+def test_search_reads_only_the_filtered_years(
+    client: TestClient, es: AsyncMock
+) -> None:
+    es.search.side_effect = _search_side_effect({"hits": {"hits": _hits(1)}})
+
+    client.get(
+        f"{settings.API_V1_STR}/search/", params={"query": "teatro year:2024,2026"}
+    )
+    client.get(f"{settings.API_V1_STR}/search/", params={"query": "teatro from:2024"})
+
+    indices = [call.kwargs["index_name"] for call in _page_calls(es)]
+    assert indices == [
+        f"{settings.ES_INDEX}-2024,{settings.ES_INDEX}-2026",
+        settings.ES_INDEX,
+    ]
+    assert all(call.kwargs["ignore_unavailable"] for call in es.search.call_args_list)
+
+
+def test_search_next_page_reuses_facets(client: TestClient, es: AsyncMock) -> None:
+    es.search.side_effect = _search_side_effect({"hits": {"hits": _hits(1)}})
+
+    for start in (0, 5):
+        response = client.get(
+            f"{settings.API_V1_STR}/search/",
+            params={"query": "teatro category:Teatro", "start": start},
+        )
+        assert response.json()["facets"]["year"] == [{"value": "2025", "count": 2}]
+
+    assert len(_page_calls(es)) == 2
+    assert es.search.call_count == 3
+
+
+def test_search_facets(client: TestClient, es: AsyncMock) -> None:
+    es.search.side_effect = _search_side_effect({"hits": {"hits": []}})
+
+    response = client.get(
+        f"{settings.API_V1_STR}/search/facets", params={"query": "category:Teatro"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["category"] == [{"value": "Teatro", "count": 2}]
+    kwargs = es.search.call_args.kwargs
+    assert kwargs["size"] == 0
+    assert kwargs["query"]["bool"]["filter"] == [
+        {"term": {"category": {"value": "Teatro"}}}
+    ]
+
+
+def test_search_suggest(client: TestClient, es: AsyncMock) -> None:
+    es.search.return_value = {
+        "hits": {
+            "hits": [
+                {
+                    "_id": "1",
+                    "_source": {"title": "Festival de Jazz", "location": "Medellín"},
+                }
+            ]
+        }
+    }
+
+    for q in ("Fest med", "fest  med"):
+        response = client.get(
+            f"{settings.API_V1_STR}/search/suggest",
+            params={"q": q, "size": settings.SEARCH_SUGGEST_MAX_SIZE},
+        )
+        assert response.status_code == 200
+        assert response.json()["suggestions"] == [
+            {"id": "1", "title": "Festival de Jazz", "location": "Medellín"}
+        ]
+
+    es.search.assert_called_once()
+    kwargs = es.search.call_args.kwargs
+    assert kwargs["query"]["multi_match"]["query"] == "fest med"
+    assert kwargs["size"] == settings.SEARCH_SUGGEST_MAX_SIZE
+    for size in (0, settings.SEARCH_SUGGEST_MAX_SIZE + 1):
+        response = client.get(
+            f"{settings.API_V1_STR}/search/suggest", params={"q": "fest", "size": size}
+        )
+        assert response.status_code == 422
+
+
+@pytest.mark.usefixtures("memory_es")
+def test_search_in_memory(client: TestClient) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/search/",
+        params={"query": "jazz -status:Cancelado from:2024"},
+    )
+
+    assert response.status_code == 200
+    content = response.json()
+    assert [hit["id"] for hit in content["data"]] == ["1", "2"]
+    assert content["facets"]["category"] == [{"value": "Conciertos", "count": 2}]
+    assert content["facets"]["year"] == [
+        {"value": "2024", "count": 1},
+        {"value": "2025", "count": 1},
+    ]
+
+
+@pytest.mark.usefixtures("memory_es")
+def test_search_cursor_in_memory(client: TestClient) -> None:
+    ids: list[str] = []
+    cursor: str | None = ""
+    while cursor is not None:
+        response = client.get(
+            f"{settings.API_V1_STR}/search/", params={"page_size": 3, "cursor": cursor}
+        )
+        assert response.status_code == 200
+        content = response.json()
+        ids.extend(hit["id"] for hit in content["data"])
+        cursor = content["next_cursor"]
+
+    assert ids == ["1", "2", "4", "3"]
+
+
+@pytest.mark.usefixtures("memory_es")
+def test_search_near_in_memory(client: TestClient) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/search/",
+        params={"query": "jazz", "near": "4.7110,-74.0721", "radius": "20km"},
+    )
+
+    assert response.status_code == 200
+    content = response.json()
+    assert [hit["id"] for hit in content["data"]] == ["2", "1"]
+    assert content["data"][0]["distance"] == 0.0
+    assert content["facets"]["category"] == [{"value": "Conciertos", "count": 2}]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/search/",
+        params={"near": "6.25,-75.56", "page_size": 1, "cursor": ""},
+    )
+    assert [hit["id"] for hit in response.json()["data"]] == ["3"]
+
+    for params in (
+        {"near": "Medellín"},
+        {"near": "95,0"},
+        {"near": "6.25,-75.56", "radius": "cerca"},
+    ):
+        response = client.get(f"{settings.API_V1_STR}/search/", params=params)
+        assert response.status_code == 400
+
+
+@pytest.mark.usefixtures("memory_es")
+def test_search_available_by_seats_left(client: TestClient) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/search/",
+        params={"query": "available:true", "sort": "seats_left"},
+    )
+
+    assert [(hit["id"], hit["seats_left"]) for hit in response.json()["data"]] == [
+        ("1", 120),
+        ("4", 35),
+        ("3", 10),
+    ]
+
+    ids: list[str] = []
+    cursor: str | None = ""
+    while cursor is not None:
+        content = client.get(
+            f"{settings.API_V1_STR}/search/",
+            params={"sort": "seats_left", "page_size": 2, "cursor": cursor},
+        ).json()
+        ids.extend(hit["id"] for hit in content["data"])
+        cursor = content["next_cursor"]
+    assert ids == ["1", "4", "3", "2"]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/search/",
+        params={"query": "available:false", "sort": "start_datetime"},
+    )
+    assert [hit["id"] for hit in response.json()["data"]] == ["2"]
+    response = client.get(f"{settings.API_V1_STR}/search/", params={"sort": "precio"})
+    assert response.status_code == 400
+
+
+def test_search_rejects_invalid_pages(client: TestClient, es: AsyncMock) -> None:
+    invalid: list[dict[str, Any]] = [
+        {"page_size": 0, "cursor": ""},
+        {"page_size": -1},
+        {"page_size": settings.SEARCH_PAGE_MAX_SIZE + 1},
+        {"start": -1},
+    ]
+    for params in invalid:
+        response = client.get(f"{settings.API_V1_STR}/search/", params=params)
+        assert response.status_code == 422
+    es.search.assert_not_called()
+
+
+def test_search_record_click(
+    client: TestClient,
+    cache: SearchCache,
+    normal_user_token_headers: dict[str, str],
+    superuser_token_headers: dict[str, str],
+) -> None:
+    event_id = uuid.uuid4()
+    response = client.post(f"{settings.API_V1_STR}/search/{event_id}/click")
+    assert response.status_code == 401
+
+    # Clicking again within the flush interval does not count
+    for headers in (
+        normal_user_token_headers,
+        normal_user_token_headers,
+        superuser_token_headers,
+    ):
+        response = client.post(
+            f"{settings.API_V1_STR}/search/{event_id}/click", headers=headers
+        )
+        assert response.status_code == 204
+
+    # redis-py types the commands of its sync and asyncio clients alike
+    clicks = cache.client.hget(CLICKS_KEY, str(event_id))
+    assert asyncio.run(clicks) == b"2"  # type: ignore[arg-type]
+
+
+@pytest.mark.usefixtures("memory_es")
+def test_search_fields_and_total(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "SEARCH_TRACK_TOTAL_HITS", 2)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/search/",
+        params={"fields": "title, category", "page_size": 1},
+    )
+
+    content = response.json()
+    assert content["total"] == 2 and content["total_relation"] == "gte"
+    assert [set(hit) for hit in content["data"]] == [
+        {"id", "score", "title", "category"}
+    ]
+    response = client.get(
+        f"{settings.API_V1_STR}/search/",
+        params={"query": "teatro", "fields": "title,password"},
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.usefixtures("memory_es")
+def test_search_suggest_in_memory(client: TestClient) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/search/suggest", params={"q": "teat med"}
+    )
+
+    assert response.json()["suggestions"] == [
+        {"id": "3", "title": "Obra de teatro clásico", "location": "Medellín"}
+    ]
+
+
+def test_search_batch(client: TestClient, es: AsyncMock) -> None:
+    es.msearch.return_value = {
+        "responses": [
+            {"hits": {"hits": _hits(2)}, "status": 200},
+            {
+                "error": {
+                    "type": "search_phase_execution_exception",
+                    "reason": "shard failure",
+                },
+                "status": 500,
+            },
+        ]
+    }
+    queries: list[dict[str, Any]] = [
+        {"query": "category:Teatro", "page_size": 2},
+        {"query": "capacity>=muchos"},
+        {"query": "category:Conciertos"},
+    ]
+
+    for _ in range(2):
+        response = client.post(
+            f"{settings.API_V1_STR}/search/batch", json={"queries": queries}
+        )
+        assert response.status_code == 200
+        responses = response.json()["responses"]
+        assert [hit["id"] for hit in responses[0]["data"]] == ["0", "1"]
+        assert responses[1]["error"]["status"] == 400
+        assert responses[2] == {"error": {"status": 500, "detail": "shard failure"}}
+        es.msearch.return_value = {
+            "responses": [
+                {
+                    "error": {
+                        "type": "search_phase_execution_exception",
+                        "reason": "shard failure",
+                    },
+                    "status": 500,
+                }
+            ]
+        }
+
+    # The first page was cached, so the second batch only sends the failed search
+    assert [len(call.kwargs["searches"]) for call in es.msearch.call_args_list] == [
+        2,
+        1,
+    ]
+    assert es.msearch.call_args_list[0].kwargs["searches"][0]["size"] == 2
+    invalid: list[list[dict[str, Any]]] = [[], [{"query": "jazz", "page_size": 0}]]
+    for queries in invalid:
+        response = client.post(
+            f"{settings.API_V1_STR}/search/batch", json={"queries": queries}
+        )
+        assert response.status_code == 422
+
+
+@pytest.mark.usefixtures("memory_es")
+def test_search_batch_in_memory(client: TestClient) -> None:
+    response = client.post(
+        f"{settings.API_V1_STR}/search/batch",
+        json={
+            "queries": [
+                {"query": "jazz"},
+                {"query": "category:Teatro"},
+                {"near": "0,0", "radius": "1km"},
+            ]
+        },
+    )
+
+    responses = response.json()["responses"]
+    assert [hit["id"] for hit in responses[0]["data"]] == ["1", "2"]
+    assert [hit["id"] for hit in responses[1]["data"]] == ["3"]
+    assert responses[2]["data"] == [] and responses[2]["total"] == 0
+
+
+def test_search_by_ids(
+    client: TestClient, memory_es: InMemorySearchBackend, db: Session
+) -> None:
+    event = create_random_event(db)
+    missing = str(uuid.uuid4())
+    memory_es.load(
+        [
+            {**document, "id": f"00000000-0000-0000-0000-00000000000{document['id']}"}
+            for document in DOCUMENTS
+        ]
+    )
+
+    ids = [
+        "00000000-0000-0000-0000-000000000003",
+        str(event.id),
+        missing,
+        "00000000-0000-0000-0000-000000000001",
+    ]
+    response = client.get(
+        f"{settings.API_V1_STR}/search/by-ids",
+        params={"ids": ",".join(ids), "fields": "title"},
+    )
+
+    assert response.status_code == 200
+    content = response.json()
+    # Indexed events come from the search backend, the new one from Postgres
+    assert content["data"] == [
+        {"id": ids[0], "title": "Obra de teatro clásico"},
+        {"id": ids[1], "title": event.title},
+        {"id": ids[3], "title": "Festival de jazz"},
+    ]
+    assert content["missing"] == [missing]
+
+    response = client.get(f"{settings.API_V1_STR}/search/{event.id}")
+    assert response.json()["title"] == event.title
+    response = client.get(f"{settings.API_V1_STR}/search/{missing}")
+    assert response.status_code == 404
+    response = client.get(f"{settings.API_V1_STR}/search/by-ids", params={"ids": "1,2"})
+    assert response.status_code == 400
+
+
+def test_search_similar(client: TestClient, memory_es: InMemorySearchBackend) -> None:
+    ids = {
+        document["id"]: f"00000000-0000-0000-0000-00000000000{document['id']}"
+        for document in DOCUMENTS
+    }
+    memory_es.load([{**document, "id": ids[document["id"]]} for document in DOCUMENTS])
+
+    response = client.get(
+        f"{settings.API_V1_STR}/search/{ids['1']}/similar", params={"fields": "title"}
+    )
+
+    assert response.status_code == 200
+    assert [hit["id"] for hit in response.json()["data"]] == [ids["2"]]
+    assert [hit["title"] for hit in response.json()["data"]] == ["Noche de jazz latino"]
+    response = client.get(f"{settings.API_V1_STR}/search/{ids['3']}/similar")
+    assert response.json()["data"] == []
+    response = client.get(f"{settings.API_V1_STR}/search/{uuid.uuid4()}/similar")
+    assert response.status_code == 404
+    response = client.get(
+        f"{settings.API_V1_STR}/search/{ids['1']}/similar",
+        params={"size": settings.SEARCH_SIMILAR_MAX_SIZE + 1},
+    )
+    assert response.status_code == 422
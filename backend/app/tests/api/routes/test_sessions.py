@@ -0,0 +1,53 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.tests.utils.event import create_random_event
+from app.tests.utils.sessions import create_random_sessions
+
+
+def test_attend_sessions(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    event = create_random_event(db)
+    sessions = create_random_sessions(db, event)
+    response = client.post(
+        f"{settings.API_V1_STR}/sessions/attend/{sessions.id}",
+        headers=normal_user_token_headers,
+    )
+    assert response.status_code == 403
+
+    client.post(
+        f"{settings.API_V1_STR}/events/attend/{event.id}",
+        headers=normal_user_token_headers,
+    )
+    response = client.post(
+        f"{settings.API_V1_STR}/sessions/attend/{sessions.id}",
+        headers=normal_user_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "session_id": str(sessions.id),
+        "seats_left": 9,
+        "already_registered": False,
+    }
+
+    sessions.attendee_count = sessions.capacity
+    db.add(sessions)
+    db.commit()
+    response = client.post(
+        f"{settings.API_V1_STR}/sessions/attend/{sessions.id}",
+        headers=normal_user_token_headers,
+    )
+    assert response.json()["already_registered"] is True
+
+    other = create_random_sessions(db, event)
+    other.attendee_count = other.capacity
+    db.add(other)
+    db.commit()
+    response = client.post(
+        f"{settings.API_V1_STR}/sessions/attend/{other.id}",
+        headers=normal_user_token_headers,
+    )
+    assert response.status_code == 409
+    assert response.json()["detail"] == "The session is full"
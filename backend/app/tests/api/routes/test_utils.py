@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_read_pool_metrics(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/utils/pool-metrics/", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    primary = response.json()["primary"]
+    assert primary["pool_size"] == settings.POSTGRES_POOL_SIZE
+    assert primary["checkouts"] >= 1
+    assert set(response.json()) == {"primary", "primary_async"}
+
+    response = client.get(
+        f"{settings.API_V1_STR}/utils/pool-metrics/", headers=normal_user_token_headers
+    )
+    assert response.status_code == 403
@@ -7,7 +7,7 @@ from sqlmodel import Session, delete
 from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
-from app.models import Event, User
+from app.models import Event, EventAttendeeLink, SearchOutbox, SessionAttendeeLink, User
 from app.tests.utils.user import authentication_token_from_email
 from app.tests.utils.utils import get_superuser_token_headers
 
@@ -17,10 +17,13 @@ def db() -> Generator[Session, None, None]:
     with Session(engine) as session:
         init_db(session)
         yield session
+        session.execute(delete(SessionAttendeeLink))
+        session.execute(delete(EventAttendeeLink))
         statement = delete(Event)
         session.execute(statement)
         statement = delete(User)
         session.execute(statement)
+        session.execute(delete(SearchOutbox))
         session.commit()
 
 
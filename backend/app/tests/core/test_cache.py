@@ -0,0 +1,112 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import fakeredis
+
+from app.core.cache import SearchCache, bump_search_generation
+
+
+def _counting_compute(
+    calls: list[int], value: dict[str, Any]
+) -> Callable[[], Awaitable[dict[str, Any]]]:
+    async def compute() -> dict[str, Any]:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return value
+
+    return compute
+
+
+def test_cache_hit_and_miss() -> None:
+    async def scenario() -> dict[str, int]:
+        cache = SearchCache(fakeredis.FakeAsyncRedis())
+        calls: list[int] = []
+        compute = _counting_compute(calls, {"hits": [1, 2]})
+        first = await cache.get_or_compute(
+            "results", {"query": "teatro"}, compute, ttl=60
+        )
+        second = await cache.get_or_compute(
+            "results", {"query": "teatro"}, compute, ttl=60
+        )
+        assert first == second == {"hits": [1, 2]}
+        assert len(calls) == 1
+        return await cache.stats()
+
+    assert asyncio.run(scenario()) == {"hits": 1, "misses": 1, "generation": 0}
+
+
+def test_cache_generation_bump_invalidates() -> None:
+    server = fakeredis.FakeServer()
+
+    async def scenario() -> int:
+        cache = SearchCache(fakeredis.FakeAsyncRedis(server=server))
+        calls: list[int] = []
+        compute = _counting_compute(calls, {"hits": []})
+        await cache.get_or_compute("results", {"query": "teatro"}, compute, ttl=60)
+        bump_search_generation(fakeredis.FakeRedis(server=server))
+        await cache.get_or_compute("results", {"query": "teatro"}, compute, ttl=60)
+        return len(calls)
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_cache_concurrent_misses_compute_once() -> None:
+    async def scenario() -> int:
+        cache = SearchCache(fakeredis.FakeAsyncRedis())
+        calls: list[int] = []
+        compute = _counting_compute(calls, {"hits": []})
+        await asyncio.gather(
+            *(
+                cache.get_or_compute("results", {"query": "teatro"}, compute, ttl=60)
+                for _ in range(10)
+            )
+        )
+        return len(calls)
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_cache_follower_outlives_cancelled_leader() -> None:
+    async def scenario() -> tuple[dict[str, Any], int]:
+        cache = SearchCache(fakeredis.FakeAsyncRedis())
+        calls: list[int] = []
+        compute = _counting_compute(calls, {"hits": [3]})
+        leader = asyncio.create_task(
+            cache.get_or_compute("results", {"query": "teatro"}, compute, ttl=60)
+        )
+        await asyncio.sleep(0.005)
+        follower = asyncio.create_task(
+            cache.get_or_compute("results", {"query": "teatro"}, compute, ttl=60)
+        )
+        await asyncio.sleep(0)
+        leader.cancel()
+        value = await asyncio.wait_for(follower, timeout=1)
+        return value, len(calls)
+
+    assert asyncio.run(scenario()) == ({"hits": [3]}, 2)
+
+
+def test_cache_many_skips_hits_and_errors() -> None:
+    async def scenario() -> list[list[int]]:
+        cache = SearchCache(fakeredis.FakeAsyncRedis())
+        calls: list[list[int]] = []
+
+        async def compute(missing: list[int]) -> list[object]:
+            calls.append(missing)
+            return [
+                ValueError("bad") if position == 2 else {"position": position}
+                for position in missing
+            ]
+
+        await cache.get_or_compute(
+            "results", {"query": "jazz"}, _counting_compute([], {"position": 0}), ttl=60
+        )
+        params = [{"query": "jazz"}, {"query": "teatro"}, {"query": "rock"}]
+        values = await cache.get_or_compute_many("results", params, compute, ttl=60)
+        assert values[:2] == [{"position": 0}, {"position": 1}]
+        assert isinstance(values[2], ValueError)
+        await cache.get_or_compute_many("results", params, compute, ttl=60)
+        return calls
+
+    assert asyncio.run(scenario()) == [[1, 2], [2]]
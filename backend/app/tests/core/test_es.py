@@ -0,0 +1,200 @@
+from unittest.mock import MagicMock
+
+from app.core.es import EVENTS_TEMPLATE, ES_connector
+
+# What get_alias returns, with ignore_status=404, when no index has the alias
+ALIAS_MISSING = {
+    "error": {
+        "root_cause": [
+            {
+                "type": "aliases_not_found_exception",
+                "reason": "aliases [events,events-*] missing",
+            }
+        ],
+        "type": "aliases_not_found_exception",
+        "reason": "aliases [events,events-*] missing",
+    },
+    "status": 404,
+}
+
+
+def _connector(
+    aliases: dict[str, list[str]], generations: list[str]
+) -> tuple[ES_connector, MagicMock]:
+    es = ES_connector()
+    client = MagicMock()
+    es.es_client = client
+    client.indices.get.return_value = {name: {} for name in generations}
+    client.indices.exists_alias.side_effect = lambda name: name in aliases
+    client.indices.get_alias.side_effect = lambda name: {
+        index: {} for index in aliases[name]
+    }
+    return es, client
+
+
+def test_create_generation_uses_next_version() -> None:
+    es, client = _connector({}, ["events_v2", "events_v10-2025", "events_vacaciones"])
+
+    assert es.create_generation("events", years=[2026]) == "events_v11"
+    client.indices.create.assert_called_once_with(
+        index="events_v11-2026",
+        settings={"number_of_replicas": 0, "refresh_interval": "-1"},
+        aliases={"events_building": {}},
+    )
+
+
+def test_swap_alias_is_a_single_update() -> None:
+    es, client = _connector(
+        {"events": ["events_v1-2025"]},
+        ["events_v1-2025", "events_v2-2025", "events_v2-2026"],
+    )
+    client.options.return_value.indices.get_alias.return_value = {
+        "events_v1-2025": {"aliases": {"events": {}, "events-2025": {}}}
+    }
+
+    es.swap_alias("events", "events_v2")
+
+    client.indices.update_aliases.assert_called_once_with(
+        actions=[
+            {"remove": {"index": "events_v1-2025", "alias": "events"}},
+            {"remove": {"index": "events_v1-2025", "alias": "events-2025"}},
+            {"add": {"index": "events_v2-2025", "alias": "events"}},
+            {"add": {"index": "events_v2-2025", "alias": "events-2025"}},
+            {"add": {"index": "events_v2-2026", "alias": "events"}},
+            {"add": {"index": "events_v2-2026", "alias": "events-2026"}},
+        ]
+    )
+
+
+def test_swap_alias_replaces_legacy_concrete_index() -> None:
+    es, client = _connector({}, ["events_v1"])
+    client.options.return_value.indices.get_alias.return_value = ALIAS_MISSING
+    client.indices.exists.return_value = True
+
+    es.swap_alias("events", "events_v1")
+
+    client.indices.update_aliases.assert_called_once_with(
+        actions=[
+            {"remove_index": {"index": "events"}},
+            {"add": {"index": "events_v1", "alias": "events"}},
+        ]
+    )
+
+
+def test_swap_alias_on_a_fresh_cluster() -> None:
+    es, client = _connector({}, ["events_v1-2025"])
+    client.options.return_value.indices.get_alias.return_value = ALIAS_MISSING
+    client.indices.exists.return_value = False
+
+    es.swap_alias("events", "events_v1")
+
+    client.indices.update_aliases.assert_called_once_with(
+        actions=[
+            {"add": {"index": "events_v1-2025", "alias": "events"}},
+            {"add": {"index": "events_v1-2025", "alias": "events-2025"}},
+        ]
+    )
+
+
+def test_rollback_alias_points_to_previous_generation() -> None:
+    es, client = _connector(
+        {"events": ["events_v3-2025", "events_v3-2026"]},
+        ["events_v1", "events_v2-2025", "events_v3-2025", "events_v3-2026"],
+    )
+    client.options.return_value.indices.get_alias.return_value = {}
+
+    assert es.rollback_alias("events") == "events_v2"
+
+
+def test_prune_generations_keeps_recent_ones() -> None:
+    es, client = _connector(
+        {"events": ["events_v4-2025"]},
+        [
+            "events_v1-2024",
+            "events_v1-2025",
+            "events_v2",
+            "events_v3-2025",
+            "events_v4-2025",
+        ],
+    )
+
+    es.prune_generations("events", keep=2)
+
+    client.indices.delete.assert_called_once_with(index="events_v1-2024,events_v1-2025")
+
+
+def test_freeze_past_years() -> None:
+    es, client = _connector(
+        {"events": ["events_v2-2024", "events_v2-2025", "events_v2-2026"]}, []
+    )
+
+    assert es.freeze_past_years("events", before_year=2026) == [
+        "events_v2-2024",
+        "events_v2-2025",
+    ]
+    client.indices.forcemerge.assert_any_call(
+        index="events_v2-2024", max_num_segments=1
+    )
+    settings = client.indices.put_settings.call_args.kwargs["settings"]
+    assert settings["index.blocks.write"] is True
+
+
+def test_create_index_installs_events_template() -> None:
+    es, client = _connector({}, [])
+    client.options.return_value.indices.get_index_template.return_value = {
+        "index_templates": []
+    }
+
+    es.create_index("events_v1")
+
+    kwargs = client.indices.put_index_template.call_args.kwargs
+    assert kwargs["version"] == EVENTS_TEMPLATE["version"]
+    assert kwargs["template"]["mappings"]["dynamic"] is False
+    assert kwargs["template"]["mappings"]["properties"]["category"] == {
+        "type": "keyword"
+    }
+    assert (
+        kwargs["template"]["mappings"]["properties"]["title"]["fields"]["prefix"][
+            "analyzer"
+        ]
+        == "prefix_index"
+    )
+
+
+def test_create_index_keeps_current_template() -> None:
+    es, client = _connector({}, [])
+    client.options.return_value.indices.get_index_template.return_value = {
+        "index_templates": [{"index_template": {"version": EVENTS_TEMPLATE["version"]}}]
+    }
+
+    es.create_index("events_v1")
+
+    client.indices.put_index_template.assert_not_called()
+
+
+def test_retrieve_document_and_mget_use_the_client() -> None:
+    es, client = _connector({}, [])
+    client.search.return_value = {
+        "hits": {
+            "hits": [
+                {"_index": "events_v1-2025", "_id": "2", "_source": {"title": "Teatro"}}
+            ]
+        }
+    }
+
+    es.retrieve_document("events", "1")
+    response = es.mget("events", ["1", "2"], source=["title"])
+
+    client.get.assert_called_once_with(index="events", id="1")
+    assert client.search.call_args.kwargs["query"] == {"ids": {"values": ["1", "2"]}}
+    assert response == {
+        "docs": [
+            {"_id": "1", "found": False},
+            {
+                "_index": "events_v1-2025",
+                "_id": "2",
+                "found": True,
+                "_source": {"title": "Teatro"},
+            },
+        ]
+    }
@@ -0,0 +1,268 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import fakeredis
+import pytest
+from sqlmodel import Session, delete, func, select
+
+from app import crud
+from app.core import indexer
+from app.core.cache import CLICKS_FLUSHING_KEY, CLICKS_KEY, GENERATION_KEY
+from app.core.indexer import (
+    drain_outbox,
+    event_year,
+    flush_clicks,
+    index_partition,
+    reindex_events,
+    uuid_ranges,
+)
+from app.models import Event, SearchOutbox
+from app.tests.utils.event import create_random_event
+from app.tests.utils.user import create_random_user
+
+
+@pytest.fixture(autouse=True)
+def empty_outbox(db: Session) -> None:
+    # Rows other modules queued would fill the batches drained here
+    db.execute(delete(SearchOutbox))
+    db.commit()
+
+
+def _es_mock() -> MagicMock:
+    es = MagicMock()
+    es.bulk.return_value = (0, [])
+    es.write_targets.return_value = [("events_v1", False)]
+    es.generation_indices.side_effect = lambda generation: {}
+    es.create_year_index.side_effect = (
+        lambda generation, year, building: f"{generation}-{year}"
+    )
+    es.locate.return_value = {}
+    return es
+
+
+def _year_index(generation: str, event: Event) -> str:
+    return f"{generation}-{event_year(event.start_datetime)}"
+
+
+def test_drain_outbox_indexes_changed_event(db: Session) -> None:
+    event = create_random_event(db)
+    es = _es_mock()
+    cache = fakeredis.FakeRedis()
+
+    drain_outbox(session=db, es=es, batch_size=1000, cache=cache)
+
+    assert cache.get(GENERATION_KEY) == b"1"
+
+    actions = es.bulk.call_args.args[0]
+    action = next(a for a in actions if a["_id"] == str(event.id))
+    assert action["_op_type"] == "index"
+    assert action["_index"] == _year_index("events_v1", event)
+    assert action["_source"]["title"] == event.title
+    assert action["_source"]["category"] == event.category.category
+    assert db.exec(select(SearchOutbox)).all() == []
+
+
+def test_drain_outbox_deletes_removed_event(db: Session) -> None:
+    event = create_random_event(db)
+    event_id = event.id
+    drain_outbox(session=db, es=_es_mock(), batch_size=1000)
+
+    db.delete(event)
+    crud.enqueue_search_change(session=db, entity="event", entity_id=event_id)
+    db.commit()
+    es = _es_mock()
+    es.locate.return_value = {str(event_id): "events_v1-2030"}
+    drain_outbox(session=db, es=es, batch_size=1000)
+
+    actions = es.bulk.call_args.args[0]
+    assert actions == [
+        {"_op_type": "delete", "_index": "events_v1-2030", "_id": str(event_id)}
+    ]
+
+
+def test_drain_outbox_keeps_pending_rows_when_es_fails(db: Session) -> None:
+    create_random_event(db)
+    es = _es_mock()
+    es.bulk.side_effect = ConnectionError()
+
+    try:
+        drain_outbox(session=db, es=es, batch_size=1000)
+    except ConnectionError:
+        db.rollback()
+
+    assert db.exec(select(SearchOutbox)).all() != []
+    drain_outbox(session=db, es=_es_mock(), batch_size=1000)
+
+
+def test_drain_outbox_writes_to_generation_being_built(db: Session) -> None:
+    event = create_random_event(db)
+    es = _es_mock()
+    es.write_targets.return_value = [("events_v1", False), ("events_v2", True)]
+
+    drain_outbox(session=db, es=es, batch_size=1000)
+
+    actions = es.bulk.call_args.args[0]
+    indices = {a["_index"] for a in actions if a["_id"] == str(event.id)}
+    assert indices == {_year_index("events_v1", event), _year_index("events_v2", event)}
+    es.create_year_index.assert_any_call(
+        "events_v2", event_year(event.start_datetime), building=True
+    )
+
+
+def test_drain_outbox_moves_event_to_its_new_year(db: Session) -> None:
+    event = create_random_event(db)
+    es = _es_mock()
+    es.locate.return_value = {str(event.id): "events_v1-1999"}
+
+    drain_outbox(session=db, es=es, batch_size=1000)
+
+    actions = [
+        (a["_op_type"], a["_index"])
+        for a in es.bulk.call_args.args[0]
+        if a["_id"] == str(event.id)
+    ]
+    assert actions == [
+        ("delete", "events_v1-1999"),
+        ("index", _year_index("events_v1", event)),
+    ]
+
+
+def test_drain_outbox_updates_attendance_in_place(db: Session) -> None:
+    event = create_random_event(db)
+    drain_outbox(session=db, es=_es_mock(), batch_size=1000)
+
+    assert crud.register_attendee(
+        session=db, event_id=event.id, user_id=create_random_user(db).id
+    ) == ("registered", 99)
+    es = _es_mock()
+    es.locate.return_value = {str(event.id): "events_v1-2030"}
+    cache = fakeredis.FakeRedis()
+    drain_outbox(session=db, es=es, batch_size=1000, cache=cache)
+
+    assert es.bulk.call_args.args[0] == [
+        {
+            "_op_type": "update",
+            "_index": "events_v1-2030",
+            "_id": str(event.id),
+            "doc": {
+                "attendee_count": 1,
+                "seats_left": 99,
+                "click_count": 0,
+                "popularity": 1.0,
+            },
+        }
+    ]
+    # Counters alone leave cached searches to expire
+    assert cache.get(GENERATION_KEY) is None
+
+
+def test_flush_clicks(db: Session) -> None:
+    event = create_random_event(db)
+    drain_outbox(session=db, es=_es_mock(), batch_size=1000)
+    client = fakeredis.FakeRedis()
+    assert flush_clicks(session=db, client=client) == 0
+    client.hincrby(CLICKS_KEY, str(event.id), 3)
+    client.hincrby(CLICKS_KEY, "no-es-un-id", 1)
+    missing = uuid.uuid4()
+    client.hincrby(CLICKS_KEY, str(missing), 5)
+
+    assert flush_clicks(session=db, client=client) == 1
+    assert not db.exec(
+        select(SearchOutbox).where(SearchOutbox.entity_id == missing)
+    ).all()
+
+    db.refresh(event)
+    assert event.click_count == 3
+    assert not client.exists(CLICKS_KEY, CLICKS_FLUSHING_KEY)
+    entries = db.exec(
+        select(SearchOutbox).where(SearchOutbox.entity_id == event.id)
+    ).all()
+    assert [entry.entity for entry in entries] == ["clicks"]
+    es = _es_mock()
+    es.locate.return_value = {str(event.id): "events_v1-2030"}
+    drain_outbox(session=db, es=es, batch_size=1000)
+    assert es.bulk.call_args.args[0] == [
+        {
+            "_op_type": "update",
+            "_index": "events_v1-2030",
+            "_id": str(event.id),
+            "doc": {
+                "attendee_count": 0,
+                "seats_left": 100,
+                "click_count": 3,
+                "popularity": pytest.approx(0.3),
+            },
+        }
+    ]
+
+
+def test_drain_outbox_unfreezes_past_year(db: Session) -> None:
+    event = create_random_event(db)
+    index_name = _year_index("events_v1", event)
+    es = _es_mock()
+    es.bulk.side_effect = [
+        (0, [{"index": {"_index": index_name, "_id": str(event.id), "status": 403}}]),
+        (1, []),
+    ]
+
+    drain_outbox(session=db, es=es, batch_size=1000)
+
+    es.unfreeze.assert_called_once_with(index_name)
+    retried = es.bulk.call_args.args[0]
+    assert {a["_index"] for a in retried} == {index_name}
+
+
+def test_uuid_ranges_cover_every_id() -> None:
+    ranges = uuid_ranges(4)
+
+    assert ranges[0][0] is None and ranges[-1][1] is None
+    for (_, upper), (lower, _) in zip(ranges[:-1], ranges[1:], strict=True):
+        assert upper == lower
+    assert ranges[1][0] == uuid.UUID(int=2**126)
+
+
+def test_index_partition_streams_its_range(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    events = [create_random_event(db) for _ in range(3)]
+    es = _es_mock()
+    es.bulk.side_effect = lambda actions, **_: (len(list(actions)), [])
+    monkeypatch.setattr(indexer, "_partition_es", es)
+
+    indexed = sum(
+        index_partition("events_v1", lower, upper, chunk_size=2)[0]
+        for lower, upper in uuid_ranges(2)
+    )
+
+    total = db.exec(select(func.count()).select_from(Event)).one()
+    assert indexed == total >= len(events)
+    assert all(call.kwargs["chunk_size"] == 2 for call in es.bulk.call_args_list)
+
+
+def test_reindex_allows_for_changes_during_the_build(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(indexer, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(indexer, "_init_partition_worker", lambda: None)
+    monkeypatch.setattr(indexer, "index_partition", lambda *args: (0, 0))
+    monkeypatch.setattr(indexer, "bump_search_generation", lambda client: None)
+    es = MagicMock()
+    es.create_generation.return_value = "events_v9"
+    # Created once the partitions are done, and already sent to the new generation
+    # by the outbox, or still waiting in it
+    es.finish_generation.side_effect = lambda *args, **kwargs: create_random_event(db)
+    total = db.exec(select(func.count()).select_from(Event)).one()
+
+    # Sent by the outbox
+    es.count.return_value = total + 1
+    assert reindex_events(es=es, workers=2, chunk_size=10) == "events_v9"
+    drain_outbox(session=db, es=_es_mock(), batch_size=1000)
+    # Still in the outbox
+    es.count.return_value = total + 1
+    assert reindex_events(es=es, workers=2, chunk_size=10) == "events_v9"
+
+    es.count.return_value = total + 10
+    with pytest.raises(RuntimeError):
+        reindex_events(es=es, workers=2, chunk_size=10)
+    assert [call.args[1] for call in es.swap_alias.call_args_list] == ["events_v9"] * 2
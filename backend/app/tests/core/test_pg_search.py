@@ -0,0 +1,252 @@
+import asyncio
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from unittest.mock import AsyncMock
+
+import pytest
+from elasticsearch import ConnectionError, NotFoundError
+from sqlmodel import Session
+
+from app.core.pg_search import POINT_IN_TIME_ID, PostgresSearchBackend
+from app.core.search_backend import CircuitBreaker, FallbackSearchBackend
+from app.core.search_query import compile_query
+from app.models import Event
+from app.tests.utils.event import create_random_event
+from app.tests.utils.utils import random_lower_string
+
+
+def _event(db: Session, title: str, days: int) -> Event:
+    event = create_random_event(db)
+    event.title = title
+    event.start_datetime = datetime(2031, 1, 1, tzinfo=timezone.utc) + timedelta(
+        days=days
+    )
+    db.add(event)
+    db.commit()
+    db.refresh(event)
+    return event
+
+
+def _search(**kwargs: Any) -> dict[str, Any]:
+    return asyncio.run(PostgresSearchBackend().search(index_name="events", **kwargs))
+
+
+def _ids(response: dict[str, Any]) -> list[str]:
+    return [hit["_id"] for hit in response["hits"]["hits"]]
+
+
+def test_text_search_and_filters(db: Session) -> None:
+    token = random_lower_string()
+    festival = _event(db, f"Festival de jazz {token}", days=0)
+    concert = _event(db, f"Concierto {token}", days=400)
+
+    response = _search(query=compile_query(token))
+    assert set(_ids(response)) == {str(festival.id), str(concert.id)}
+    assert response["hits"]["total"]["value"] == 2
+    assert response["hits"]["hits"][0]["_source"]["title"].endswith(token)
+
+    assert _ids(_search(query=compile_query(f"{token} -jazz"))) == [str(concert.id)]
+    assert _ids(_search(query=compile_query(f'"festival de jazz" {token}'))) == [
+        str(festival.id)
+    ]
+    assert _ids(
+        _search(query=compile_query(f"{token} category:{festival.category.category}"))
+    ) == [str(festival.id)]
+    assert _ids(_search(query=compile_query(f"{token} year:2032"))) == [str(concert.id)]
+
+    concert.attendee_count = concert.capacity
+    db.add(concert)
+    db.commit()
+    assert _ids(_search(query=compile_query(f"{token} available:true"))) == [
+        str(festival.id)
+    ]
+    assert _ids(_search(query=compile_query(token), sort=[{"seats_left": "desc"}])) == [
+        str(festival.id),
+        str(concert.id),
+    ]
+
+
+def test_keyset_pages_and_aggregations(db: Session) -> None:
+    events = [_event(db, f"Evento {number}", days=number * 200) for number in range(3)]
+    categories = [event.category.category for event in events]
+    query = compile_query(" ".join(f"category:{category}" for category in categories))
+
+    ids: list[str] = []
+    search_after = None
+    while True:
+        response = _search(
+            query=query,
+            pit={"id": POINT_IN_TIME_ID},
+            sort=[{"start_datetime": "asc"}, {"id": "asc"}],
+            search_after=search_after,
+            size=2,
+            track_total_hits=False,
+        )
+        hits = response["hits"]["hits"]
+        if not hits:
+            break
+        ids.extend(hit["_id"] for hit in hits)
+        search_after = hits[-1]["sort"]
+    assert ids == [str(event.id) for event in events]
+    assert _search(query=query, size=0, track_total_hits=2)["hits"]["total"] == {
+        "value": 2,
+        "relation": "gte",
+    }
+
+    response = _search(
+        query=query,
+        size=0,
+        aggs={
+            "category-agg": {"terms": {"field": "category"}},
+            "year-agg": {
+                "date_histogram": {
+                    "field": "start_datetime",
+                    "calendar_interval": "year",
+                    "format": "yyyy",
+                }
+            },
+        },
+    )
+    assert sorted(
+        bucket["key"] for bucket in response["aggregations"]["category-agg"]["buckets"]
+    ) == sorted(categories)
+    assert [
+        (bucket["key_as_string"], bucket["doc_count"])
+        for bucket in response["aggregations"]["year-agg"]["buckets"]
+    ] == [("2031", 2), ("2032", 1)]
+
+
+def test_geo_distance(db: Session) -> None:
+    token = random_lower_string()
+    near, far = (
+        _event(db, f"Cerca {token}", days=0),
+        _event(db, f"Lejos {token}", days=1),
+    )
+    near.latitude, near.longitude = 4.6097, -74.0817
+    far.latitude, far.longitude = 6.2442, -75.5812
+    db.add_all([near, far])
+    db.commit()
+    origin = {"lat": 4.7110, "lon": -74.0721}
+    sort = [{"_geo_distance": {"coordinates": origin, "order": "asc", "unit": "km"}}]
+
+    response = _search(query=compile_query(token), sort=sort)
+    assert _ids(response) == [str(near.id), str(far.id)]
+    assert 11 < response["hits"]["hits"][0]["sort"][0] < 12
+
+    query = compile_query(token)
+    query["bool"]["filter"].append(
+        {"geo_distance": {"distance": "50km", "coordinates": origin}}
+    )
+    assert _ids(_search(query=query)) == [str(near.id)]
+
+
+def test_function_score(db: Session) -> None:
+    token = random_lower_string()
+    quiet, popular = (
+        _event(db, f"Charla {token}", days=0),
+        _event(db, f"Charla {token}", days=0),
+    )
+    popular.attendee_count, popular.click_count = 20, 30
+    db.add(popular)
+    db.commit()
+    functions = [
+        {
+            "field_value_factor": {
+                "field": "popularity",
+                "modifier": "ln2p",
+                "missing": 0,
+            }
+        },
+        {
+            "gauss": {
+                "start_datetime": {"origin": "2031-01-01", "scale": "30d", "decay": 0.5}
+            }
+        },
+    ]
+
+    response = _search(
+        query={
+            "function_score": {"query": compile_query(token), "functions": functions}
+        }
+    )
+    assert _ids(response) == [str(popular.id), str(quiet.id)]
+    scores = [hit["_score"] for hit in response["hits"]["hits"]]
+    assert scores[0] / scores[1] == pytest.approx(math.log(2 + 23) / math.log(2))
+
+
+def test_more_like_this(db: Session) -> None:
+    token = random_lower_string()
+    liked, similar = (
+        _event(db, f"Festival {token}", days=0),
+        _event(db, f"Feria {token}", 1),
+    )
+    _event(db, random_lower_string(), days=2)
+
+    response = _search(
+        query={
+            "bool": {
+                "must": [
+                    {
+                        "more_like_this": {
+                            "fields": ["title", "description"],
+                            "like": [liked.title, ""],
+                        }
+                    }
+                ],
+                "must_not": [{"ids": {"values": [str(liked.id)]}}],
+            }
+        }
+    )
+
+    assert str(similar.id) in _ids(response)
+    assert str(liked.id) not in _ids(response)
+
+
+def test_retrieve_document(db: Session) -> None:
+    event = _event(db, "Obra de teatro", days=0)
+    backend = PostgresSearchBackend()
+
+    document = asyncio.run(backend.retrieve_document("events", event.id))
+    assert document["_source"]["title"] == "Obra de teatro"
+
+    db.delete(event)
+    db.commit()
+    with pytest.raises(NotFoundError):
+        asyncio.run(backend.retrieve_document("events", event.id))
+
+
+def test_fallback_opens_circuit() -> None:
+    primary, fallback = AsyncMock(), AsyncMock()
+    primary.search.side_effect = ConnectionError("unreachable")
+    fallback.search.return_value = {"hits": {"hits": []}}
+    backend = FallbackSearchBackend(
+        primary,
+        fallback,
+        CircuitBreaker(2, reset_timeout=60),
+        timeout=1.0,
+        fallback_pit_id=POINT_IN_TIME_ID,
+    )
+
+    for _ in range(4):
+        assert asyncio.run(backend.search("events", size=1)) == {"hits": {"hits": []}}
+
+    assert primary.search.call_count == 2
+    assert fallback.search.call_count == 4
+    assert backend.breaker.is_open
+
+
+def test_fallback_keeps_its_cursors() -> None:
+    primary, fallback = AsyncMock(), AsyncMock()
+    backend = FallbackSearchBackend(
+        primary,
+        fallback,
+        CircuitBreaker(2, reset_timeout=60),
+        timeout=1.0,
+        fallback_pit_id=POINT_IN_TIME_ID,
+    )
+
+    asyncio.run(backend.search(pit={"id": POINT_IN_TIME_ID}, search_after=[1, "1"]))
+
+    primary.search.assert_not_called()
+    fallback.search.assert_called_once()
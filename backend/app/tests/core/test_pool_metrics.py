@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError
+
+from app.core.config import settings
+from app.core.pool_metrics import InstrumentedQueuePool, PoolMetrics
+
+
+def test_pool_metrics() -> None:
+    engine = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.1,
+    )
+    metrics = PoolMetrics(engine)
+
+    with engine.connect() as first, engine.connect() as second:
+        first.execute(text("select 1"))
+        second.execute(text("select 1"))
+        assert metrics.snapshot()["checked_out"] == 2
+        with pytest.raises(TimeoutError):
+            engine.connect()
+
+    snapshot = metrics.snapshot()
+    assert snapshot["checked_out"] == 0 and snapshot["checked_in"] == 1
+    assert snapshot["checkouts"] == 2 and snapshot["checked_out_max"] == 2
+    assert snapshot["overflow_connections"] == 1
+    assert snapshot["timeouts"] == 1
+    assert snapshot["wait_seconds_max"] >= 0.1
+    assert sum(snapshot["wait_buckets"].values()) == 3
+
+    # The pool dispose() creates keeps reporting to the same metrics
+    engine.dispose()
+    with engine.connect():
+        pass
+    assert metrics.snapshot()["checkouts"] == 3
+    assert sum(metrics.snapshot()["wait_buckets"].values()) == 4
+    engine.dispose()
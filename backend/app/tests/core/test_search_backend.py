@@ -0,0 +1,265 @@
+import asyncio
+import math
+from typing import Any
+
+import pytest
+from elasticsearch import BadRequestError, NotFoundError
+
+from app.core.search_backend import InMemorySearchBackend, analyze
+from app.core.search_query import compile_query
+
+
+def _document(id: str, title: str, **fields: Any) -> dict[str, Any]:
+    return {
+        "id": id,
+        "title": title,
+        "description": fields.pop("description", ""),
+        "start_datetime": fields.pop("start_datetime", "2025-03-01T20:00:00+00:00"),
+        "location": fields.pop("location", "Bogotá"),
+        "capacity": fields.pop("capacity", 100),
+        "seats_left": fields.pop("seats_left", 10),
+        "category": fields.pop("category", "Conciertos"),
+        "status": fields.pop("status", "Activo"),
+        "sessions": fields.pop("sessions", []),
+        **fields,
+    }
+
+
+DOCUMENTS = [
+    _document(
+        "1",
+        "Festival de jazz",
+        description="Jazz y más jazz en el parque",
+        start_datetime="2024-06-10T18:00:00-05:00",
+        capacity=500,
+        seats_left=120,
+        coordinates={"lat": 4.6097, "lon": -74.0817},
+    ),
+    _document(
+        "2",
+        "Noche de jazz latino",
+        category="Conciertos",
+        capacity=80,
+        seats_left=0,
+        coordinates={"lat": 4.7110, "lon": -74.0721},
+    ),
+    _document(
+        "3",
+        "Obra de teatro clásico",
+        category="Teatro",
+        location="Medellín",
+        description="Feria de las flores",
+        start_datetime="2026-08-01T19:00:00+00:00",
+        coordinates={"lat": 6.2442, "lon": -75.5812},
+    ),
+    _document(
+        "4",
+        "Taller de fotografía",
+        category="Talleres",
+        status="Cancelado",
+        seats_left=35,
+        sessions=["Luz natural", "Retrato"],
+    ),
+]
+
+
+def _search(backend: InMemorySearchBackend, **kwargs: Any) -> dict[str, Any]:
+    return asyncio.run(backend.search(index_name="events", **kwargs))
+
+
+def _ids(response: dict[str, Any]) -> list[str]:
+    return [hit["_id"] for hit in response["hits"]["hits"]]
+
+
+def test_analyze_folds_accents_and_drops_stopwords() -> None:
+    assert analyze("title", "Música de la Montaña") == ["musica", "montana"]
+    assert analyze("title.prefix", "Jazz") == ["j", "ja", "jaz", "jazz"]
+
+
+def test_bm25_ranks_by_term_frequency_and_length() -> None:
+    backend = InMemorySearchBackend(DOCUMENTS)
+
+    response = _search(backend, query=compile_query("jazz"))
+
+    assert _ids(response) == ["1", "2"]
+    scores = [hit["_score"] for hit in response["hits"]["hits"]]
+    assert scores[0] > scores[1] > 0
+
+
+def test_filters_phrases_and_negation() -> None:
+    backend = InMemorySearchBackend(DOCUMENTS)
+
+    def ids(text: str) -> set[str]:
+        return set(_ids(_search(backend, query=compile_query(text))))
+
+    assert ids("category:Teatro category:Talleres") == {"3", "4"}
+    assert ids("-status:Cancelado -category:Teatro") == {"1", "2"}
+    assert ids("year:2024") == {"1"}
+    assert ids("from:2025 to:2025-12") == {"2", "4"}
+    assert ids("capacity>=100 capacity<500") == {"3", "4"}
+    assert ids('"feria de las flores"') == {"3"}
+    assert ids('"flores feria"') == set()
+    assert ids('"feria flores"') == set()
+    assert ids("jazz -latino") == {"1"}
+
+
+def test_aggregations_fill_empty_years() -> None:
+    backend = InMemorySearchBackend(DOCUMENTS)
+
+    response = _search(
+        backend,
+        query={"match_all": {}},
+        size=0,
+        aggs={
+            "category-agg": {"terms": {"field": "category"}},
+            "year-agg": {
+                "date_histogram": {
+                    "field": "start_datetime",
+                    "calendar_interval": "year",
+                    "format": "yyyy",
+                }
+            },
+        },
+    )
+
+    assert response["hits"]["hits"] == []
+    assert response["aggregations"]["category-agg"]["buckets"][0] == {
+        "key": "Conciertos",
+        "doc_count": 2,
+    }
+    assert [
+        (bucket["key_as_string"], bucket["doc_count"])
+        for bucket in response["aggregations"]["year-agg"]["buckets"]
+    ] == [("2024", 1), ("2025", 2), ("2026", 1)]
+
+
+def test_search_after_on_point_in_time() -> None:
+    backend = InMemorySearchBackend(DOCUMENTS)
+    sort = [{"start_datetime": "asc"}, {"id": "asc"}]
+    pit_id = asyncio.run(backend.open_point_in_time("events", "1m"))
+    # Changes after the point in time was opened are not visible through it
+    backend.load(DOCUMENTS[:1])
+
+    pages, search_after = [], None
+    while True:
+        response = _search(
+            backend, pit={"id": pit_id}, sort=sort, search_after=search_after, size=3
+        )
+        hits = response["hits"]["hits"]
+        if not hits:
+            break
+        pages.append([hit["_id"] for hit in hits])
+        search_after = hits[-1]["sort"]
+
+    assert pages == [["1", "2", "4"], ["3"]]
+    asyncio.run(backend.close_point_in_time(pit_id))
+    with pytest.raises(NotFoundError):
+        _search(backend, pit={"id": pit_id}, sort=sort)
+
+
+def test_geo_distance_filter_and_sort() -> None:
+    backend = InMemorySearchBackend(DOCUMENTS)
+    origin = {"lat": 4.7110, "lon": -74.0721}
+
+    response = _search(
+        backend,
+        query={"geo_distance": {"distance": "50km", "coordinates": origin}},
+        sort=[{"_geo_distance": {"coordinates": origin, "unit": "km"}}],
+    )
+
+    assert _ids(response) == ["2", "1"]
+    assert response["hits"]["hits"][0]["sort"] == [0.0]
+    assert 11 < response["hits"]["hits"][1]["sort"][0] < 12
+    # Without coordinates, a document sorts after every other one
+    response = _search(backend, sort=[{"_geo_distance": {"coordinates": origin}}])
+    assert _ids(response) == ["2", "1", "3", "4"]
+
+
+def test_function_score_popularity_and_decay() -> None:
+    backend = InMemorySearchBackend(
+        [{**DOCUMENTS[0], "popularity": 50}, *DOCUMENTS[1:]]
+    )
+    popularity = {
+        "field_value_factor": {"field": "popularity", "modifier": "ln2p", "missing": 0}
+    }
+
+    response = _search(
+        backend,
+        query={
+            "function_score": {
+                "query": compile_query("jazz"),
+                "functions": [popularity],
+            }
+        },
+    )
+    assert _ids(response) == ["1", "2"]
+    assert response["hits"]["hits"][1]["_score"] == pytest.approx(
+        _search(backend, query=compile_query("jazz"))["hits"]["hits"][1]["_score"]
+        * math.log(2)
+    )
+
+    # Events further than scale past the offset are worth less than decay
+    decay = {
+        "gauss": {
+            "start_datetime": {
+                "origin": "2026-08-01",
+                "scale": "30d",
+                "offset": "7d",
+                "decay": 0.5,
+            }
+        }
+    }
+    response = _search(
+        backend,
+        query={"function_score": {"query": {"match_all": {}}, "functions": [decay]}},
+    )
+    assert _ids(response)[0] == "3" and response["hits"]["hits"][0]["_score"] == 1.0
+    with pytest.raises(BadRequestError):
+        _search(
+            backend,
+            query={
+                "function_score": {
+                    "query": {"match_all": {}},
+                    "functions": [decay],
+                    "score_mode": "sum",
+                }
+            },
+        )
+
+
+def test_more_like_this() -> None:
+    backend = InMemorySearchBackend(DOCUMENTS)
+    like = {
+        "fields": ["title", "description"],
+        "min_term_freq": 1,
+        "min_doc_freq": 2,
+        "like": ["Festival de jazz", "Jazz y más jazz en el parque"],
+    }
+
+    response = _search(
+        backend,
+        query={
+            "bool": {
+                "must": [{"more_like_this": like}],
+                "must_not": [{"ids": {"values": ["1"]}}],
+            }
+        },
+    )
+
+    assert _ids(response) == ["2"]
+    # Words no other event has, such as "festival", are not searched
+    assert (
+        _ids(_search(backend, query={"more_like_this": {**like, "like": "Festival"}}))
+        == []
+    )
+
+
+def test_retrieve_document() -> None:
+    backend = InMemorySearchBackend(DOCUMENTS)
+
+    assert asyncio.run(backend.retrieve_document("events", "3"))["_source"][
+        "title"
+    ] == ("Obra de teatro clásico")
+    backend.delete_documents(["3"])
+    with pytest.raises(NotFoundError):
+        asyncio.run(backend.retrieve_document("events", "3"))
@@ -0,0 +1,146 @@
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+
+from app.core.search_query import QuerySyntaxError, compile_query, query_years
+
+# Values that need no quoting: no spaces, quotes or commas
+values = st.text(
+    alphabet=st.characters(
+        blacklist_categories=("Cs", "Z", "Cc"), blacklist_characters='",'
+    ),
+    min_size=1,
+    max_size=12,
+).filter(str.strip)
+words = st.text(
+    alphabet=st.characters(
+        blacklist_categories=("Cs", "Z", "Cc"), blacklist_characters='",:<>-'
+    ),
+    min_size=1,
+    max_size=12,
+)
+keyword_fields = st.sampled_from(["category", "status", "location"])
+
+
+def test_compile_query_full_example() -> None:
+    query = compile_query(
+        'vallenato "Feria de las Flores" -rock category:Teatro '
+        'category:Conciertos status:Activo location:"Santa Marta" '
+        "from:2025-01 to:2025-06-30 capacity>=100 -category:Rock"
+    )["bool"]
+
+    assert query["must"] == [
+        {"multi_match": {"query": "vallenato", "fields": ["title", "description"]}},
+        {
+            "multi_match": {
+                "query": "feria de las flores",
+                "fields": ["title", "description"],
+                "type": "phrase",
+            }
+        },
+    ]
+    assert query["filter"] == [
+        {"terms": {"category": ["Teatro", "Conciertos"]}},
+        {"term": {"status": {"value": "Activo"}}},
+        {"term": {"location": {"value": "Santa Marta"}}},
+        {"range": {"start_datetime": {"gte": "2025-01||/M"}}},
+        {"range": {"start_datetime": {"lte": "2025-06-30||/d"}}},
+        {"range": {"capacity": {"gte": 100}}},
+    ]
+    assert query["must_not"] == [
+        {"multi_match": {"query": "rock", "fields": ["title", "description"]}},
+        {"term": {"category": {"value": "Rock"}}},
+    ]
+
+
+def test_compile_query_empty() -> None:
+    assert compile_query("") == {"bool": {"must": [{"match_all": {}}], "filter": []}}
+
+
+def test_compile_query_available() -> None:
+    assert compile_query("available:true")["bool"]["filter"] == [
+        {"range": {"seats_left": {"gt": 0}}}
+    ]
+    assert compile_query("available:False")["bool"]["filter"] == [
+        {"term": {"seats_left": {"value": 0}}}
+    ]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "from:ayer",
+        "capacity>=muchos",
+        "category>=Teatro",
+        "available:quizas",
+        "from:2025-13",
+        "to:2025-02-31",
+        "year:0000",
+    ],
+)
+def test_compile_query_invalid_filter(query: str) -> None:
+    with pytest.raises(QuerySyntaxError):
+        compile_query(query)
+
+
+@given(st.text())
+def test_compile_query_any_text(text: str) -> None:
+    try:
+        query = compile_query(text)
+    except QuerySyntaxError:
+        return
+    assert query["bool"]["must"]
+
+
+@given(keyword_fields, st.lists(values, min_size=2, max_size=5))
+def test_repeated_filters_are_ored(field: str, filter_values: list[str]) -> None:
+    repeated = compile_query(" ".join(f"{field}:{value}" for value in filter_values))
+    listed = compile_query(f"{field}:{','.join(filter_values)}")
+
+    assert repeated == listed
+    assert repeated["bool"]["filter"] == [{"terms": {field: filter_values}}]
+
+
+@given(keyword_fields, values, st.lists(words, max_size=4))
+def test_negated_filters_are_excluded(
+    field: str, value: str, text_words: list[str]
+) -> None:
+    text = " ".join([*text_words, f"-{field}:{value}"])
+    query = compile_query(text)["bool"]
+
+    assert {"term": {field: {"value": value}}} in query["must_not"]
+    assert query["filter"] == []
+
+
+@given(st.permutations(["teatro", "category:Teatro", "status:Activo", "capacity>=10"]))
+def test_filters_do_not_depend_on_order(tokens: list[str]) -> None:
+    query = compile_query(" ".join(tokens))["bool"]
+
+    assert sorted(map(str, query["filter"])) == sorted(
+        map(
+            str,
+            [
+                {"term": {"category": {"value": "Teatro"}}},
+                {"term": {"status": {"value": "Activo"}}},
+                {"range": {"capacity": {"gte": 10}}},
+            ],
+        )
+    )
+    assert query["must"][0]["multi_match"]["query"] == "teatro"
+
+
+@pytest.mark.parametrize(
+    "text, years",
+    [
+        ("jazz year:2025", [2025]),
+        ("year:2024 year:2026 category:Teatro", [2024, 2026]),
+        ("from:2025-03 to:2026-02-01", [2025, 2026]),
+        ("to:2025-06 year:2025,2030", [2025]),
+        ("year:2024 from:2025", []),
+        ("from:2025", None),
+        ("jazz -year:2024", None),
+        ("from:1990 to:2030", None),
+    ],
+)
+def test_query_years(text: str, years: list[int] | None) -> None:
+    assert query_years(compile_query(text)) == years
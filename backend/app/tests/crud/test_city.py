@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from sqlmodel import Session, select
+
+from app import crud
+from app.models import City
+
+
+def test_geocode_location(db: Session, tmp_path: Path) -> None:
+    csv = tmp_path / "cities.csv"
+    csv.write_text(
+        "name,region,country_code,latitude,longitude\n"
+        "Medellín,Antioquia,CO,6.2442,-75.5812\n",
+        encoding="utf-8",
+    )
+    try:
+        assert crud.load_cities(session=db, path=csv) == 1
+        assert crud.geocode_location(session=db, location="MEDELLÍN") == (
+            6.2442,
+            -75.5812,
+        )
+        assert crud.geocode_location(
+            session=db, location="Teatro Pablo Tobón Uribe, Medellín"
+        ) == (6.2442, -75.5812)
+        assert crud.geocode_location(session=db, location="Atlántida") is None
+    finally:
+        crud.load_cities(session=db)
+
+    assert db.exec(select(City)).first() is not None
@@ -0,0 +1,119 @@
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlmodel import Session, func, select
+
+from app import crud
+from app.core.db import engine
+from app.models import EventAttendeeLink, SessionAttendeeLink
+from app.tests.utils.event import create_random_event
+from app.tests.utils.sessions import create_random_sessions
+from app.tests.utils.user import create_random_user, create_random_user_ids
+
+
+def test_register_attendee(db: Session) -> None:
+    event = create_random_event(db)
+    user = create_random_user(db)
+
+    assert crud.register_attendee(session=db, event_id=event.id, user_id=user.id) == (
+        "registered",
+        99,
+    )
+    assert crud.register_attendee(session=db, event_id=event.id, user_id=user.id) == (
+        "already_registered",
+        99,
+    )
+    assert crud.register_attendee(
+        session=db, event_id=uuid.uuid4(), user_id=user.id
+    ) == ("not_found", None)
+    db.refresh(event)
+    assert event.attendee_count == 1
+
+
+def test_register_attendee_concurrently(db: Session) -> None:
+    event = create_random_event(db)
+    user_ids = create_random_user_ids(db, 2000)
+    # Read before the threads start, they must not share the test's session
+    event_id = event.id
+
+    def register(user_id: uuid.UUID) -> tuple[str, int | None]:
+        with Session(engine) as session:
+            return crud.register_attendee(
+                session=session, event_id=event_id, user_id=user_id
+            )
+
+    # Every user registers, and the first ones retry while the rest are still arriving
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(register, [*user_ids, *user_ids[:500]]))
+
+    outcomes = Counter(outcome for outcome, _ in results)
+    assert outcomes["registered"] == event.capacity
+    assert (
+        outcomes["registered"] + outcomes["already_registered"] + outcomes["full"]
+        == 2500
+    )
+    assert sorted(
+        seats
+        for outcome, seats in results
+        if outcome == "registered" and seats is not None
+    ) == list(range(event.capacity))
+    db.refresh(event)
+    assert event.attendee_count == event.capacity
+    links = db.exec(
+        select(func.count())
+        .select_from(EventAttendeeLink)
+        .where(EventAttendeeLink.event_id == event.id)
+    ).one()
+    assert links == event.capacity
+
+
+def test_register_session_attendee(db: Session) -> None:
+    event = create_random_event(db)
+    sessions = create_random_sessions(db, event)
+    user = create_random_user(db)
+
+    assert crud.register_session_attendee(
+        session=db, session_id=sessions.id, user_id=user.id
+    ) == ("not_allowed", 10)
+    crud.register_attendee(session=db, event_id=event.id, user_id=user.id)
+    assert crud.register_session_attendee(
+        session=db, session_id=sessions.id, user_id=user.id
+    ) == ("registered", 9)
+    assert crud.register_session_attendee(
+        session=db, session_id=sessions.id, user_id=user.id
+    ) == ("already_registered", 9)
+    assert crud.register_session_attendee(
+        session=db, session_id=uuid.uuid4(), user_id=user.id
+    ) == ("not_found", None)
+
+
+def test_register_session_attendee_concurrently(db: Session) -> None:
+    event = create_random_event(db)
+    sessions = create_random_sessions(db, event, capacity=50)
+    user_ids = create_random_user_ids(db, 300)
+    # Only the first hundred fit in the event, the rest may not attend its sessions
+    for user_id in user_ids[: event.capacity]:
+        crud.register_attendee(session=db, event_id=event.id, user_id=user_id)
+    sessions_id = sessions.id
+
+    def register(user_id: uuid.UUID) -> tuple[str, int | None]:
+        with Session(engine) as session:
+            return crud.register_session_attendee(
+                session=session, session_id=sessions_id, user_id=user_id
+            )
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(register, [*user_ids, *user_ids[:50]]))
+
+    outcomes = Counter(outcome for outcome, _ in results)
+    assert outcomes["registered"] == 50
+    assert outcomes["not_allowed"] == 200
+    db.refresh(sessions)
+    assert sessions.attendee_count == 50
+    linked = db.exec(
+        select(SessionAttendeeLink.user_id).where(
+            SessionAttendeeLink.session_id == sessions.id
+        )
+    ).all()
+    assert len(linked) == 50 and set(linked) <= set(user_ids[: event.capacity])
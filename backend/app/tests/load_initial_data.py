@@ -1,7 +1,13 @@
 import json
 import logging
+from typing import Any
+
+import redis
+
+from app.core.cache import bump_search_generation, redis_connection_args
 from app.core.es import ES_connector
 from app.core.config import settings
+from app.core.indexer import event_year
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -10,10 +16,17 @@ es = ES_connector()
 
 
 def load_data() -> None:
-    es.create_index(index_name=settings.ES_INDEX)
     logger.info("Loading dummy data data")
     with open('/app/app/tests/data.json', 'rt') as f:
         documents = json.loads(f.read())
-    es.insert_documents(index_name=settings.ES_INDEX,
-                        documents=documents)
+    by_year: dict[int, list[dict[str, Any]]] = {}
+    for document in documents:
+        by_year.setdefault(event_year(document["start_datetime"]), []).append(document)
+    generation = es.create_generation(alias=settings.ES_INDEX, years=by_year)
+    for year, year_documents in by_year.items():
+        es.insert_documents(index_name=f"{generation}-{year}",
+                            documents=year_documents)
+    es.finish_generation(generation, replicas=settings.ES_REPLICAS)
+    es.swap_alias(settings.ES_INDEX, generation)
+    bump_search_generation(redis.Redis(**redis_connection_args()))
     logger.info("Dummy data created")
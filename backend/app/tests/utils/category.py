@@ -7,6 +7,6 @@ from app.tests.utils.utils import random_lower_string
 
 
 def create_random_category(db: Session) -> Category:
-    category = random_lower_string()
+    category = random_lower_string()[:25]
     category_in = CategoryCreate(category=category)
     return crud.create_category(session=db, category_create=category_in)
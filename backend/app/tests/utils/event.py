@@ -30,7 +30,8 @@ def create_random_event(db: Session) -> Event:
     event_in = EventCreate(title=title, description=description,
                            start_datetime=start_datetime,
                            end_datetime=end_datetime, location=location,
-                           capacity=100)
+                           capacity=100, organizer_id=organizer_id,
+                           status_id=status_id, category_id=category_id)
     return crud.create_event(session=db, event_in=event_in,
                              organizer_id=organizer_id, status_id=status_id,
                              category_id=category_id)
@@ -7,6 +7,6 @@ from app.tests.utils.utils import random_lower_string
 
 
 def create_random_role(db: Session) -> Role:
-    role = random_lower_string()
+    role = random_lower_string()[:25]
     role_in = RoleCreate(role=role)
     return crud.create_role(session=db, role_create=role_in)
@@ -0,0 +1,22 @@
+from sqlmodel import Session
+
+from app import crud
+from app.models import Event, Sessions
+from app.schemas.sessions import SessionsCreate
+from app.tests.utils.user import create_random_user
+from app.tests.utils.utils import random_dates, random_lower_string
+
+
+def create_random_sessions(db: Session, event: Event, capacity: int = 10) -> Sessions:
+    speaker = create_random_user(db)
+    start_datetime, end_datetime = random_dates()
+    sessions_in = SessionsCreate(
+        title=random_lower_string(),
+        description=random_lower_string(),
+        start_datetime=start_datetime,
+        end_datetime=end_datetime,
+        capacity=capacity,
+        event_id=event.id,
+        speaker_id=speaker.id,
+    )
+    return crud.create_sessions(session=db, sessions_in=sessions_in, event_id=event.id)
@@ -7,6 +7,6 @@ from app.tests.utils.utils import random_lower_string
 
 
 def create_random_status(db: Session) -> Status:
-    status = random_lower_string()
+    status = random_lower_string()[:25]
     status_in = StatusCreate(status=status)
     return crud.create_status(session=db, status_create=status_in)
@@ -1,3 +1,5 @@
+import uuid
+
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
@@ -24,12 +26,23 @@ def user_authentication_headers(
 def create_random_user(db: Session) -> User:
     email = random_email()
     password = random_lower_string()
-    role = create_random_role()
+    role = create_random_role(db)
     user_in = UserCreate(email=email, password=password)
     user = crud.create_user(session=db, user_create=user_in, role_id=role.id)
     return user
 
 
+def create_random_user_ids(db: Session, count: int) -> list[uuid.UUID]:
+    # Inserted directly, hashing thousands of passwords would dominate the test
+    role = create_random_role(db)
+    users = [User(email=random_email(), hashed_password="-", role_id=role.id)
+             for _ in range(count)]
+    ids = [user.id for user in users]
+    db.add_all(users)
+    db.commit()
+    return ids
+
+
 def authentication_token_from_email(
     *, client: TestClient, email: str, db: Session
 ) -> dict[str, str]:
@@ -41,7 +54,7 @@ def authentication_token_from_email(
     password = random_lower_string()
     user = crud.get_user_by_email(session=db, email=email)
     if not user:
-        role_id = create_random_role()
+        role_id = create_random_role(db)
         user_in_create = UserCreate(email=email, password=password)
         user = crud.create_user(session=db, user_create=user_in_create, role_id=role_id.id)
     else:
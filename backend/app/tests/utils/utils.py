@@ -1,6 +1,6 @@
 import random
 import string
-import faker
+from faker import Faker
 import datetime as datetime
 
 from fastapi.testclient import TestClient
@@ -18,9 +18,9 @@ def random_email() -> str:
     return f"{random_lower_string()}@{random_lower_string()}.com"
 
 
-def random_dates() -> datetime:
+def random_dates() -> tuple[datetime.datetime, datetime.datetime]:
 
-    start_datetime = fake.date_time_between(start_date='now', end_date='+1y')
+    start_datetime = fake.date_time_between(start_date='+1d', end_date='+1y')
     end_datetime = fake.date_time_between(start_date=start_datetime, end_date='+1y')
     return start_datetime, end_datetime
 
@@ -0,0 +1,142 @@
+"""
+Compares /search/ latency with the async Elasticsearch client against the
+previous synchronous route, which holds a threadpool worker for the whole
+Elasticsearch round trip.
+
+Both routes query a local stub of Elasticsearch that answers every search
+after a fixed delay, so the numbers only show how the API waits on it.
+
+    PYTHONPATH=. python benchmarks/search_latency.py --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import time
+
+import aiohttp
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+STUB_PORT = free_port()
+os.environ["ES_SERVER"] = "127.0.0.1"
+os.environ["ES_PORT"] = str(STUB_PORT)
+
+from app.core.config import settings  # noqa: E402
+from app.core.es import ES_connector  # noqa: E402
+from app.main import app  # noqa: E402
+
+SEARCH_RESPONSE = {
+    "took": 1,
+    "timed_out": False,
+    "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+    "hits": {
+        "total": {"value": 1, "relation": "eq"},
+        "max_score": 1.0,
+        "hits": [{"_index": "app_v1", "_id": "1", "_score": 1.0,
+                  "_source": {"title": "Concierto1", "category": "Conciertos"}}],
+    },
+}
+
+
+def stub_es(latency: float) -> Starlette:
+    async def search(request: Request) -> JSONResponse:
+        await asyncio.sleep(latency)
+        return JSONResponse(SEARCH_RESPONSE, headers={"X-Elastic-Product": "Elasticsearch"})
+
+    return Starlette(routes=[Route("/{index}/_search", search, methods=["GET", "POST"])])
+
+
+def add_sync_route() -> None:
+    es = ES_connector()
+
+    def sync_search(query: str = "") -> dict:
+        event = es.search(index_name=settings.ES_INDEX,
+                          query={"multi_match": {"query": query,
+                                                 "fields": ["title", "description"]}},
+                          size=5)
+        return {"event_ouput": event["hits"]["hits"]}
+
+    app.add_api_route("/bench/sync-search/", sync_search, tags=["benchmark"])
+
+
+def run_server(name: str, port: int, es_latency: float) -> None:
+    asgi_app = stub_es(es_latency) if name == "stub" else app
+    if name == "api":
+        add_sync_route()
+    uvicorn.run(asgi_app, host="127.0.0.1", port=port, log_level="warning", backlog=4096,
+                timeout_keep_alive=60)
+
+
+def serve(name: str, port: int, es_latency: float) -> multiprocessing.Process:
+    # Each server gets its own process so it does not share the GIL with the load generator
+    process = multiprocessing.Process(target=run_server, args=(name, port, es_latency),
+                                      daemon=True)
+    process.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+
+
+async def load(url: str, requests: int, concurrency: int) -> list[float]:
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector) as client:
+        async def one() -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                async with client.get(url, params={"query": "vallenato"}) as response:
+                    response.raise_for_status()
+                    await response.read()
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def report(name: str, latencies: list[float], elapsed: float) -> None:
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f"{name:<6} p50={percentiles[49] * 1000:8.1f}ms  "
+          f"p99={percentiles[98] * 1000:8.1f}ms  {len(latencies) / elapsed:8.0f} req/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--es-latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    api_port = free_port()
+    serve("stub", STUB_PORT, args.es_latency_ms / 1000)
+    serve("api", api_port, args.es_latency_ms / 1000)
+
+    base = f"http://127.0.0.1:{api_port}"
+    for name, path in [("sync", "/bench/sync-search/"),
+                       ("async", f"{settings.API_V1_STR}/search/")]:
+        asyncio.run(load(base + path, args.concurrency, args.concurrency))  # warm up
+        started = time.perf_counter()
+        latencies = asyncio.run(load(base + path, args.requests, args.concurrency))
+        report(name, latencies, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
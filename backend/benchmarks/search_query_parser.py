@@ -0,0 +1,75 @@
+"""
+Compares the /search/ query parser with the previous regex-based
+extract_filters, which ran re.search and re.sub once per filter type and only
+understood one category: and one year:.
+
+    PYTHONPATH=. python benchmarks/search_query_parser.py --number 20000
+"""
+import argparse
+import re
+import timeit
+
+from app.core.search_query import compile_query
+
+QUERIES = [
+    "vallenato",
+    "vallenato category:Conciertos",
+    "teatro category:Teatro year:2025",
+    'festival "feria de las flores" -rock category:Conciertos category:Teatro '
+    'status:Activo location:Medellín from:2025-01 to:2025-06 capacity>=100',
+]
+
+
+def extract_filters(query):
+    filters = []
+
+    filter_regex = r'category:([^\s]+)\s*'
+    m = re.search(filter_regex, query)
+    if m:
+        filters.append({'term': {'category': {'value': m.group(1)}}})
+        query = re.sub(filter_regex, '', query).strip()
+
+    filter_regex = r'year:([^\s]+)\s*'
+    m = re.search(filter_regex, query)
+    if m:
+        filters.append({
+            'range': {
+                'start_datetime': {
+                    'gte': f'{m.group(1)}||/y',
+                    'lte': f'{m.group(1)}||/y',
+                }
+            },
+        })
+        query = re.sub(filter_regex, '', query).strip()
+
+    return {'filter': filters}, query
+
+
+def regex_baseline(query: str) -> dict:
+    filters, parsed_query = extract_filters(query)
+    if parsed_query:
+        search_query = {'must': {'multi_match': {'query': parsed_query,
+                                                 'fields': ['title', 'description']}}}
+    else:
+        search_query = {'must': {'match_all': {}}}
+    return {'bool': {**search_query, **filters}}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=20000,
+                        help="Parses of each query per measurement")
+    args = parser.parse_args()
+
+    print(f"{'query':<40} {'regex µs':>10} {'parser µs':>10}")
+    for query in QUERIES:
+        timings = []
+        for function in (regex_baseline, compile_query):
+            best = min(timeit.repeat(lambda: function(query), number=args.number, repeat=5))
+            timings.append(best / args.number * 1e6)
+        label = query if len(query) <= 40 else query[:37] + "..."
+        print(f"{label:<40} {timings[0]:>10.2f} {timings[1]:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()